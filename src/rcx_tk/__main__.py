@@ -1,32 +1,324 @@
+import contextlib
 import click
-from rcx_tk.alkanes import process_alkane_file
-from rcx_tk.msdial import process_msdial_file
-from rcx_tk.sequence import process_sequence_file
+from rcx_tk import profiling
 
 
-@click.command()
+class _DefaultCommandGroup(click.Group):
+    """Command group running the `process` command unless the first argument names another command or asks for help."""
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        """Prepends the default command to arguments naming no command.
+
+        No arguments or a help option show the help of the group instead, which lists all commands.
+
+        Args:
+            ctx (click.Context): The click context.
+            args (list[str]): The command line arguments.
+
+        Returns:
+            list[str]: The remaining arguments.
+        """
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args = ["process", *args]
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=_DefaultCommandGroup)
+def main():
+    """Process sequence, alkane or MSDial files, or watch a directory for them."""
+
+
+@main.command()
 @click.option(
     "--method",
     type=click.Choice(["sequence", "alkanes", "msdial"]),
     required=True,
-    help="A file type to be processed, either sequence or alkanes file.",
+    help="A file type to be processed, either a sequence, alkanes or msdial file.",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Stream msdial files in blocks of this many rows, keeping abundances in a temporary file next to the "
+    "output instead of memory. TSV output only.",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes searching msdial files for duplicates, or of files processed in parallel with --batch.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="RCX_TK_CACHE_DIR",
+    default=None,
+    help="Directory caching parsed msdial files and processed outputs between runs. Parsed msdial files are not "
+    "cached with --chunk-size, which streams them instead.",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=0),
+    default=2048,
+    show_default=True,
+    help="Size cap of the cache in MiB.",
+)
+@click.option(
+    "--groups-file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File persisting per-column duplicate groups of msdial files, so that re-running on a re-export with "
+    "appended samples scans only the new or changed sample columns. With --batch, a template with the placeholders "
+    "of OUT_PATH giving every file its own groups file, e.g. groups/{stem}.npz.",
+)
+@click.option(
+    "--rtol",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    help="Relative tolerance within which msdial abundances count as duplicates, e.g. 1e-6 to merge re-integrated "
+    "peaks differing by rounding. Defaults to exact matching.",
+)
+@click.option(
+    "--atol",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    help="Absolute tolerance within which msdial abundances count as duplicates. Defaults to exact matching.",
+)
+@click.option(
+    "--rt-window",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="Largest retention time gap in minutes between msdial alignments counted as duplicates, so that features "
+    "sharing abundances by chance but eluting apart are kept separate. Defaults to any retention time.",
+)
+@click.option(
+    "--sparse",
+    is_flag=True,
+    help="Search msdial files for duplicates in a sparse matrix holding only the positive abundances rather than a "
+    "dense copy of them, cutting time and memory of the search for mostly zero abundances. Files are still parsed "
+    "whole unless --chunk-size is given. Cannot be combined with --groups-file.",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Process the input even if a cache directory is configured, without reading or writing the cache.",
+)
+@click.option(
+    "--sheets",
+    default=None,
+    help="Comma-separated sheets of an Excel sequence file, or * for all sheets, each processed into its own file "
+    "named by the {sheet} placeholder in OUT_PATH or suffixed with the sheet name.",
+)
+@click.option(
+    "--batch",
+    is_flag=True,
+    help="Treat FILE_PATH as a directory, glob pattern or manifest file and OUT_PATH as a directory or a template "
+    "with the placeholders {stem}, {name}, {dir} and {method}.",
+)
+@click.option(
+    "--report",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="TSV file listing the outcome of every file processed with --batch.",
+)
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default=None,
+    help="Report the duration, peak RSS and sizes of every processing stage as JSON file, or as a table on stderr "
+    "if given -. With --batch, files processed in parallel by --jobs are not profiled.",
 )
 @click.argument("file_path")
 @click.argument("out_path")
-def main(method, file_path, out_path):
-    """Process sequence or alkane file.
+def process(
+    method,
+    file_path,
+    out_path,
+    chunk_size,
+    jobs,
+    cache_dir,
+    cache_size,
+    groups_file,
+    rtol,
+    atol,
+    rt_window,
+    sparse,
+    no_cache,
+    sheets,
+    batch,
+    report,
+    profile,
+):
+    """Process sequence, alkane or MSDial file.
 
     Args:
-        method (string): Whether a sequence or alkane file should be processed.
+        method (string): Whether a sequence, alkanes or msdial file should be processed.
         file_path (path): A path to the input data.
         out_path (path): A path where the processed data will be exported to.
+        chunk_size (int): Number of rows per block when streaming msdial files.
+        jobs (int): Number of processes searching msdial files for duplicates, or of files processed in parallel.
+        cache_dir (path): Directory caching parsed msdial files, unless streamed in chunks, and processed outputs.
+        cache_size (int): Size cap of the cache in MiB.
+        groups_file (path): File persisting per-column duplicate groups of msdial files between runs.
+        rtol (float): Relative tolerance within which msdial abundances count as duplicates.
+        atol (float): Absolute tolerance within which msdial abundances count as duplicates.
+        rt_window (float): Largest retention time gap between msdial alignments counted as duplicates.
+        sparse (bool): Whether to search msdial files for duplicates in a sparse matrix.
+        no_cache (bool): Whether to bypass the cache.
+        sheets (string): Sheets of an Excel sequence file to process into separate files.
+        batch (bool): Whether to process a batch of files.
+        report (path): A path where the outcome of every file of a batch is exported to.
+        profile (path): A path where the profile of the run is exported to, "-" to print it.
     """
-    if method == "sequence":
-        process_sequence_file(file_path, out_path)
-    elif method == "alkanes":
-        process_alkane_file(file_path, out_path)
-    elif method == "msdial":
-        process_msdial_file(file_path, out_path)
+    options = {"cache_dir": None if no_cache else cache_dir, "cache_size": cache_size * 1024**2}
+    if method == "msdial":
+        if sparse and groups_file is not None:
+            raise click.UsageError("--sparse cannot be combined with --groups-file.")
+        if chunk_size is not None:
+            from rcx_tk.io import split_extension
+
+            # A batch written to a directory names its outputs {stem}.tsv.
+            if (not batch or "{" in out_path) and split_extension(out_path)[1] != ".tsv":
+                raise click.UsageError("--chunk-size writes TSV output only, OUT_PATH must end in .tsv.")
+        options.update(
+            chunk_size=chunk_size, groups_path=groups_file, rtol=rtol, atol=atol, rt_window=rt_window, sparse=sparse
+        )
+    elif method == "sequence" and sheets is not None:
+        from rcx_tk.io import ALL_SHEETS
+
+        options["sheets"] = sheets if sheets == ALL_SHEETS else sheets.split(",")
+
+    with profiling.profile() if profile is not None else contextlib.nullcontext() as records:
+        try:
+            failures = _run(method, file_path, out_path, jobs, batch, report, options)
+        finally:
+            if profile == "-":
+                click.echo(profiling.format_report(records), err=True)
+            elif profile is not None:
+                profiling.write_report(records, profile)
+    if failures:
+        raise SystemExit(1)
+
+
+def _run(method, file_path, out_path, jobs, batch, report, options) -> int:
+    """Process a single file or a batch of files.
+
+    Args:
+        method (string): Whether a sequence, alkanes or msdial file should be processed.
+        file_path (path): A path to the input data.
+        out_path (path): A path where the processed data will be exported to.
+        jobs (int): Number of processes searching msdial files for duplicates, or of files processed in parallel.
+        batch (bool): Whether to process a batch of files.
+        report (path): A path where the outcome of every file of a batch is exported to.
+        options (dict): Further keyword arguments passed to the processing function.
+
+    Returns:
+        int: Number of files that failed.
+    """
+    # Imported only once the arguments are parsed, as the processing modules pull in pandas and NumPy.
+    from rcx_tk.batch import collect_inputs
+    from rcx_tk.batch import process_file
+    from rcx_tk.batch import process_files
+    from rcx_tk.io import save_dataframe_as_tsv
+
+    if not batch:
+        if method == "msdial":
+            options["workers"] = jobs
+        process_file(method, file_path, out_path, **options)
+        return 0
+
+    inputs = collect_inputs(file_path)
+    try:
+        outcome = process_files(method, inputs, out_path, jobs, **options)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--groups-file") from e
+    failed = outcome[outcome["error"].notna()]
+    click.echo(f"Processed {len(outcome) - len(failed)} of {len(outcome)} files.")
+    for row in failed.itertuples():
+        click.echo(f"{row.input}: {row.error}", err=True)
+    if report is not None:
+        save_dataframe_as_tsv(outcome, report)
+    return len(failed)
+
+
+@main.command()
+@click.option(
+    "--route",
+    "routes",
+    multiple=True,
+    metavar="PATTERN=METHOD",
+    help="Process files whose name matches PATTERN with METHOD, the first matching route applies. Replaces the "
+    "default routes: *[Aa]lkane* to alkanes, *.csv, *.xls and *.xlsx to sequence and *.txt to msdial.",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes, kept alive between files.",
+)
+@click.option("--interval", type=click.FloatRange(min=0), default=2.0, show_default=True, help="Seconds between polls.")
+@click.option(
+    "--settle",
+    type=click.FloatRange(min=0),
+    default=5.0,
+    show_default=True,
+    help="Seconds a file must stay unchanged before it is processed, to skip files still being written.",
+)
+@click.option(
+    "--ledger",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="File recording processed files, so that they are not processed again after a restart. "
+    "Defaults to .rcx_tk-ledger.jsonl in the watched directory.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="RCX_TK_CACHE_DIR",
+    default=None,
+    help="Directory caching parsed msdial files and processed outputs between runs.",
+)
+@click.option("--cache-size", type=click.IntRange(min=0), default=2048, show_default=True, help="Size cap in MiB.")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.argument("out_path")
+def watch(directory, out_path, routes, jobs, interval, settle, ledger, cache_dir, cache_size):
+    """Watch DIRECTORY and process new or changed files into OUT_PATH, a directory or a path template.
+
+    Args:
+        directory (path): The watched directory.
+        out_path (path): A directory or a template with the placeholders {stem}, {name}, {dir} and {method}.
+        routes (list[string]): Routing rules written as PATTERN=METHOD.
+        jobs (int): Number of worker processes.
+        interval (float): Seconds between polls.
+        settle (float): Seconds a file must stay unchanged before it is processed.
+        ledger (path): File recording processed files.
+        cache_dir (path): Directory caching parsed msdial files and processed outputs between runs.
+        cache_size (int): Size cap of the cache in MiB.
+    """
+    import logging
+    from rcx_tk import watch as watcher
+
+    try:
+        parsed_routes = [watcher.parse_route(route) for route in routes] or watcher.DEFAULT_ROUTES
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--route") from e
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    click.echo(f"Watching {directory}, press Ctrl+C to stop.", err=True)
+    try:
+        watcher.watch(
+            directory,
+            out_path,
+            parsed_routes,
+            jobs,
+            interval,
+            settle,
+            ledger,
+            cache_dir=cache_dir,
+            cache_size=cache_size * 1024**2,
+        )
+    except KeyboardInterrupt:
+        click.echo("Stopped watching.", err=True)
 
 
 if __name__ == "__main__":
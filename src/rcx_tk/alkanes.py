@@ -1,28 +1,42 @@
 import pandas as pd
 from rcx_tk.io import read_file
-from rcx_tk.io import save_dataframe_as_tsv
+from rcx_tk.io import save_dataframe
+
+ALKANE_COLUMNS = {"Carbon number": "carbon_number", "RT (min)": "rt"}
 
 
 def process_alkane_file(file_path: str, out_path: str) -> None:
     """Processes an alkane file, keeping and renaming specific columns.
 
+    Only the columns in `ALKANE_COLUMNS` are parsed from the file.
+
     Args:
         file_path (str): A path to the alkane file.
         out_path (str): A path where processed alkane file is exported.
     """
-    df = read_file(file_path)
+    df = read_alkane_file(file_path)
     df = process_alkanes(df)
-    save_dataframe_as_tsv(df, out_path)
+    save_dataframe(df, out_path)
+
+
+def read_alkane_file(file_path: str) -> pd.DataFrame:
+    """Imports the columns of an alkane file used by `process_alkanes`.
+
+    Args:
+        file_path (str): A path to the alkane file.
+
+    Returns:
+        pd.DataFrame: The columns in `ALKANE_COLUMNS`.
+    """
+    return read_file(file_path, columns=list(ALKANE_COLUMNS))
 
 
-def process_alkanes(
-    df: pd.DataFrame, columns_to_keep: list[str] = {"Carbon number": "carbon_number", "RT (min)": "rt"}
-) -> pd.DataFrame:
+def process_alkanes(df: pd.DataFrame, columns_to_keep: dict[str, str] = ALKANE_COLUMNS) -> pd.DataFrame:
     """Process dataframe with alkanes to fit the msdial format.
 
     Args:
         df (pd.DataFrame): Alkanes in MSDial format.
-        columns_to_keep (list[str]): List of columns to keep. Default for MSDial files.
+        columns_to_keep (dict[str, str]): Columns to rename, with their new names. Default for MSDial files.
 
     Returns:
         pd.DataFrame: Transformed alkane file dataframe in format used at RCX.
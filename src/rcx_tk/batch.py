@@ -0,0 +1,335 @@
+import glob
+import importlib
+import inspect
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import pandas as pd
+from rcx_tk import __version__
+from rcx_tk import cache
+from rcx_tk import profiling
+from rcx_tk.io import split_extension
+from rcx_tk.pipeline import FINISHED
+from rcx_tk.pipeline import describe_error
+from rcx_tk.pipeline import run_pipeline
+
+PROCESSORS: dict[str, str] = {
+    "sequence": "rcx_tk.sequence:process_sequence_file",
+    "alkanes": "rcx_tk.alkanes:process_alkane_file",
+    "msdial": "rcx_tk.msdial:process_msdial_file",
+}
+
+STAGES: dict[str, tuple[str, str, str]] = {
+    "sequence": ("rcx_tk.sequence:read_sequence_file", "rcx_tk.sequence:process_sequence", "rcx_tk.io:save_dataframe"),
+    "alkanes": ("rcx_tk.alkanes:read_alkane_file", "rcx_tk.alkanes:process_alkanes", "rcx_tk.io:save_dataframe"),
+    "msdial": ("rcx_tk.msdial:read_msdial_file", "rcx_tk.msdial:cluster_msdial", "rcx_tk.msdial:save_msdial"),
+}
+
+INPUT_EXTENSIONS = (".csv", ".tsv", ".txt", ".xls", ".xlsx")
+
+EXECUTION_OPTIONS = frozenset(
+    {"file_path", "out_path", "chunk_size", "workers", "cache_dir", "cache_size", "groups_path"}
+)
+
+
+def load_processor(method: str) -> Callable[..., None]:
+    """Imports the processing function of a method, so that only the modules of the chosen method are loaded.
+
+    Args:
+        method (str): The processing method, one of `PROCESSORS`.
+
+    Returns:
+        Callable[..., None]: The function processing an input file into an output file.
+    """
+    return _import(PROCESSORS[method])
+
+
+def load_stages(method: str, options: dict) -> tuple[Callable, Callable, Callable] | None:
+    """Imports the read, process and write stages of a method, binding the options each stage accepts.
+
+    Args:
+        method (str): The processing method, one of `STAGES`.
+        options (dict): Keyword arguments of the processing function.
+
+    Returns:
+        tuple[Callable, Callable, Callable] | None: Functions reading an input file, processing the data read
+            and writing the processed data to an output file, or None if an option is given that none of the
+            stages accepts, e.g. one changing the number of outputs or streaming the input.
+    """
+    stages = [_import(stage) for stage in STAGES[method]]
+    accepted = [inspect.signature(stage).parameters for stage in stages]
+    # Outputs are cached by the batch itself, the cache only reaches stages reading through it.
+    bound = {name: value for name, value in options.items() if name not in ("cache_dir", "cache_size")}
+    if any(
+        value is not None and not any(name in parameters for parameters in accepted) for name, value in bound.items()
+    ):
+        return None
+    read, process, write = (
+        partial(stage, **{name: value for name, value in options.items() if name in parameters})
+        for stage, parameters in zip(stages, accepted)
+    )
+    return read, process, write
+
+
+def _import(target: str) -> Callable:
+    """Imports a function given as "module:function".
+
+    Args:
+        target (str): The module and the name of the function.
+
+    Returns:
+        Callable: The function.
+    """
+    module, function = target.split(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def collect_inputs(source: str) -> list[str]:
+    """Lists the input files of a batch.
+
+    Args:
+        source (str): A directory, whose supported files, compressed or not, are processed, a glob pattern,
+            or a manifest file listing one input path per line, relative to the manifest.
+
+    Raises:
+        ValueError: Error if the source matches no files.
+
+    Returns:
+        list[str]: Paths of the input files, sorted unless given by a manifest.
+    """
+    if os.path.isdir(source):
+        names = sorted(os.listdir(source))
+        inputs = [os.path.join(source, name) for name in names if split_extension(name)[1] in INPUT_EXTENSIONS]
+    elif glob.has_magic(source):
+        inputs = sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+    elif os.path.isfile(source):
+        inputs = _read_manifest(source)
+    else:
+        inputs = []
+
+    if not inputs:
+        raise ValueError(f"No input files found for {source}.")
+    return inputs
+
+
+def output_path(template: str, file_path: str, method: str) -> str:
+    """Derives the output path of an input file.
+
+    Args:
+        template (str): Output path with the placeholders {stem}, {name}, {dir} and {method},
+            or a directory, in which case the output is named {stem}.tsv. The stem leaves out a compression
+            extension too, e.g. "alignment" for "alignment.txt.gz". A {sheet} placeholder is kept
+            for the sequence processing to fill in.
+        file_path (str): The path to the input file.
+        method (str): The processing method.
+
+    Returns:
+        str: The output path.
+    """
+    if "{" not in template:
+        template = os.path.join(template, "{stem}.tsv")
+    return expand_template(template, file_path, method)
+
+
+def expand_template(template: str, file_path: str, method: str) -> str:
+    """Fills the placeholders {stem}, {name}, {dir} and {method} of a path template for an input file.
+
+    Args:
+        template (str): The path template, see `output_path`. A {sheet} placeholder is kept.
+        file_path (str): The path to the input file.
+        method (str): The processing method.
+
+    Returns:
+        str: The path for the input file.
+    """
+    name = os.path.basename(file_path)
+    return template.format(
+        stem=split_extension(name)[0], name=name, dir=os.path.dirname(file_path), method=method, sheet="{sheet}"
+    )
+
+
+def process_file(
+    method: str,
+    file_path: str,
+    out_path: str,
+    cache_dir: str | None = None,
+    cache_size: int = cache.DEFAULT_CACHE_SIZE,
+    **options,
+) -> bool:
+    """Processes a single file, reusing the output of an earlier run on the same content with the same parameters.
+
+    Outputs are cached only if `cache_dir` is given, in the same size-capped cache as parsed inputs. They are keyed
+    on the input's content, the rcx-tk version, the method, the output file name and the parameters of the
+    processing function including its defaults. `EXECUTION_OPTIONS`, which do not change the output, are left out.
+
+    Args:
+        method (str): The processing method, one of `PROCESSORS`.
+        file_path (str): The path to the input file.
+        out_path (str): The path to the output file.
+        cache_dir (str | None, optional): The cache directory. Defaults to None, i.e. no caching.
+        cache_size (int, optional): Size cap of the cache in bytes. Defaults to 2 GiB.
+        **options: Further keyword arguments passed to the processing function.
+
+    Returns:
+        bool: Whether the output was taken from the cache.
+    """
+    processor = load_processor(method)
+    if "cache_dir" in inspect.signature(processor).parameters:
+        options.update(cache_dir=cache_dir, cache_size=cache_size)
+
+    with profiling.stage(method, file=os.path.basename(file_path)) as counts:
+        if cache_dir is None:
+            cache.unshare(out_path)
+            processor(file_path, out_path, **options)
+            hit = False
+        else:
+            key = result_key(cache_dir, method, file_path, out_path, options)
+            hit = cache.reuse_or_store(
+                cache_dir, key, out_path, lambda path: processor(file_path, path, **options), cache_size
+            )
+        counts["cache_hit"] = hit
+    return hit
+
+
+def result_key(cache_dir: str, method: str, file_path: str, out_path: str, options: dict) -> str:
+    """Derives the cache key of a processed output, see `process_file`.
+
+    Args:
+        cache_dir (str): The cache directory, remembering digests of earlier inputs.
+        method (str): The processing method, one of `PROCESSORS`.
+        file_path (str): The path to the input file.
+        out_path (str): The path to the output file.
+        options (dict): Further keyword arguments of the processing function.
+
+    Returns:
+        str: The key of the output in the cache.
+    """
+    arguments = inspect.signature(load_processor(method)).bind(file_path, out_path, **options)
+    arguments.apply_defaults()
+    parameters = sorted((name, value) for name, value in arguments.arguments.items() if name not in EXECUTION_OPTIONS)
+    digest = cache.input_digest(cache_dir, file_path)
+    return cache.cache_key("result", __version__, method, digest, os.path.basename(out_path), parameters)
+
+
+def process_files(method: str, inputs: list[str], out_template: str, jobs: int = 1, **options) -> pd.DataFrame:
+    """Processes a batch of files, continuing past failures.
+
+    Files are read, processed and written in a pipeline, see `rcx_tk.pipeline.run_pipeline`, so that reading
+    and writing files overlaps with processing. Options that none of the stages of the method accepts, e.g. `sheets`
+    or `chunk_size`, fall back to processing every file from start to end in a pool of `jobs` processes, as does
+    a `groups_path`, which is a template giving every file a groups file of its own.
+
+    Args:
+        method (str): The processing method, one of `PROCESSORS`.
+        inputs (list[str]): Paths of the input files.
+        out_template (str): Output path template, see `output_path`.
+        jobs (int, optional): Number of files processed in parallel processes. Defaults to 1.
+        **options: Further keyword arguments passed to the processing function.
+
+    Raises:
+        ValueError: Error if a `groups_path` template gives several files the same groups file.
+
+    Returns:
+        pd.DataFrame: Report with the input, output and error, if any, of every file.
+    """
+    outputs = [output_path(out_template, file_path, method) for file_path in inputs]
+    file_options = [options] * len(inputs)
+    if options.get("groups_path") is not None:
+        # Files sharing a groups file would overwrite each other's groups, or write it concurrently.
+        groups_paths = [expand_template(options["groups_path"], file_path, method) for file_path in inputs]
+        if len(set(groups_paths)) < len(groups_paths):
+            raise ValueError("Every file of a batch needs its own groups file, e.g. from a template with {stem}.")
+        file_options = [{**options, "groups_path": groups_path} for groups_path in groups_paths]
+    tasks = [(method, *task) for task in zip(inputs, outputs, file_options)]
+
+    stages = None if options.get("groups_path") is not None else load_stages(method, options)
+    if stages is not None:
+        errors = _process_in_pipeline(method, list(zip(inputs, outputs)), stages, jobs, options)
+    elif jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            errors = list(executor.map(try_process_file, *zip(*tasks)))
+    else:
+        errors = [try_process_file(*task) for task in tasks]
+
+    return pd.DataFrame({"input": inputs, "output": outputs, "error": errors})
+
+
+def try_process_file(method: str, file_path: str, out_path: str, options: dict) -> str | None:
+    """Processes a single file, catching errors so that a batch or watch continues past them.
+
+    Args:
+        method (str): The processing method.
+        file_path (str): The path to the input file.
+        out_path (str): The path to the output file.
+        options (dict): Further keyword arguments passed to the processing function.
+
+    Returns:
+        str | None: Description of the error if processing failed, otherwise None.
+    """
+    try:
+        out_dir = os.path.dirname(out_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        process_file(method, file_path, out_path, **options)
+    except Exception as e:
+        return describe_error(e)
+    return None
+
+
+def _process_in_pipeline(
+    method: str, files: list[tuple[str, str]], stages: tuple[Callable, Callable, Callable], jobs: int, options: dict
+) -> list[str | None]:
+    """Processes files in a read, process and write pipeline, reusing and caching outputs like `process_file`.
+
+    Args:
+        method (str): The processing method.
+        files (list[tuple[str, str]]): Paths of the input files and of their outputs.
+        stages (tuple[Callable, Callable, Callable]): The stages of the method, see `load_stages`.
+        jobs (int): Number of processes running the processing stage.
+        options (dict): Further keyword arguments of the processing function.
+
+    Returns:
+        list[str | None]: Description of the error of every file whose processing failed, otherwise None.
+    """
+    read_stage, process_stage, write_stage = stages
+    cache_dir = options.get("cache_dir")
+    cache_size = options.get("cache_size", cache.DEFAULT_CACHE_SIZE)
+    processor_options = {name: value for name, value in options.items() if name not in ("cache_dir", "cache_size")}
+
+    def read(paths: tuple[str, str]) -> object:
+        file_path, out_path = paths
+        out_dir = os.path.dirname(out_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        if cache_dir is not None:
+            key = result_key(cache_dir, method, file_path, out_path, processor_options)
+            if cache.reuse(cache_dir, key, out_path):
+                return FINISHED
+        return read_stage(file_path)
+
+    def write(paths: tuple[str, str], data: object) -> None:
+        file_path, out_path = paths
+        if cache_dir is None:
+            cache.unshare(out_path)
+            write_stage(data, out_path)
+        else:
+            key = result_key(cache_dir, method, file_path, out_path, processor_options)
+            cache.reuse_or_store(cache_dir, key, out_path, lambda path: write_stage(data, path), cache_size)
+
+    return run_pipeline(files, read, process_stage, write, workers=jobs)
+
+
+def _read_manifest(manifest_path: str) -> list[str]:
+    """Reads the input paths listed in a manifest file, skipping blank lines and # comments.
+
+    Args:
+        manifest_path (str): The path to the manifest.
+
+    Returns:
+        list[str]: Paths of the input files.
+    """
+    base = os.path.dirname(manifest_path)
+    with open(manifest_path) as manifest:
+        lines = [line.strip() for line in manifest]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Callable
+
+DEFAULT_CACHE_SIZE = 2 * 1024**3
+
+_ENTRIES_DIR = "entries"
+_INPUTS_FILE = "inputs.json"
+
+
+def file_digest(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Computes the SHA-256 digest of a file's content.
+
+    Args:
+        file_path (str): The path to the file.
+        block_size (int, optional): Number of bytes hashed at once. Defaults to 1 MiB.
+
+    Returns:
+        str: Hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while block := file.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_digest(cache_dir: str, file_path: str) -> str:
+    """Returns the content digest of an input file, hashing it again only if its size or mtime changed.
+
+    Args:
+        cache_dir (str): The cache directory remembering digests of earlier inputs.
+        file_path (str): The path to the input file.
+
+    Returns:
+        str: Hexadecimal digest of the file's content.
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    inputs_path = os.path.join(cache_dir, _INPUTS_FILE)
+    inputs = _read_json(inputs_path)
+
+    known = inputs.get(path)
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["digest"]
+
+    digest = file_digest(path)
+    inputs[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+    _write_json(inputs_path, inputs)
+    return digest
+
+
+def cache_key(*parts: object) -> str:
+    """Combines the parts identifying a cached result into a single key.
+
+    Args:
+        *parts (object): Values whose string representations identify the result.
+
+    Returns:
+        str: Hexadecimal key.
+    """
+    return hashlib.sha256("\0".join(map(str, parts)).encode()).hexdigest()
+
+
+def lookup(cache_dir: str, key: str) -> str | None:
+    """Finds a cache entry and marks it as recently used.
+
+    Args:
+        cache_dir (str): The cache directory.
+        key (str): Key of the entry.
+
+    Returns:
+        str | None: The directory holding the entry's files, or None on a miss.
+    """
+    entry = os.path.join(cache_dir, _ENTRIES_DIR, key)
+    if not os.path.isdir(entry):
+        return None
+    os.utime(entry)
+    return entry
+
+
+def store(cache_dir: str, key: str, write: Callable[[str], None], max_bytes: int = DEFAULT_CACHE_SIZE) -> str:
+    """Adds an entry to the cache and evicts least recently used entries above the size cap.
+
+    Args:
+        cache_dir (str): The cache directory.
+        key (str): Key of the entry.
+        write (Callable[[str], None]): Function writing the entry's files into the directory it is given.
+        max_bytes (int, optional): Size cap of all entries together. Defaults to 2 GiB.
+
+    Returns:
+        str: The directory holding the entry's files.
+    """
+    entries = os.path.join(cache_dir, _ENTRIES_DIR)
+    os.makedirs(entries, exist_ok=True)
+    entry = os.path.join(entries, key)
+
+    staging = tempfile.mkdtemp(prefix=f".{key}-", dir=entries)
+    try:
+        write(staging)
+        os.replace(staging, entry)
+    except OSError:
+        if not os.path.isdir(entry):
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    evict(cache_dir, max_bytes, keep=key)
+    return entry
+
+
+def reuse_or_store(
+    cache_dir: str, key: str, out_path: str, produce: Callable[[str], None], max_bytes: int = DEFAULT_CACHE_SIZE
+) -> bool:
+    """Places the cached output files of a computation next to `out_path`, computing and caching them on a miss.
+
+    The files are hard-linked out of the cache where possible and copied otherwise.
+
+    Args:
+        cache_dir (str): The cache directory.
+        key (str): Key of the entry.
+        out_path (str): The path of the output. Further outputs written next to it are cached as well.
+        produce (Callable[[str], None]): Function writing the output to the path it is given.
+        max_bytes (int, optional): Size cap of all entries together. Defaults to 2 GiB.
+
+    Returns:
+        bool: Whether the output was taken from the cache.
+    """
+    entry = lookup(cache_dir, key)
+    hit = entry is not None
+    if not hit:
+        name = os.path.basename(out_path)
+        entry = store(cache_dir, key, lambda directory: produce(os.path.join(directory, name)), max_bytes)
+    _place_entry(entry, out_path)
+    return hit
+
+
+def reuse(cache_dir: str, key: str, out_path: str) -> bool:
+    """Places the cached output files of a computation next to `out_path`, if they are cached.
+
+    Args:
+        cache_dir (str): The cache directory.
+        key (str): Key of the entry.
+        out_path (str): The path of the output.
+
+    Returns:
+        bool: Whether the output was taken from the cache.
+    """
+    entry = lookup(cache_dir, key)
+    if entry is None:
+        return False
+    _place_entry(entry, out_path)
+    return True
+
+
+def place(source: str, destination: str) -> None:
+    """Hard-links a cached file to its destination, or copies it where linking is not possible.
+
+    Args:
+        source (str): The cached file.
+        destination (str): The path to place it at, replacing any existing file.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def unshare(file_path: str) -> None:
+    """Removes a file hard-linked to other paths, so that writing to its path leaves cached copies intact.
+
+    Args:
+        file_path (str): The path to the file.
+    """
+    if os.path.isfile(file_path) and os.stat(file_path).st_nlink > 1:
+        os.remove(file_path)
+
+
+def evict(cache_dir: str, max_bytes: int, keep: str | None = None) -> None:
+    """Removes least recently used entries until all entries together fit into the size cap.
+
+    Args:
+        cache_dir (str): The cache directory.
+        max_bytes (int): Size cap of all entries together.
+        keep (str | None, optional): Key of an entry that is never removed. Defaults to None.
+    """
+    entries = os.path.join(cache_dir, _ENTRIES_DIR)
+    if not os.path.isdir(entries):
+        return
+
+    candidates = []
+    for name in os.listdir(entries):
+        path = os.path.join(entries, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        candidates.append((os.stat(path).st_mtime_ns, _size(path), name, path))
+
+    total = sum(size for _, size, _, _ in candidates)
+    for _, size, name, path in sorted(candidates):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _place_entry(entry: str, out_path: str) -> None:
+    """Places the files of a cache entry next to `out_path`.
+
+    Args:
+        entry (str): The directory holding the entry's files.
+        out_path (str): The path of the output.
+    """
+    out_dir = os.path.dirname(out_path)
+    for name in os.listdir(entry):
+        place(os.path.join(entry, name), os.path.join(out_dir, name))
+
+
+def _size(path: str) -> int:
+    """Total size of the files in a directory tree.
+
+    Args:
+        path (str): The directory.
+
+    Returns:
+        int: Size in bytes.
+    """
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _read_json(file_path: str) -> dict:
+    """Reads a JSON object, treating a missing or unreadable file as empty.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        dict: The parsed object.
+    """
+    try:
+        with open(file_path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(file_path: str, content: dict) -> None:
+    """Atomically replaces a JSON file.
+
+    Args:
+        file_path (str): The path to the file.
+        content (dict): The object to write.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    descriptor, staging = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+    with os.fdopen(descriptor, "w") as file:
+        json.dump(content, file)
+    os.replace(staging, file_path)
@@ -1,42 +1,436 @@
+import importlib.util
+import json
 import os
+from collections.abc import Callable
+import numpy as np
 import pandas as pd
+from pandas.io.parsers import TextFileReader
+from rcx_tk import __version__
+from rcx_tk import cache
+from rcx_tk import profiling
 
+EXCEL_ENGINE: str | None = "calamine" if importlib.util.find_spec("python_calamine") else None
+ALL_SHEETS = "*"
 
-def read_file(file_path: str) -> pd.DataFrame:
+COMPRESSIONS: dict[str, str] = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+DELIMITED_EXTENSIONS = (".csv", ".tsv", ".txt")
+
+
+def split_extension(file_path: str) -> tuple[str, str, str | None]:
+    """Splits a path into its stem, its format extension and the compression named by a further extension.
+
+    Args:
+        file_path (str): The path, e.g. "alignment.txt.gz".
+
+    Returns:
+        tuple[str, str, str | None]: The path without extensions, the lowercase format extension and the
+            compression, one of `COMPRESSIONS`, or None for an uncompressed file, e.g. ("alignment", ".txt", "gzip").
+    """
+    root, extension = os.path.splitext(file_path)
+    compression = COMPRESSIONS.get(extension.lower())
+    if compression is not None:
+        root, extension = os.path.splitext(root)
+    return root, extension.lower(), compression
+
+
+def read_file(file_path: str, columns: list[str] | None = None, dtype: dict | None = None) -> pd.DataFrame:
     """Imports the metadata file to pandas dataframe.
 
+    CSV and TSV files may be compressed with gzip, bzip2, xz or zstd, named by a further extension as in `COMPRESSIONS`,
+    e.g. "alignment.txt.gz". They are decompressed while parsing, without unpacking them to disk.
+
     Args:
         file_path (str): The path to the input data.
+        columns (list[str] | None, optional): Names of the columns to parse, matched ignoring surrounding whitespace.
+            Other columns are skipped by the parsers. Defaults to None, parsing all columns.
+        dtype (dict | None, optional): Dtypes of columns, by name as written in the file. Defaults to None.
 
     Raises:
-        ValueError: Error if any file format except for csv, xls, xlsx, txt or tsv is provided.
+        ValueError: Error if any file format except for csv, xls, xlsx, txt, tsv, parquet, feather or arrow is provided.
 
     Returns:
         pd.DataFrame: Dataframe containing the metadata.
     """
-    file_extension = os.path.splitext(file_path)[1].lower()
-    if file_extension == ".csv":
-        return pd.read_csv(file_path, encoding="UTF-8")
+    with profiling.stage("read", file=os.path.basename(file_path)) as counts:
+        df = _read_any(file_path, columns, dtype)
+        counts.update(rows=len(df), columns=df.shape[1])
+    return df
+
+
+def _read_any(file_path: str, columns: list[str] | None, dtype: dict | None) -> pd.DataFrame:
+    """Imports a file with the parser chosen by its extension, see `read_file`.
+
+    Args:
+        file_path (str): The path to the input data.
+        columns (list[str] | None): Names of the columns to parse, or None to parse all columns.
+        dtype (dict | None): Dtypes of columns, by name as written in the file.
+
+    Raises:
+        ValueError: Error if the file format is not supported.
+
+    Returns:
+        pd.DataFrame: The data.
+    """
+    usecols = None if columns is None else _column_filter(columns)
+    _, file_extension, compression = split_extension(file_path)
+    if file_extension in DELIMITED_EXTENSIONS:
+        return _read_delimited(file_path, usecols=usecols, dtype=dtype)
+    elif compression is not None:
+        raise ValueError("Unsupported compressed file format. Please provide a compressed CSV or TSV file.")
     elif file_extension in [".xls", ".xlsx"]:
-        return pd.read_excel(file_path)
+        return pd.read_excel(file_path, engine=EXCEL_ENGINE, usecols=usecols, dtype=dtype)
+    elif file_extension == ".parquet":
+        return _apply_dtypes(pd.read_parquet(file_path, columns=_columnar_selection(file_path, usecols)), dtype)
+    elif file_extension in [".feather", ".arrow"]:
+        return _apply_dtypes(pd.read_feather(file_path, columns=_columnar_selection(file_path, usecols)), dtype)
+    else:
+        raise ValueError("Unsupported file format. Please provide a CSV, Excel, TSV, Parquet or Feather file.")
+
+
+def read_excel_sheets(
+    file_path: str, sheets: list[str] | str = ALL_SHEETS, columns: list[str] | None = None, dtype: dict | None = None
+) -> dict[str, pd.DataFrame]:
+    """Imports several sheets of an Excel workbook, opening it only once.
+
+    Args:
+        file_path (str): The path to the workbook.
+        sheets (list[str] | str, optional): Names of the sheets to read. Defaults to `ALL_SHEETS`, reading every sheet.
+        columns (list[str] | None, optional): Names of the columns to parse, see `read_file`. Defaults to None.
+        dtype (dict | None, optional): Dtypes of columns, by name as written in the file. Defaults to None.
+
+    Raises:
+        ValueError: Error if any file format except for xls or xlsx is provided.
+
+    Returns:
+        dict[str, pd.DataFrame]: Dataframes of the sheets, by sheet name in workbook order.
+    """
+    if os.path.splitext(file_path)[1].lower() not in [".xls", ".xlsx"]:
+        raise ValueError("Unsupported file format. Please provide an Excel file.")
+
+    usecols = None if columns is None else _column_filter(columns)
+    with profiling.stage("read", file=os.path.basename(file_path)) as counts:
+        with pd.ExcelFile(file_path, engine=EXCEL_ENGINE) as workbook:
+            names = workbook.sheet_names if sheets == ALL_SHEETS else sheets
+            workbook_sheets = {name: workbook.parse(name, usecols=usecols, dtype=dtype) for name in names}
+        counts.update(sheets=len(workbook_sheets), rows=sum(len(df) for df in workbook_sheets.values()))
+    return workbook_sheets
+
+
+def _column_filter(columns: list[str]) -> Callable[[str], bool]:
+    """Builds a predicate selecting columns by name, ignoring whitespace around the names in the file.
+
+    Args:
+        columns (list[str]): Names of the columns to select.
+
+    Returns:
+        Callable[[str], bool]: Whether a column name of the file is selected.
+    """
+    wanted = set(columns)
+    return lambda name: str(name).strip() in wanted
+
+
+def _columnar_selection(file_path: str, usecols: Callable[[str], bool] | None) -> list[str] | None:
+    """Names of the columns of a Parquet or Feather file to read, found from the schema stored in the file.
+
+    Only the schema is read, so that the columns not selected are never decoded.
+
+    Args:
+        file_path (str): The path to the Parquet or Feather file.
+        usecols (Callable[[str], bool] | None): Predicate selecting columns, or None to read all.
+
+    Returns:
+        list[str] | None: Names of the selected columns as stored in the file, or None to read all.
+    """
+    if usecols is None:
+        return None
+    if split_extension(file_path)[1] == ".parquet":
+        import pyarrow.parquet
+
+        names = pyarrow.parquet.read_schema(file_path).names
+    else:
+        import pyarrow.ipc
+
+        with pyarrow.ipc.open_file(file_path) as reader:
+            names = reader.schema.names
+    return [name for name in names if usecols(name)]
+
+
+def _apply_dtypes(df: pd.DataFrame, dtype: dict | None) -> pd.DataFrame:
+    """Applies dtypes to an already parsed dataframe.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+        dtype (dict | None): Dtypes of columns, by name.
+
+    Returns:
+        pd.DataFrame: The columns with the given dtypes.
+    """
+    if dtype:
+        df = df.astype({column: kind for column, kind in dtype.items() if column in df.columns})
+    return df
+
+
+def read_file_in_chunks(file_path: str, chunk_size: int, **kwargs) -> TextFileReader:
+    """Imports a delimited text file in blocks of rows, parsed the same way as `read_file`.
+
+    Args:
+        file_path (str): The path to the input data.
+        chunk_size (int): Number of rows per block.
+        **kwargs: Further arguments passed to `pd.read_csv`, e.g. `dtype`, `usecols` or `skiprows`.
+
+    Returns:
+        TextFileReader: Iterator over the blocks, usable as a context manager.
+    """
+    return _read_delimited(file_path, chunksize=chunk_size, **kwargs)
+
+
+def read_msdial(
+    file_path: str,
+    skip_rows: int = 3,
+    metadata_cols: int = 28,
+    index_col: str = "Alignment ID",
+    dtype: str = "float64",
+    chunk_size: int | None = None,
+    cache_dir: str | None = None,
+    cache_size: int = cache.DEFAULT_CACHE_SIZE,
+) -> tuple[pd.DataFrame, pd.DataFrame | TextFileReader]:
+    """Imports an MSDial alignment export, parsing the header block separately from the alignments.
+
+    The header block holds the class, file type, injection order and batch rows followed by the column names.
+    The alignments below it are read with the dtypes inferred for the metadata columns
+    and with `dtype` for the abundance columns.
+
+    Args:
+        file_path (str): The path to the input data, CSV or TSV.
+        skip_rows (int, optional): Number of header rows between the first line and the column names. Defaults to 3.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        index_col (str, optional): Column to denote the index. Defaults to "Alignment ID".
+        dtype (str, optional): Dtype of the abundance columns. Defaults to "float64".
+        chunk_size (int | None, optional): Read the alignments in blocks of this many rows. Defaults to None.
+        cache_dir (str | None, optional): Directory caching parsed files, see `read_msdial_cached`. Ignored when
+            reading in chunks. Defaults to None.
+        cache_size (int, optional): Size cap of the cache in bytes. Defaults to 2 GiB.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame | TextFileReader]: The header block as text, with the column names as its
+            last row, and the alignments, or an iterator over blocks of them if `chunk_size` is given.
+    """
+    if cache_dir is not None and chunk_size is None:
+        return read_msdial_cached(file_path, cache_dir, cache_size, skip_rows, metadata_cols, index_col, dtype)
+
+    with profiling.stage("read", file=os.path.basename(file_path)) as counts:
+        header = _read_delimited(file_path, header=None, nrows=skip_rows + 2, dtype=str)
+        header.columns = header.iloc[-1]
+        header = header.set_index(index_col)
+
+        abundance_dtypes = dict.fromkeys(header.columns[metadata_cols:], dtype)
+        alignments = _read_delimited(
+            file_path, skiprows=skip_rows + 1, index_col=index_col, dtype=abundance_dtypes, chunksize=chunk_size
+        )
+        counts["columns"] = header.shape[1]
+        if chunk_size is None:
+            counts["rows"] = len(alignments)
+    return header, alignments
+
+
+def read_msdial_cached(
+    file_path: str,
+    cache_dir: str,
+    cache_size: int = cache.DEFAULT_CACHE_SIZE,
+    skip_rows: int = 3,
+    metadata_cols: int = 28,
+    index_col: str = "Alignment ID",
+    dtype: str = "float64",
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Imports an MSDial alignment export like `read_msdial`, reusing an earlier parse of the same file.
+
+    The abundance matrix is cached as a .npy file and reloaded memory-mapped without a copy,
+    the header block and the metadata columns as TSV files with their dtypes, see `_save_cached_frame`.
+    Nothing is unpickled, so that a cache shared with others cannot run code on the reading machine.
+    Entries are keyed by the file's content and the parsing options, and evicted least recently used first.
+
+    Args:
+        file_path (str): The path to the input data, CSV or TSV.
+        cache_dir (str): Directory holding the cache.
+        cache_size (int, optional): Size cap of the cache in bytes. Defaults to 2 GiB.
+        skip_rows (int, optional): Number of header rows between the first line and the column names. Defaults to 3.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        index_col (str, optional): Column to denote the index. Defaults to "Alignment ID".
+        dtype (str, optional): Dtype of the abundance columns. Defaults to "float64".
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The header block and the alignments, see `read_msdial`.
+    """
+    digest = cache.input_digest(cache_dir, file_path)
+    key = cache.cache_key("msdial", __version__, digest, skip_rows, metadata_cols, index_col, dtype, "tsv")
+
+    entry = cache.lookup(cache_dir, key)
+    if entry is None:
+        header, alignments = read_msdial(file_path, skip_rows, metadata_cols, index_col, dtype)
+
+        def write(directory: str) -> None:
+            _save_cached_frame(header, os.path.join(directory, "header"))
+            _save_cached_frame(alignments.iloc[:, :metadata_cols], os.path.join(directory, "metadata"))
+            np.save(os.path.join(directory, "abundances.npy"), alignments.iloc[:, metadata_cols:].to_numpy())
+
+        cache.store(cache_dir, key, write, cache_size)
+        return header, alignments
+
+    with profiling.stage("read", file=os.path.basename(file_path), cache_hit=True) as counts:
+        header = _load_cached_frame(os.path.join(entry, "header"))
+        metadata = _load_cached_frame(os.path.join(entry, "metadata"))
+        abundances = np.load(os.path.join(entry, "abundances.npy"), mmap_mode="r")
+        abundances = pd.DataFrame(abundances, index=metadata.index, columns=header.columns[metadata_cols:], copy=False)
+        counts.update(rows=len(metadata), columns=header.shape[1])
+    return header, pd.concat([metadata, abundances], axis=1)
+
+
+def _save_cached_frame(df: pd.DataFrame, path: str) -> None:
+    """Saves a dataframe to a TSV file, and the dtypes of its index and columns to a JSON file next to it.
+
+    Args:
+        df (pd.DataFrame): The dataframe, with unique column names.
+        path (str): The path of both files without their extensions.
+    """
+    df.to_csv(f"{path}.tsv", sep="\t")
+    dtypes = {"index": str(df.index.dtype), "columns": [str(dtype) for dtype in df.dtypes], "name": df.columns.name}
+    with open(f"{path}.json", "w") as file:
+        json.dump(dtypes, file)
+
+
+def _load_cached_frame(path: str) -> pd.DataFrame:
+    """Loads a dataframe saved by `_save_cached_frame`, parsing every column with its saved dtype.
+
+    Args:
+        path (str): The path of both files without their extensions.
+
+    Returns:
+        pd.DataFrame: The dataframe.
+    """
+    with open(f"{path}.json") as file:
+        dtypes = json.load(file)
+    names = pd.read_csv(f"{path}.tsv", sep="\t", nrows=0, index_col=0)
+    dtype = dict(zip(names.columns, dtypes["columns"]))
+    dtype[names.index.name] = dtypes["index"]
+    df = pd.read_csv(f"{path}.tsv", sep="\t", index_col=0, dtype=dtype)
+    df.columns.name = dtypes["name"]
+    return df
+
+
+def _read_delimited(file_path: str, **kwargs) -> pd.DataFrame | TextFileReader:
+    """Imports a CSV or TSV file, decompressing it while parsing if its name ends in one of `COMPRESSIONS`.
+
+    Args:
+        file_path (str): The path to the input data.
+        **kwargs: Further arguments passed to `pd.read_csv`.
+
+    Raises:
+        ValueError: Error if any file format except for csv, txt or tsv is provided.
+
+    Returns:
+        pd.DataFrame | TextFileReader: The data, or an iterator over blocks of it if `chunksize` is given.
+    """
+    _, file_extension, compression = split_extension(file_path)
+    if file_extension == ".csv":
+        return pd.read_csv(file_path, encoding="UTF-8", compression=compression, **kwargs)
     elif file_extension in [".tsv", ".txt"]:
-        return pd.read_csv(file_path, sep="\t")
+        return pd.read_csv(file_path, sep="\t", compression=compression, **kwargs)
     else:
-        raise ValueError("Unsupported file format. Please provide a CSV, Excel, or TSV file.")
+        raise ValueError("Unsupported file format. Please provide a CSV or TSV file.")
 
 
-def save_dataframe_as_tsv(df: pd.DataFrame, file_path: str, header: bool = True, index: bool = False) -> None:
-    """Saves the dataframe as a TSV file.
+def save_dataframe_as_tsv(
+    df: pd.DataFrame, file_path: str, header: bool = True, index: bool = False, mode: str = "w"
+) -> None:
+    """Saves the dataframe as a TSV file, compressed if its name ends in one of `COMPRESSIONS`, e.g. ".tsv.gz".
+
+    Appending to a compressed file adds a further compressed stream, which is read back as one file.
 
     Args:
         df (pd.DataFrame): The metadata dataframe.
         file_path (str): A path where the .TSV will be exported, containing the <fileName>.TSV.
         header (bool): Whether to write the header or not.
         index (bool): Whether to write the index or not.
+        mode (str): Write mode, "w" to overwrite or "a" to append to an existing file.
 
     Raises:
         ValueError: Error if provided <fileName> is of a different format than TSV.
     """
-    if os.path.splitext(file_path)[1] != ".tsv":
+    _, file_extension, compression = split_extension(file_path)
+    if file_extension != ".tsv":
         raise ValueError("Unsupported file format. Please point to a TSV file.")
-    df.to_csv(file_path, sep="\t", index=index, header=header)
+    df.to_csv(file_path, sep="\t", index=index, header=header, mode=mode, compression=compression)
+
+
+def save_dataframe_as_parquet(df: pd.DataFrame, file_path: str, index: bool = False, compression: str = "zstd") -> None:
+    """Saves the dataframe as a Parquet file.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+        file_path (str): A path where the .parquet file will be exported.
+        index (bool): Whether to write the index or not.
+        compression (str): Compression codec of the column chunks.
+    """
+    _to_columnar(df).to_parquet(file_path, index=index, compression=compression)
+
+
+def save_dataframe_as_feather(df: pd.DataFrame, file_path: str, index: bool = False, compression: str = "zstd") -> None:
+    """Saves the dataframe as a Feather (Arrow IPC) file.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+        file_path (str): A path where the .feather or .arrow file will be exported.
+        index (bool): Whether to write the index or not.
+        compression (str): Compression codec of the record batches.
+    """
+    df = _to_columnar(df)
+    if not index:
+        df = df.reset_index(drop=True)
+    df.to_feather(file_path, compression=compression)
+
+
+# Writers take the dataframe, the file path and whether to write the index. Column names are always written.
+WRITERS: dict[str, Callable[..., None]] = {
+    ".tsv": save_dataframe_as_tsv,
+    ".parquet": save_dataframe_as_parquet,
+    ".feather": save_dataframe_as_feather,
+    ".arrow": save_dataframe_as_feather,
+}
+
+
+def save_dataframe(df: pd.DataFrame, file_path: str, index: bool = False) -> None:
+    """Saves the dataframe with the writer registered in `WRITERS` for the file's extension.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+        file_path (str): A path where the dataframe will be exported.
+        index (bool): Whether to write the index or not.
+
+    Raises:
+        ValueError: Error if no writer is registered for the file's extension, or if a file other than TSV is to be
+            compressed.
+    """
+    _, file_extension, compression = split_extension(file_path)
+    writer = WRITERS.get(file_extension)
+    if writer is None:
+        raise ValueError("Unsupported file format. Please point to a TSV, Parquet or Feather file.")
+    if compression is not None and file_extension not in DELIMITED_EXTENSIONS:
+        raise ValueError("Unsupported compressed file format. Please point to a compressed TSV file.")
+    with profiling.stage("write", file=os.path.basename(file_path), rows=len(df), columns=df.shape[1]):
+        writer(df, file_path, index=index)
+
+
+def _to_columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """Prepares a dataframe for columnar formats, which need text column names and a single type per column.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+
+    Returns:
+        pd.DataFrame: The dataframe with text column names, and object columns and index converted to text.
+    """
+    df = df.set_axis(df.columns.astype(str), axis=1)
+    if pd.api.types.is_object_dtype(df.index.dtype):
+        df = df.set_axis(df.index.astype(str), axis=0)
+    object_columns = [column for column, dtype in df.dtypes.items() if pd.api.types.is_object_dtype(dtype)]
+    return df.astype(dict.fromkeys(object_columns, "str"))
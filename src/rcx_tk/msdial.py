@@ -1,71 +1,715 @@
+import hashlib
 import itertools
+import mmap
+import os
+import tempfile
 from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple
 import numpy as np
 import pandas as pd
-from rcx_tk.io import read_file
+from rcx_tk import profiling
+from rcx_tk.cache import DEFAULT_CACHE_SIZE
+from rcx_tk.io import read_file_in_chunks
+from rcx_tk.io import read_msdial
+from rcx_tk.io import save_dataframe
 from rcx_tk.io import save_dataframe_as_tsv
+from rcx_tk.io import split_extension
 from rcx_tk.utils import concat_str
 
 skip_rows = 3
 metadata_cols = 28
 index_col = "Alignment ID"
 
+RT_COLUMN = "Average Rt(min)"
 
-def process_msdial_file(file_path: str, out_path: str) -> None:
+_GROUPBY_REDUCTIONS: dict[Callable, str] = {np.mean: "mean", np.max: "max"}
+
+_SCAN_BLOCK_ELEMENTS = 2**16
+
+
+class SparseAbundances(NamedTuple):
+    """Abundance matrix in compressed sparse column (CSC) layout, storing only the positive abundances.
+
+    The layout is that of `scipy.sparse.csc_matrix((data, indices, indptr), shape)`: the stored entries of column
+    `j` are `data[indptr[j] : indptr[j + 1]]`, in the rows `indices[indptr[j] : indptr[j + 1]]` in ascending order.
+    """
+
+    data: np.ndarray
+    indices: np.ndarray
+    indptr: np.ndarray
+    shape: tuple[int, int]
+
+
+def process_msdial_file(
+    file_path: str,
+    out_path: str,
+    chunk_size: int | None = None,
+    workers: int = 1,
+    cache_dir: str | None = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    skip_rows: int = 3,
+    metadata_cols: int = 28,
+    index_col: str = "Alignment ID",
+    groups_path: str | None = None,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    rt_window: float | None = None,
+    sparse: bool = False,
+) -> None:
     """Process MSDial output file to group duplicate alignments.
 
     Args:
         file_path (str): Input file path.
+        out_path (str): Output file path. TSV files reproduce the layout of the input, Parquet and Feather files
+            hold the alignments as a typed table with the header block stored in the "msdial_header" attribute.
+        chunk_size (int | None, optional): Stream the file in blocks of this many rows into a TSV file, the only
+            output format supported then. Defaults to None, which reads the whole file at once.
+        workers (int, optional): Number of processes searching for duplicates. Defaults to 1.
+        cache_dir (str | None, optional): Directory caching parsed input files. Ignored with `chunk_size`, as the
+            file is then streamed rather than parsed as a whole. Defaults to None, i.e. no caching.
+        cache_size (int, optional): Size cap of the cache in bytes. Defaults to 2 GiB.
+        skip_rows (int, optional): Number of header rows between the first line and the column names. Defaults to 3.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        index_col (str, optional): Column to denote the index. Defaults to "Alignment ID".
+        groups_path (str | None, optional): File persisting per-column duplicate groups between runs, so that only
+            new or changed sample columns are scanned, see `find_duplicate_groups_incrementally`. Defaults to None.
+        rtol (float, optional): Relative tolerance within which abundances count as equal, see
+            `find_duplicate_groups`. Defaults to 0, i.e. exact matching.
+        atol (float, optional): Absolute tolerance within which abundances count as equal. Defaults to 0.
+        rt_window (float | None, optional): Retention time gap in minutes beyond which alignments are never
+            duplicates, see `find_duplicate_groups`. Defaults to None, i.e. any retention time.
+        sparse (bool, optional): Search for duplicates in a sparse matrix of the positive abundances rather than
+            a dense float copy of them, see `find_sparse_duplicate_groups`. Without `chunk_size`, the file is still
+            parsed into a dense table, which the output is taken from. Defaults to False.
+    """
+    if chunk_size is not None:
+        process_msdial_file_in_chunks(
+            file_path,
+            out_path,
+            chunk_size,
+            skip_rows,
+            metadata_cols,
+            index_col,
+            workers,
+            groups_path,
+            rtol,
+            atol,
+            rt_window,
+            sparse,
+        )
+        return
+    tables = read_msdial_file(file_path, skip_rows, metadata_cols, index_col, cache_dir, cache_size)
+    save_msdial(cluster_msdial(tables, metadata_cols, workers, groups_path, rtol, atol, rt_window, sparse), out_path)
+
+
+def read_msdial_file(
+    file_path: str,
+    skip_rows: int = 3,
+    metadata_cols: int = 28,
+    index_col: str = "Alignment ID",
+    cache_dir: str | None = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Read stage of `process_msdial_file`, importing the header block and the alignments of an MSDial file.
+
+    Args:
+        file_path (str): Input file path.
+        skip_rows (int, optional): Number of header rows between the first line and the column names. Defaults to 3.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        index_col (str, optional): Column to denote the index. Defaults to "Alignment ID".
+        cache_dir (str | None, optional): Directory caching parsed input files. Defaults to None, i.e. no caching.
+        cache_size (int, optional): Size cap of the cache in bytes. Defaults to 2 GiB.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The header block and the alignments, see `read_msdial`.
+    """
+    return read_msdial(file_path, skip_rows, metadata_cols, index_col, cache_dir=cache_dir, cache_size=cache_size)
+
+
+def cluster_msdial(
+    tables: tuple[pd.DataFrame, pd.DataFrame],
+    metadata_cols: int = 28,
+    workers: int = 1,
+    groups_path: str | None = None,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    rt_window: float | None = None,
+    sparse: bool = False,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Processing stage of `process_msdial_file`, aggregating the clusters of duplicate alignments.
+
+    Args:
+        tables (tuple[pd.DataFrame, pd.DataFrame]): The header block and the alignments of an MSDial file.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        workers (int, optional): Number of processes searching for duplicates. Defaults to 1.
+        groups_path (str | None, optional): File persisting per-column duplicate groups between runs.
+            Defaults to None.
+        rtol (float, optional): Relative tolerance within which abundances count as equal, see
+            `find_duplicate_groups`. Defaults to 0, i.e. exact matching.
+        atol (float, optional): Absolute tolerance within which abundances count as equal. Defaults to 0.
+        rt_window (float | None, optional): Retention time gap in minutes beyond which alignments are never
+            duplicates, see `find_duplicate_groups`. Defaults to None, i.e. any retention time.
+        sparse (bool, optional): Search for duplicates in a sparse matrix of the positive abundances rather than
+            a dense float copy of them, see `find_sparse_duplicate_groups`. Defaults to False.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: The header block, the alignments without duplicates
+            and one aggregated row per cluster.
+    """
+    header, alignments = tables
+    labels = label_duplicates(alignments, metadata_cols, workers, groups_path, rtol, atol, rt_window, sparse)
+    summary_df = aggregate_clusters(alignments, labels, _aggregate_functions(alignments.columns, metadata_cols))
+    return header, alignments.iloc[labels < 0], summary_df
+
+
+def save_msdial(tables: tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame], out_path: str) -> None:
+    """Write stage of `process_msdial_file`, exporting processed MSDial tables.
+
+    Args:
+        tables (tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]): The header block, the alignments without
+            duplicates and the aggregated clusters, see `cluster_msdial`.
+        out_path (str): Output file path. TSV files reproduce the layout of the input, Parquet and Feather files
+            hold the alignments as a typed table with the header block stored in the "msdial_header" attribute.
+    """
+    header, unique, summary_df = tables
+    if split_extension(out_path)[1] != ".tsv":
+        result = pd.concat([unique, summary_df])
+        result.attrs["msdial_header"] = header.reset_index().fillna("").to_numpy().tolist()
+        save_dataframe(result, out_path, index=True)
+        return
+
+    with profiling.stage("write", file=os.path.basename(out_path), rows=len(unique) + len(summary_df)):
+        save_dataframe_as_tsv(header, out_path, header=False, index=True)
+        save_dataframe_as_tsv(unique, out_path, header=False, index=True, mode="a")
+        save_dataframe_as_tsv(summary_df, out_path, header=False, index=True, mode="a")
+
+
+def process_msdial_file_in_chunks(
+    file_path: str,
+    out_path: str,
+    chunk_size: int,
+    skip_rows: int = 3,
+    metadata_cols: int = 28,
+    index_col: str = "Alignment ID",
+    workers: int = 1,
+    groups_path: str | None = None,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    rt_window: float | None = None,
+    sparse: bool = False,
+) -> None:
+    """Process MSDial output file block by block, producing the same output as `process_msdial_file`.
+
+    The first pass parses only the abundance columns as floats and spills them block by block to a column-major
+    file in a hidden temporary directory next to the output, which the duplicate search reads memory-mapped, one
+    block of columns at a time. The second pass writes rows without duplicates straight to the output and buffers
+    only clustered rows. Memory thus grows with the block size, the number of rows (ids and labels) and the
+    clustered rows, while the abundance matrix needs as much free disk space instead. With `sparse`, the first pass
+    keeps only the positive abundances of every block in memory and the second pass buffers only the metadata of
+    clustered rows, so that memory grows with the number of positive abundances; the maxima of the clusters are
+    then taken from the sparse matrix, counting missing abundances as 0.
+
+    Args:
+        file_path (str): Input file path, CSV or TSV.
         out_path (str): Output file path.
+        chunk_size (int): Number of rows per block.
+        skip_rows (int, optional): Number of rows to skip. Defaults to 3.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        index_col (str, optional): Column to denote the index. Defaults to "Alignment ID".
+        workers (int, optional): Number of processes searching for duplicates. Defaults to 1.
+        groups_path (str | None, optional): File persisting per-column duplicate groups between runs.
+            Defaults to None.
+        rtol (float, optional): Relative tolerance within which abundances count as equal, see
+            `find_duplicate_groups`. Defaults to 0, i.e. exact matching.
+        atol (float, optional): Absolute tolerance within which abundances count as equal. Defaults to 0.
+        rt_window (float | None, optional): Retention time gap in minutes beyond which alignments are never
+            duplicates, see `find_duplicate_groups`. Defaults to None, i.e. any retention time.
+        sparse (bool, optional): Keep the positive abundances of every block in a sparse matrix searched by
+            `find_sparse_duplicate_groups`, rather than spilling all abundances to disk. Defaults to False.
+
+    Raises:
+        ValueError: Error if the output is not a TSV file, as rows are appended to it block by block.
     """
-    df = read_file(file_path)
-    result = process_msdial(df)
-    save_dataframe_as_tsv(result, out_path, header=False, index=True)
+    if split_extension(out_path)[1] != ".tsv":
+        raise ValueError("Unsupported file format. Streaming in chunks writes TSV files only.")
+    header, chunks = read_msdial(file_path, skip_rows, metadata_cols, index_col, chunk_size=chunk_size)
+    abundance_columns = list(header.columns[metadata_cols:])
+    rt_columns = [] if rt_window is None else [_rt_column(header.columns)]
+    # Hidden, so that a watched output directory does not pick the spilled matrix up.
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out_path)), prefix=".rcx_tk-") as spill:
+        rows_path = os.path.join(spill, "rows.bin")
+        with profiling.stage("read", file=os.path.basename(file_path), columns=len(abundance_columns)) as counts:
+            with (
+                read_file_in_chunks(
+                    file_path,
+                    chunk_size,
+                    skiprows=skip_rows + 1,
+                    usecols=[index_col, *rt_columns, *abundance_columns],
+                    index_col=index_col,
+                    dtype=dict.fromkeys(rt_columns + abundance_columns, float),
+                ) as reader,
+                open(rows_path, "wb") as rows_file,
+            ):
+                row_ids, retention_times, sparse_blocks = [], [], []
+                n_rows = 0
+                for block in reader:
+                    row_ids.append(block.index.to_numpy())
+                    if rt_columns:
+                        retention_times.append(block[rt_columns[0]].to_numpy())
+                    # Only one dense block is held at a time, sparse blocks keep their positive entries and dense
+                    # blocks are spilled to disk.
+                    abundances = block[abundance_columns].to_numpy(dtype=np.float64)
+                    if sparse:
+                        sparse_blocks.append(_sparse_block(abundances, n_rows))
+                    else:
+                        abundances.tofile(rows_file)
+                    n_rows += len(abundances)
+                    del block, abundances
+            shape = (n_rows, len(abundance_columns))
+            if sparse:
+                data_matrix = _stack_sparse_blocks(sparse_blocks, shape)
+            else:
+                data_matrix = _map_columns(rows_path, shape, os.path.join(spill, "abundances.npy"), chunk_size)
+            row_ids = pd.Index(np.concatenate(row_ids), name=index_col)
+            retention_times = np.concatenate(retention_times) if rt_columns else None
+            counts["rows"] = len(row_ids)
+        del sparse_blocks
+        labels = _label_rows(data_matrix, row_ids, workers, groups_path, rtol, atol, retention_times, rt_window)
+        if not sparse:
+            # The mapping has to be closed before the spill directory is removed.
+            del data_matrix
+
+    with profiling.stage("stream", file=os.path.basename(out_path), chunks=0) as counts:
+        save_dataframe_as_tsv(header, out_path, header=False, index=True)
+        clustered = []
+        offset = 0
+        with chunks:
+            for chunk in chunks:
+                is_clustered = labels[offset : offset + len(chunk)] >= 0
+                offset += len(chunk)
+                save_dataframe_as_tsv(chunk[~is_clustered], out_path, header=False, index=True, mode="a")
+                clustered.append(chunk.iloc[is_clustered, :metadata_cols] if sparse else chunk[is_clustered])
+                counts["chunks"] += 1
+
+    aggregate_functions = _aggregate_functions(header.columns, metadata_cols)
+    if sparse:
+        metadata_functions = {column: aggregate_functions[column] for column in header.columns[:metadata_cols]}
+        summary_df = aggregate_clusters(pd.concat(clustered), labels[labels >= 0], metadata_functions)
+        maxima = pd.DataFrame(aggregate_sparse_maxima(data_matrix, labels), columns=abundance_columns)
+        summary_df = pd.concat([summary_df, maxima.set_axis(summary_df.index)], axis=1)
+    else:
+        summary_df = aggregate_clusters(pd.concat(clustered), labels[labels >= 0], aggregate_functions)
+    with profiling.stage("write", file=os.path.basename(out_path), rows=len(summary_df)):
+        save_dataframe_as_tsv(summary_df, out_path, header=False, index=True, mode="a")
 
 
 def process_msdial(
-    df: pd.DataFrame, skip_rows: int = 3, metadata_cols: int = 28, index_col: str = "Alignment ID"
+    df: pd.DataFrame,
+    skip_rows: int = 3,
+    metadata_cols: int = 28,
+    index_col: str = "Alignment ID",
+    workers: int = 1,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    rt_window: float | None = None,
+    sparse: bool = False,
 ) -> pd.DataFrame:
     """Function to process a DataFrame of MSDial results to group duplicate alignments.
 
+    The input is left unchanged. Besides the float matrix of abundances, which is released before the output is
+    assembled, rows are only copied into the output, so peak memory stays within about twice the size of the
+    abundance matrix.
+
     Args:
         df (pd.DataFrame): Dataframe with MSDial results.
         skip_rows (int, optional): Number of rows to skip. Defaults to 3.
         metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
         index_col (str, optional): Column to denote the index. Defaults to "Alignment ID".
+        workers (int, optional): Number of processes searching for duplicates. Defaults to 1.
+        rtol (float, optional): Relative tolerance within which abundances count as equal, see
+            `find_duplicate_groups`. Defaults to 0, i.e. exact matching.
+        atol (float, optional): Absolute tolerance within which abundances count as equal. Defaults to 0.
+        rt_window (float | None, optional): Retention time gap in minutes beyond which alignments are never
+            duplicates, see `find_duplicate_groups`. Defaults to None, i.e. any retention time.
+        sparse (bool, optional): Search for duplicates in a sparse matrix of the positive abundances rather than
+            a dense float copy of them, see `find_sparse_duplicate_groups`. Defaults to False.
 
     Returns:
         pd.DataFrame: DataFrame with clustered alignment ids.
     """
-    df.columns = df.iloc[skip_rows]
-    df.set_index(index_col, inplace=True, drop=True)
-    data_matrix = (
-        df.loc[skip_rows:, df.columns[metadata_cols:]] if skip_rows > 0 else df.loc[:, df.columns[metadata_cols:]]
+    # Copy-on-write makes the relabelled frame share the data of the input until either is modified.
+    df = df.set_axis(df.iloc[skip_rows], axis=1).set_index(index_col)
+    alignments = df.iloc[skip_rows + 1 :]
+    labels = label_duplicates(
+        alignments, metadata_cols, workers, rtol=rtol, atol=atol, rt_window=rt_window, sparse=sparse
+    )
+    summary_df = aggregate_clusters(alignments, labels, _aggregate_functions(alignments.columns, metadata_cols))
+    kept = np.concatenate([np.arange(skip_rows + 1), skip_rows + 1 + np.flatnonzero(labels < 0)])
+    return _stack_rows(df, kept, summary_df)
+
+
+def cluster_alignments(
+    alignments: pd.DataFrame,
+    metadata_cols: int = 28,
+    workers: int = 1,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    rt_window: float | None = None,
+    sparse: bool = False,
+) -> pd.DataFrame:
+    """Replace alignments sharing an abundance value in any sample by one aggregated row per cluster.
+
+    Args:
+        alignments (pd.DataFrame): Alignments indexed by their id, metadata columns followed by abundances.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        workers (int, optional): Number of processes searching for duplicates. Defaults to 1.
+        rtol (float, optional): Relative tolerance within which abundances count as equal, see
+            `find_duplicate_groups`. Defaults to 0, i.e. exact matching.
+        atol (float, optional): Absolute tolerance within which abundances count as equal. Defaults to 0.
+        rt_window (float | None, optional): Retention time gap in minutes beyond which alignments are never
+            duplicates, see `find_duplicate_groups`. Defaults to None, i.e. any retention time.
+        sparse (bool, optional): Search for duplicates in a sparse matrix of the positive abundances rather than
+            a dense float copy of them, see `find_sparse_duplicate_groups`. Defaults to False.
+
+    Returns:
+        pd.DataFrame: Alignments without duplicates followed by the aggregated clusters.
+    """
+    labels = label_duplicates(
+        alignments, metadata_cols, workers, rtol=rtol, atol=atol, rt_window=rt_window, sparse=sparse
+    )
+    summary_df = aggregate_clusters(alignments, labels, _aggregate_functions(alignments.columns, metadata_cols))
+    return _stack_rows(alignments, np.flatnonzero(labels < 0), summary_df)
+
+
+def _stack_rows(df: pd.DataFrame, positions: np.ndarray, below: pd.DataFrame) -> pd.DataFrame:
+    """Stack the rows of a frame at the given positions on top of another frame with the same columns.
+
+    Like `pd.concat([df.iloc[positions], below])`, but gathering one column at a time, so that the selected rows
+    are copied straight into the result rather than into an intermediate frame of the same size.
+
+    Args:
+        df (pd.DataFrame): The frame to select rows from.
+        positions (np.ndarray): Positions of the selected rows.
+        below (pd.DataFrame): The rows to append, with the columns of `df`.
+
+    Returns:
+        pd.DataFrame: The selected rows followed by the rows of `below`.
+    """
+    columns = [
+        pd.concat([df.iloc[:, i].take(positions), below.iloc[:, i]], ignore_index=True) for i in range(df.shape[1])
+    ]
+    result = pd.concat(columns, axis=1, ignore_index=True)
+    return result.set_axis(df.index.take(positions).append(below.index)).set_axis(df.columns, axis=1)
+
+
+def label_duplicates(
+    alignments: pd.DataFrame,
+    metadata_cols: int = 28,
+    workers: int = 1,
+    groups_path: str | None = None,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    rt_window: float | None = None,
+    sparse: bool = False,
+) -> np.ndarray:
+    """Label alignments by the cluster of alignments they share an abundance value with in any sample.
+
+    Args:
+        alignments (pd.DataFrame): Alignments indexed by their id, metadata columns followed by abundances.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+        workers (int, optional): Number of processes searching for duplicates. Defaults to 1.
+        groups_path (str | None, optional): File persisting per-column duplicate groups between runs.
+            Defaults to None.
+        rtol (float, optional): Relative tolerance within which abundances count as equal, see
+            `find_duplicate_groups`. Defaults to 0, i.e. exact matching.
+        atol (float, optional): Absolute tolerance within which abundances count as equal. Defaults to 0.
+        rt_window (float | None, optional): Retention time gap in minutes beyond which alignments are never
+            duplicates, see `find_duplicate_groups`. Defaults to None, i.e. any retention time.
+        sparse (bool, optional): Search for duplicates in a sparse matrix of the positive abundances rather than
+            a dense float copy of them, see `find_sparse_duplicate_groups`. Defaults to False.
+
+    Returns:
+        np.ndarray: Cluster label of every alignment, -1 for alignments without duplicates.
+    """
+    if sparse:
+        values = _sparse_abundance_matrix(alignments, metadata_cols)
+    else:
+        values = _abundance_matrix(alignments, metadata_cols)
+    retention_times = None
+    if rt_window is not None:
+        retention_times = alignments[_rt_column(alignments.columns)].to_numpy(dtype=float)
+    return _label_rows(values, alignments.index, workers, groups_path, rtol, atol, retention_times, rt_window)
+
+
+def _rt_column(columns: pd.Index) -> str:
+    """Name of the retention time column, which the retention time window needs.
+
+    Args:
+        columns (pd.Index): Columns of the alignment table.
+
+    Raises:
+        ValueError: Error if the table has no retention time column.
+
+    Returns:
+        str: `RT_COLUMN`.
+    """
+    if RT_COLUMN not in columns:
+        raise ValueError(f"The column {RT_COLUMN} is needed for a retention time window.")
+    return RT_COLUMN
+
+
+def _abundance_matrix(alignments: pd.DataFrame, metadata_cols: int = 28) -> np.ndarray:
+    """Convert the abundance columns of alignments to a float matrix.
+
+    Columns are converted one at a time, so that abundances parsed as text are not first gathered into an object
+    matrix of the same size.
+
+    Args:
+        alignments (pd.DataFrame): Alignments, metadata columns followed by abundances.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+
+    Returns:
+        np.ndarray: Column-major matrix with alignments in rows and samples in columns.
+    """
+    abundances = alignments.iloc[:, metadata_cols:]
+    values = np.empty(abundances.shape, dtype=float, order="F")
+    for i in range(abundances.shape[1]):
+        values[:, i] = abundances.iloc[:, i].to_numpy(dtype=float)
+    return values
+
+
+def _map_columns(rows_path: str, shape: tuple[int, int], path: str, slab_rows: int) -> np.ndarray:
+    """Copy a float64 matrix stored row by row into a column-major .npy file and map it read-only.
+
+    The rows are copied in slabs, so that at most `slab_rows` rows are held in memory besides the mapped pages.
+
+    Args:
+        rows_path (str): File holding the raw row-major matrix.
+        shape (tuple[int, int]): Number of rows and columns of the matrix.
+        path (str): The .npy file to create.
+        slab_rows (int): Number of rows copied at a time.
+
+    Returns:
+        np.ndarray: The column-major matrix, memory-mapped from `path`.
+    """
+    n_rows, n_columns = shape
+    columns = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=shape, fortran_order=True)
+    with open(rows_path, "rb") as rows:
+        for start in range(0, n_rows, slab_rows):
+            slab = np.fromfile(rows, dtype=np.float64, count=min(slab_rows, n_rows - start) * n_columns)
+            columns[start : start + len(slab) // max(n_columns, 1)] = slab.reshape(-1, n_columns)
+            columns.flush()
+    del columns
+    return np.load(path, mmap_mode="r")
+
+
+def _sparse_abundance_matrix(alignments: pd.DataFrame, metadata_cols: int = 28) -> SparseAbundances:
+    """Convert the abundance columns of alignments to a sparse matrix of their positive values.
+
+    Columns are converted one at a time, so that no dense float matrix is built besides the alignments themselves.
+
+    Args:
+        alignments (pd.DataFrame): Alignments, metadata columns followed by abundances.
+        metadata_cols (int, optional): Number of columns containing data prior to feature abundances. Defaults to 28.
+
+    Returns:
+        SparseAbundances: Matrix with alignments in rows and samples in columns.
+    """
+    abundances = alignments.iloc[:, metadata_cols:]
+    data, indices = [np.empty(0)], [np.empty(0, dtype=np.intp)]
+    for i in range(abundances.shape[1]):
+        column = abundances.iloc[:, i].to_numpy(dtype=float)
+        rows = np.flatnonzero(column > 0)
+        data.append(column[rows])
+        indices.append(rows)
+    indptr = np.cumsum([len(rows) for rows in indices], dtype=np.intp)
+    return SparseAbundances(np.concatenate(data), np.concatenate(indices), indptr, abundances.shape)
+
+
+def _sparse_block(values: np.ndarray, first_row: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Keep the positive entries of a block of rows, see `_stack_sparse_blocks`.
+
+    Args:
+        values (np.ndarray): Abundances of the block, rows by samples.
+        first_row (int): Position of the first row of the block in the whole matrix.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Values, row positions and columns of the positive entries in
+            row-major order.
+    """
+    rows, columns = np.nonzero(values > 0)
+    return values[rows, columns].astype(float), rows + first_row, columns
+
+
+def _stack_sparse_blocks(
+    blocks: list[tuple[np.ndarray, np.ndarray, np.ndarray]], shape: tuple[int, int]
+) -> SparseAbundances:
+    """Assemble the positive entries of consecutive blocks of rows into a sparse matrix.
+
+    Args:
+        blocks (list[tuple[np.ndarray, np.ndarray, np.ndarray]]): Blocks in row order, see `_sparse_block`.
+        shape (tuple[int, int]): Number of rows of all blocks and number of columns.
+
+    Returns:
+        SparseAbundances: Matrix of all rows of the blocks.
+    """
+    data, rows, columns = (np.concatenate(parts) for parts in zip(*blocks))
+    # Entries are in row-major order, so a stable sort by column keeps the rows of every column ascending.
+    order = np.argsort(columns, kind="stable")
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(columns, minlength=shape[1])))).astype(np.intp)
+    return SparseAbundances(data[order], rows[order].astype(np.intp), indptr, shape)
+
+
+def _label_rows(
+    values: np.ndarray | SparseAbundances,
+    row_ids: pd.Index,
+    workers: int,
+    groups_path: str | None,
+    rtol: float,
+    atol: float,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> np.ndarray:
+    """Label rows of an abundance matrix by their cluster of duplicates, see `label_duplicates`.
+
+    Args:
+        values (np.ndarray | SparseAbundances): Dense or sparse matrix with features in rows and samples in columns.
+        row_ids (pd.Index): Ids of the rows.
+        workers (int): Number of processes scanning blocks of columns.
+        groups_path (str | None): File persisting per-column duplicate groups between runs.
+        rtol (float): Relative tolerance within which values count as equal.
+        atol (float): Absolute tolerance within which values count as equal.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        np.ndarray: Cluster label of every row, -1 for rows without duplicates.
+    """
+    with profiling.stage("duplicates", rows=values.shape[0], columns=values.shape[1], workers=workers) as counts:
+        groups = _duplicate_groups(values, row_ids, workers, groups_path, rtol, atol, retention_times, rt_window)
+        counts["groups"] = len(groups)
+    with profiling.stage("clusters", groups=len(groups)) as counts:
+        labels = find_cluster_labels(values.shape[0], groups)
+        counts["clusters"] = int(labels.max()) + 1 if len(labels) else 0
+    return labels
+
+
+def _duplicate_groups(
+    values: np.ndarray | SparseAbundances,
+    row_ids: pd.Index,
+    workers: int,
+    groups_path: str | None,
+    rtol: float,
+    atol: float,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[np.ndarray]:
+    """Find duplicate groups from scratch, or incrementally if a file persisting them is given.
+
+    Args:
+        values (np.ndarray | SparseAbundances): Dense or sparse matrix with features in rows and samples in columns.
+        row_ids (pd.Index): Ids of the rows.
+        workers (int): Number of processes scanning blocks of columns.
+        groups_path (str | None): File persisting per-column duplicate groups between runs.
+        rtol (float): Relative tolerance within which values count as equal.
+        atol (float): Absolute tolerance within which values count as equal.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Raises:
+        ValueError: Error if the groups of a sparse matrix are to be persisted.
+
+    Returns:
+        list[np.ndarray]: Row positions of each duplicate group.
+    """
+    if isinstance(values, SparseAbundances):
+        if groups_path is not None:
+            raise ValueError("Persisting duplicate groups is not supported for sparse abundances.")
+        return find_sparse_duplicate_groups(values, workers, rtol, atol, retention_times, rt_window)
+    if groups_path is None:
+        return find_duplicate_groups(values, workers, rtol, atol, retention_times, rt_window)
+    return find_duplicate_groups_incrementally(
+        values, row_ids, groups_path, workers, rtol, atol, retention_times, rt_window
     )
 
-    all_duplicates = find_all_duplicates(data_matrix)
-    all_duplicates_idx = union(all_duplicates)
 
-    alignments_with_duplicates = df.loc[all_duplicates_idx]
-    df.drop(all_duplicates_idx, inplace=True)
+def aggregate_clusters(
+    alignments: pd.DataFrame, labels: np.ndarray, aggregate_functions: dict[str, Callable]
+) -> pd.DataFrame:
+    """Aggregate the rows of every cluster into a single row with one groupby per aggregation kind.
+
+    Columns aggregated with `np.mean` or `np.max` are converted to float and reduced by pandas' vectorized
+    groupby reductions, any other function is applied per group.
+
+    Args:
+        alignments (pd.DataFrame): Alignments the labels refer to, row by row.
+        labels (np.ndarray): Cluster label of every row, -1 for rows outside of any cluster.
+        aggregate_functions (dict[str, Callable]): Aggregation function of every column, see `aggregations`.
+
+    Returns:
+        pd.DataFrame: One row per cluster, indexed by the concatenated ids of its members.
+    """
+    members = np.flatnonzero(labels >= 0)
+    with profiling.stage("aggregate", rows=len(members)) as counts:
+        clustered = alignments.iloc[members]
+        keys = labels[members]
+
+        columns_by_function: dict[Callable, list[str]] = {}
+        for col, func in aggregate_functions.items():
+            columns_by_function.setdefault(func, []).append(col)
 
-    clusters = find_clusters(all_duplicates)
+        parts = []
+        for func, cols in columns_by_function.items():
+            grouped = clustered[cols]
+            if func in _GROUPBY_REDUCTIONS:
+                parts.append(grouped.astype(float).groupby(keys).agg(_GROUPBY_REDUCTIONS[func]))
+            else:
+                parts.append(grouped.groupby(keys).agg(func))
 
-    metadata_columns = list(df.columns[:metadata_cols])
-    mean_columns = metadata_columns[:3]
-    concat_columns = metadata_columns[3:]
-    abundance_columns = list(df.columns[metadata_cols:])
+        summary = pd.concat(parts, axis=1).reindex(columns=alignments.columns)
+        summary.index = pd.Index(pd.Series(clustered.index).groupby(keys).agg(concat_str), name=alignments.index.name)
+        counts["clusters"] = len(summary)
+    return summary
 
-    aggregate_functions = aggregations(mean_columns, concat_columns, abundance_columns)
 
-    results = {
-        concat_str(cluster): alignments_with_duplicates.loc[cluster].agg(aggregate_functions) for cluster in clusters
-    }
+def aggregate_sparse_maxima(matrix: SparseAbundances, labels: np.ndarray) -> np.ndarray:
+    """Maximum abundance of every cluster in every sample, reading only the stored entries of clustered rows.
 
-    summary_df = pd.DataFrame.from_dict(results, orient="index", columns=df.columns)
-    summary_df.index.name = index_col
-    everything = pd.concat([df, summary_df])
-    return everything
+    Abundances missing from the matrix count as 0, so the maximum of a cluster without positive abundances
+    in a sample is 0.
+
+    Args:
+        matrix (SparseAbundances): The abundances.
+        labels (np.ndarray): Cluster label of every row, -1 for rows outside of any cluster.
+
+    Returns:
+        np.ndarray: Matrix with clusters in rows, in label order, and samples in columns.
+    """
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    clusters = labels[matrix.indices]
+    clustered = np.flatnonzero(clusters >= 0)
+    columns = np.searchsorted(matrix.indptr, clustered, side="right") - 1
+    maxima = np.zeros((n_clusters, matrix.shape[1]))
+    np.maximum.at(maxima, (clusters[clustered], columns), matrix.data[clustered])
+    return maxima
+
+
+def _aggregate_functions(columns: pd.Index, metadata_cols: int) -> dict[str, Callable]:
+    """Aggregation functions for MSDial alignment columns.
+
+    Args:
+        columns (pd.Index): Columns of the alignment table, without the index column.
+        metadata_cols (int): Number of columns containing data prior to feature abundances.
+
+    Returns:
+        dict[str, Callable]: Dictionary with functions to use for pd.aggregate
+    """
+    metadata_columns = list(columns[:metadata_cols])
+    return aggregations(metadata_columns[:3], metadata_columns[3:], list(columns[metadata_cols:]))
 
 
 def aggregations(
@@ -103,18 +747,134 @@ def find_clusters(all_duplicates: list[pd.Index]) -> list[pd.Index]:
     Returns:
         list[pd.Index]: Clusters of connected duplicates.
     """
-    clusters = []
-    while all_duplicates:
-        current = all_duplicates.pop()
-        added = False
-        for cluster_idx in range(len(clusters)):
-            if any(current.isin(clusters[cluster_idx])):
-                clusters[cluster_idx] = clusters[cluster_idx].union(current)
-                added = True
-                break
-        if not added:
-            clusters.append(current)
-    return clusters
+    if not all_duplicates:
+        return []
+    members = union(all_duplicates)
+    labels = find_cluster_labels(len(members), [members.get_indexer(idx) for idx in all_duplicates])
+    return [members[positions] for positions in cluster_positions(labels)]
+
+
+def split_groups_by_retention_time(
+    groups: list[np.ndarray], retention_times: np.ndarray, rt_window: float
+) -> list[np.ndarray]:
+    """Split duplicate groups into subgroups of rows eluting close to each other.
+
+    The members of every group are ordered by retention time and the group is split wherever the gap to the next
+    member exceeds `rt_window`, so that unrelated features sharing an abundance value by chance are not merged.
+    Like tolerance runs, subgroups chain: a subgroup may span more than the window as long as every gap is within
+    it. Rows without a retention time are never duplicates. All groups are split together in one sort of their
+    members, so the cost grows with the number of duplicates rather than of rows.
+
+    Args:
+        groups (list[np.ndarray]): Row positions of each duplicate group.
+        retention_times (np.ndarray): Retention time of every row.
+        rt_window (float): The largest gap between neighbouring members of a subgroup.
+
+    Returns:
+        list[np.ndarray]: Row positions of each subgroup with at least two members.
+    """
+    if not groups:
+        return []
+    members = np.concatenate(groups)
+    group_ids = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+    times = retention_times[members]
+    order = np.lexsort((times, group_ids))
+    members, group_ids, times = members[order], group_ids[order], times[order]
+
+    # NaN gaps compare false, so rows without a retention time start a subgroup of their own.
+    joined = (group_ids[1:] == group_ids[:-1]) & (np.diff(times) <= rt_window)
+    starts = np.flatnonzero(np.concatenate(([True], ~joined)))
+    stops = np.append(starts[1:], len(members))
+    keep = stops - starts > 1
+    return [members[start:stop] for start, stop in zip(starts[keep], stops[keep])]
+
+
+def find_cluster_labels(n_rows: int, groups: list[np.ndarray]) -> np.ndarray:
+    """Label rows by the cluster of transitively overlapping duplicate groups they belong to.
+
+    Uses a disjoint-set forest with path compression and union by rank over integer row positions,
+    which runs in near-linear time in the total number of group members.
+
+    Args:
+        n_rows (int): Number of rows the positions refer to.
+        groups (list[np.ndarray]): Row positions of each duplicate group.
+
+    Returns:
+        np.ndarray: Cluster label of every row, numbered by first member position, or -1 if the row has no duplicate.
+    """
+    parent = list(range(n_rows))
+    rank = [0] * n_rows
+    is_member = np.zeros(n_rows, dtype=bool)
+
+    for group in groups:
+        is_member[group] = True
+        first = int(group[0])
+        for other in group[1:]:
+            _merge(parent, rank, first, int(other))
+
+    members = np.flatnonzero(is_member)
+    roots = np.fromiter((_find_root(parent, row) for row in members), dtype=np.intp, count=len(members))
+    _, first_seen, inverse = np.unique(roots, return_index=True, return_inverse=True)
+
+    relabel = np.empty(len(first_seen), dtype=np.intp)
+    relabel[np.argsort(first_seen)] = np.arange(len(first_seen))
+
+    labels = np.full(n_rows, -1, dtype=np.intp)
+    labels[members] = relabel[inverse]
+    return labels
+
+
+def cluster_positions(labels: np.ndarray) -> list[np.ndarray]:
+    """Row positions of each cluster, in label order.
+
+    Args:
+        labels (np.ndarray): Cluster labels as returned by `find_cluster_labels`.
+
+    Returns:
+        list[np.ndarray]: Ascending row positions of every cluster.
+    """
+    members = np.flatnonzero(labels >= 0)
+    order = members[np.argsort(labels[members], kind="stable")]
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    return np.split(order, boundaries) if len(order) else []
+
+
+def _find_root(parent: list[int], row: int) -> int:
+    """Find the representative of a row and compress the path leading to it.
+
+    Args:
+        parent (list[int]): Parent pointers of the disjoint-set forest.
+        row (int): Row position to look up.
+
+    Returns:
+        int: Row position of the representative.
+    """
+    root = row
+    while parent[root] != root:
+        root = parent[root]
+    while parent[row] != root:
+        parent[row], row = root, parent[row]
+    return root
+
+
+def _merge(parent: list[int], rank: list[int], a: int, b: int) -> None:
+    """Merge the sets containing two rows, attaching the shallower tree below the deeper one.
+
+    Args:
+        parent (list[int]): Parent pointers of the disjoint-set forest.
+        rank (list[int]): Upper bound of the tree height for every representative.
+        a (int): Row position in the first set.
+        b (int): Row position in the second set.
+    """
+    root_a = _find_root(parent, a)
+    root_b = _find_root(parent, b)
+    if root_a == root_b:
+        return
+    if rank[root_a] < rank[root_b]:
+        root_a, root_b = root_b, root_a
+    parent[root_b] = root_a
+    if rank[root_a] == rank[root_b]:
+        rank[root_a] += 1
 
 
 def union(all_duplicates: list[pd.Index]) -> pd.Index:
@@ -126,27 +886,577 @@ def union(all_duplicates: list[pd.Index]) -> pd.Index:
     Returns:
         pd.Index: Union of all indices.
     """
-    all_duplicates_idx = all_duplicates[0]
-    for idx in all_duplicates:
-        all_duplicates_idx = all_duplicates_idx.union(idx)
-    return all_duplicates_idx
+    return all_duplicates[0].append(list(all_duplicates[1:])).unique().sort_values()
 
 
-def find_all_duplicates(data_matrix: pd.DataFrame) -> list[pd.Index]:
+def find_all_duplicates(data_matrix: pd.DataFrame, rtol: float = 0.0, atol: float = 0.0) -> list[pd.Index]:
     """Get index of any duplicate values in any column.
 
     Args:
         data_matrix (pd.DataFrame): DataFrame to check column-by-column for duplicate values.
+        rtol (float, optional): Relative tolerance within which values count as equal, see `find_duplicate_groups`.
+            Defaults to 0, i.e. exact matching.
+        atol (float, optional): Absolute tolerance within which values count as equal. Defaults to 0.
 
     Returns:
         list[pd.Index]: All indexes of duplicates.
     """
-    duplicates = {}
-    for col_idx in range(len(data_matrix.columns)):
-        col = data_matrix.iloc[:, col_idx].astype(float)
-        col = col.loc[col > 0]
-        groups = col.drop(col.drop_duplicates(keep=False).index).groupby(col)
-        duplicates[col.name] = [g.index for val, g in groups]
+    values = data_matrix.to_numpy(dtype=float)
+    return [data_matrix.index[group] for group in find_duplicate_groups(values, rtol=rtol, atol=atol)]
+
+
+def find_duplicate_groups(
+    values: np.ndarray,
+    workers: int = 1,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[np.ndarray]:
+    """Find rows sharing an equal non-zero value, for all columns of the matrix in one batched pass.
+
+    Every column is sorted once, after which equal values form runs of neighbouring entries.
+    Runs with at least two members are duplicate groups.
+
+    With a tolerance, neighbours in sort order whose difference is at most `atol + rtol * larger value` join the
+    same run, like `np.isclose`. Runs chain, so a run may span more than the tolerance as long as every step
+    stays within it, matching the transitive merging of groups into clusters. Sorting keeps this O(n log n)
+    per column without comparing all pairs.
+
+    With a retention time window, rows are ordered by retention time before the columns are sorted, so that equal
+    values end up in retention time order and only neighbours within `rt_window` of each other join a run: rows
+    eluting apart are never compared, and the groups they would form together are never built. Runs of values
+    within a tolerance are split where the retention time gap exceeds the window right after every block of
+    columns is scanned, see `split_groups_by_retention_time`. Rows without a retention time are never duplicates.
+
+    Args:
+        values (np.ndarray): Two-dimensional matrix with features in rows and samples in columns.
+        workers (int, optional): Number of processes scanning blocks of columns. Defaults to 1.
+        rtol (float, optional): Relative tolerance within which values count as equal. Defaults to 0.
+        atol (float, optional): Absolute tolerance within which values count as equal. Defaults to 0.
+        retention_times (np.ndarray | None, optional): Retention time of every row, needed with `rt_window`.
+            Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None, i.e. any retention time.
+
+    Returns:
+        list[np.ndarray]: Row positions of each duplicate group, ordered by column and then by value.
+    """
+    return list(
+        itertools.chain.from_iterable(
+            find_column_duplicate_groups(values, workers, rtol, atol, retention_times, rt_window)
+        )
+    )
+
+
+def find_column_duplicate_groups(
+    values: np.ndarray,
+    workers: int = 1,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[list[np.ndarray]]:
+    """Find the duplicate groups of every column separately, see `find_duplicate_groups`.
+
+    Args:
+        values (np.ndarray): Two-dimensional matrix with features in rows and samples in columns.
+        workers (int, optional): Number of processes scanning blocks of columns. Defaults to 1.
+        rtol (float, optional): Relative tolerance within which values count as equal. Defaults to 0.
+        atol (float, optional): Absolute tolerance within which values count as equal. Defaults to 0.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Raises:
+        ValueError: Error if a tolerance is negative.
+
+    Returns:
+        list[list[np.ndarray]]: Row positions of each duplicate group, ordered by value, for every column.
+    """
+    if rtol < 0 or atol < 0:
+        raise ValueError("Tolerances must not be negative.")
+    if workers > 1 and values.shape[1] > 1:
+        return _find_duplicate_groups_in_parallel(values, workers, rtol, atol, retention_times, rt_window)
+
+    n_rows, n_columns = values.shape
+    if values.size == 0:
+        return [[] for _ in range(n_columns)]
+
+    # Rows in retention time order stay in that order among equal values, as the sorts below are stable.
+    by_time = None if rt_window is None else np.argsort(retention_times, kind="stable")
+    # Columns are sorted in blocks, so that the sorted copies and sort orders stay small next to the matrix.
+    block = max(1, _SCAN_BLOCK_ELEMENTS // n_rows)
+    column_groups = []
+    for start in range(0, n_columns, block):
+        columns = values[:, start : start + block] if by_time is None else values[by_time, start : start + block]
+        masked = columns.T.astype(float, order="C")
+        masked[~(masked > 0)] = np.nan
+        order = np.argsort(masked, axis=1, kind="stable")
+        masked = np.take_along_axis(masked, order, axis=1)
+        positions = order.ravel() if by_time is None else by_time[order.ravel()]
+        # Each column is a contiguous segment of length n_rows.
+        segment_bounds = np.arange(0, masked.size + 1, n_rows)
+        column_groups.extend(
+            _collect_runs(masked.ravel(), positions, segment_bounds, rtol, atol, retention_times, rt_window)
+        )
+    return column_groups
+
+
+def find_sparse_duplicate_groups(
+    matrix: SparseAbundances,
+    workers: int = 1,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[np.ndarray]:
+    """Find rows sharing an equal value in any column of a sparse matrix, like `find_duplicate_groups`.
+
+    Only the stored entries are sorted, by column and value, so the work grows with the number of positive
+    abundances rather than the size of the matrix. The groups are those of `find_duplicate_groups` on the dense
+    matrix, in the same order.
+
+    Args:
+        matrix (SparseAbundances): Matrix with features in rows and samples in columns.
+        workers (int, optional): Number of processes scanning blocks of columns with about as many stored entries
+            each. Defaults to 1.
+        rtol (float, optional): Relative tolerance within which values count as equal. Defaults to 0.
+        atol (float, optional): Absolute tolerance within which values count as equal. Defaults to 0.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Raises:
+        ValueError: Error if a tolerance is negative.
+
+    Returns:
+        list[np.ndarray]: Row positions of each duplicate group, ordered by column and then by value.
+    """
+    if rtol < 0 or atol < 0:
+        raise ValueError("Tolerances must not be negative.")
+    if workers > 1 and matrix.shape[1] > 1:
+        return _find_sparse_duplicate_groups_in_parallel(matrix, workers, rtol, atol, retention_times, rt_window)
+
+    n_columns = matrix.shape[1]
+    groups = []
+    start = 0
+    while start < n_columns:
+        # Blocks of columns with about as many stored entries as a block of the dense scan.
+        stop = int(np.searchsorted(matrix.indptr, matrix.indptr[start] + _SCAN_BLOCK_ELEMENTS, side="right")) - 1
+        stop = min(max(stop, start + 1), n_columns)
+        bounds = matrix.indptr[start : stop + 1]
+        values = matrix.data[bounds[0] : bounds[-1]]
+        # A stable sort keeps equal values of a column in ascending row order, or retention time order with a window,
+        # like the dense scan.
+        rows = matrix.indices[bounds[0] : bounds[-1]]
+        keys = (values, np.repeat(np.arange(stop - start), np.diff(bounds)))
+        if rt_window is not None:
+            keys = (retention_times[rows], *keys)
+        order = np.lexsort(keys)
+        runs = _collect_runs(values[order], rows[order], bounds - bounds[0], rtol, atol, retention_times, rt_window)
+        groups.extend(itertools.chain.from_iterable(runs))
+        start = stop
+    return groups
+
+
+def find_duplicate_groups_incrementally(
+    values: np.ndarray,
+    row_ids: pd.Index,
+    groups_path: str,
+    workers: int = 1,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[np.ndarray]:
+    """Find duplicate groups like `find_duplicate_groups`, scanning only columns not seen by an earlier run.
+
+    The groups of every column are persisted in `groups_path`, keyed by a digest of the row ids, the tolerances,
+    the retention time window and times, if any, and the column's values. Columns of a re-exported alignment that
+    kept their rows and values, e.g. when new samples are appended, are taken from there and only new or changed
+    columns are sorted. The file is rewritten with the current columns.
+
+    Args:
+        values (np.ndarray): Two-dimensional matrix with features in rows and samples in columns.
+        row_ids (pd.Index): Ids of the rows.
+        groups_path (str): File persisting the groups of every column between runs.
+        workers (int, optional): Number of processes scanning blocks of columns. Defaults to 1.
+        rtol (float, optional): Relative tolerance within which values count as equal. Defaults to 0.
+        atol (float, optional): Absolute tolerance within which values count as equal. Defaults to 0.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        list[np.ndarray]: Row positions of each duplicate group, ordered by column and then by value.
+    """
+    digests = _column_digests(values, row_ids, rtol, atol, retention_times, rt_window)
+    known = _load_column_groups(groups_path)
+    missing = [column for column, digest in enumerate(digests) if digest not in known]
+    if missing:
+        # Without any known column the matrix is scanned as is rather than gathered into a copy.
+        columns = values if len(missing) == values.shape[1] else values[:, missing]
+        scanned = find_column_duplicate_groups(columns, workers, rtol, atol, retention_times, rt_window)
+        known.update(zip((digests[column] for column in missing), scanned))
+
+    column_groups = {digest: known[digest] for digest in digests}
+    _save_column_groups(groups_path, column_groups)
+    return [group for digest in digests for group in column_groups[digest]]
+
+
+def _column_digests(
+    values: np.ndarray,
+    row_ids: pd.Index,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[str]:
+    """Digests identifying every column of a matrix together with the ids of its rows and the search parameters.
+
+    Args:
+        values (np.ndarray): Two-dimensional matrix with features in rows and samples in columns.
+        row_ids (pd.Index): Ids of the rows.
+        rtol (float, optional): Relative tolerance the groups are found with. Defaults to 0.
+        atol (float, optional): Absolute tolerance the groups are found with. Defaults to 0.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time window the groups are found with. Defaults to None.
+
+    Returns:
+        list[str]: Hexadecimal digest of every column.
+    """
+    rows = hashlib.blake2b(pd.util.hash_pandas_object(row_ids, index=False).to_numpy().tobytes()).digest()
+    if rtol or atol:
+        # Exact groups keep the digests of files persisted before tolerances existed.
+        rows += np.array([rtol, atol], dtype=np.float64).tobytes()
+    if rt_window is not None:
+        rows += np.concatenate(([rt_window], retention_times)).astype(np.float64).tobytes()
+    columns = np.asfortranarray(values, dtype=np.float64)
+    return [hashlib.blake2b(rows + columns[:, column].tobytes()).hexdigest() for column in range(values.shape[1])]
+
+
+def _load_column_groups(groups_path: str) -> dict[str, list[np.ndarray]]:
+    """Reads the duplicate groups of columns persisted by `_save_column_groups`.
+
+    Args:
+        groups_path (str): The path to the file, which may not exist yet.
+
+    Returns:
+        dict[str, list[np.ndarray]]: Row positions of each duplicate group, by column digest.
+    """
+    if not os.path.exists(groups_path):
+        return {}
+    with np.load(groups_path) as stored:
+        digests, counts, sizes, members = stored["digests"], stored["counts"], stored["sizes"], stored["members"]
+    ends = np.cumsum(sizes)
+    groups = [members[end - size : end] for end, size in zip(ends.tolist(), sizes.tolist())]
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    return {str(digest): groups[start:stop] for digest, start, stop in zip(digests, bounds[:-1], bounds[1:])}
+
+
+def _save_column_groups(groups_path: str, column_groups: dict[str, list[np.ndarray]]) -> None:
+    """Atomically replaces the file persisting the duplicate groups of columns.
+
+    Args:
+        groups_path (str): The path to the file.
+        column_groups (dict[str, list[np.ndarray]]): Row positions of each duplicate group, by column digest.
+    """
+    groups = list(itertools.chain.from_iterable(column_groups.values()))
+    directory = os.path.dirname(os.path.abspath(groups_path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, staging = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as file:
+        np.savez(
+            file,
+            digests=np.array(list(column_groups), dtype=str),
+            counts=np.array([len(column) for column in column_groups.values()], dtype=np.intp),
+            sizes=np.array([len(group) for group in groups], dtype=np.intp),
+            members=np.concatenate(groups) if groups else np.empty(0, dtype=np.intp),
+        )
+    os.replace(staging, groups_path)
+
+
+def _find_duplicate_groups_in_parallel(
+    values: np.ndarray,
+    workers: int,
+    rtol: float,
+    atol: float,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[list[np.ndarray]]:
+    """Scan blocks of columns in a process pool, sharing the matrix with the workers through shared memory.
+
+    Args:
+        values (np.ndarray): Two-dimensional matrix with features in rows and samples in columns.
+        workers (int): Number of processes.
+        rtol (float): Relative tolerance within which values count as equal.
+        atol (float): Absolute tolerance within which values count as equal.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        list[list[np.ndarray]]: Row positions of each duplicate group for every column, as a serial scan.
+    """
+    blocks = [block for block in np.array_split(np.arange(values.shape[1]), workers) if len(block)]
+    if isinstance(values, np.memmap) and isinstance(values.base, mmap.mmap) and values.flags.f_contiguous:
+        # A matrix mapped from a file as a whole, e.g. spilled by the chunked processing, is mapped by the workers too.
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks))) as executor:
+            futures = [
+                executor.submit(
+                    _scan_mapped_block,
+                    values.filename,
+                    values.offset,
+                    values.shape,
+                    block[0],
+                    block[-1] + 1,
+                    rtol,
+                    atol,
+                    retention_times,
+                    rt_window,
+                )
+                for block in blocks
+            ]
+            return list(itertools.chain.from_iterable(future.result() for future in futures))
+
+    shared = SharedMemory(create=True, size=max(values.size * np.dtype(np.float64).itemsize, 1))
+    try:
+        # Column-major storage keeps every block of columns contiguous for the workers.
+        matrix = np.ndarray(values.shape, dtype=np.float64, buffer=shared.buf, order="F")
+        matrix[:] = values
+        del matrix
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks))) as executor:
+            futures = [
+                executor.submit(
+                    _scan_shared_block,
+                    shared.name,
+                    values.shape,
+                    block[0],
+                    block[-1] + 1,
+                    rtol,
+                    atol,
+                    retention_times,
+                    rt_window,
+                )
+                for block in blocks
+            ]
+            return list(itertools.chain.from_iterable(future.result() for future in futures))
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def _find_sparse_duplicate_groups_in_parallel(
+    matrix: SparseAbundances,
+    workers: int,
+    rtol: float,
+    atol: float,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[np.ndarray]:
+    """Scan blocks of columns of a sparse matrix in a process pool.
+
+    The columns are split where the stored entries divide evenly, so that columns of many positive abundances do
+    not end up with a single worker. Every worker is sent only the stored entries of its block, and sends its groups
+    back as one array, as pickling many small arrays would take longer than the scan.
+
+    Args:
+        matrix (SparseAbundances): Matrix with features in rows and samples in columns.
+        workers (int): Number of processes.
+        rtol (float): Relative tolerance within which values count as equal.
+        atol (float): Absolute tolerance within which values count as equal.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        list[np.ndarray]: Row positions of each duplicate group, as a serial scan.
+    """
+    n_columns = matrix.shape[1]
+    cuts = np.searchsorted(matrix.indptr, np.linspace(0, matrix.indptr[-1], workers + 1)[1:-1])
+    bounds = np.unique(np.concatenate([[0], np.clip(cuts, 1, n_columns - 1), [n_columns]]))
+    blocks = [_sparse_columns(matrix, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+    with ProcessPoolExecutor(max_workers=len(blocks)) as executor:
+        futures = [
+            executor.submit(_scan_sparse_block, block, rtol, atol, retention_times, rt_window) for block in blocks
+        ]
+        groups = []
+        for future in futures:
+            positions, ends = future.result()
+            if len(ends):
+                groups.extend(np.split(positions, ends[:-1]))
+        return groups
+
+
+def _scan_sparse_block(
+    matrix: SparseAbundances,
+    rtol: float,
+    atol: float,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find duplicate groups in a block of columns of a sparse matrix, see `find_sparse_duplicate_groups`.
+
+    Args:
+        matrix (SparseAbundances): The block of columns.
+        rtol (float): Relative tolerance within which values count as equal.
+        atol (float): Absolute tolerance within which values count as equal.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Row positions of all groups one after another, and the end of every group.
+    """
+    groups = find_sparse_duplicate_groups(
+        matrix, rtol=rtol, atol=atol, retention_times=retention_times, rt_window=rt_window
+    )
+    positions = np.concatenate(groups) if groups else np.empty(0, dtype=np.intp)
+    return positions, np.cumsum([len(group) for group in groups], dtype=np.intp)
+
+
+def _sparse_columns(matrix: SparseAbundances, start: int, stop: int) -> SparseAbundances:
+    """Take a block of columns of a sparse matrix.
+
+    Args:
+        matrix (SparseAbundances): Matrix with features in rows and samples in columns.
+        start (int): First column of the block.
+        stop (int): Column after the last column of the block.
+
+    Returns:
+        SparseAbundances: The columns from `start` to `stop`.
+    """
+    first, last = matrix.indptr[start], matrix.indptr[stop]
+    return SparseAbundances(
+        matrix.data[first:last],
+        matrix.indices[first:last],
+        matrix.indptr[start : stop + 1] - first,
+        (matrix.shape[0], stop - start),
+    )
+
+
+def _scan_shared_block(
+    name: str,
+    shape: tuple[int, int],
+    start: int,
+    stop: int,
+    rtol: float,
+    atol: float,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[list[np.ndarray]]:
+    """Find duplicate groups in a block of columns of a matrix held in shared memory.
+
+    Args:
+        name (str): Name of the shared memory block.
+        shape (tuple[int, int]): Shape of the column-major float64 matrix.
+        start (int): First column of the block.
+        stop (int): Column after the last column of the block.
+        rtol (float): Relative tolerance within which values count as equal.
+        atol (float): Absolute tolerance within which values count as equal.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        list[list[np.ndarray]]: Row positions of each duplicate group for every column of the block.
+    """
+    shared = SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.float64, buffer=shared.buf, order="F")
+        groups = find_column_duplicate_groups(
+            matrix[:, start:stop], rtol=rtol, atol=atol, retention_times=retention_times, rt_window=rt_window
+        )
+        del matrix
+        return groups
+    finally:
+        shared.close()
+
+
+def _scan_mapped_block(
+    path: str,
+    offset: int,
+    shape: tuple[int, int],
+    start: int,
+    stop: int,
+    rtol: float,
+    atol: float,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[list[np.ndarray]]:
+    """Find duplicate groups in a block of columns of a matrix memory-mapped from a file.
+
+    Args:
+        path (str): The file holding the matrix.
+        offset (int): Position of the matrix in the file in bytes.
+        shape (tuple[int, int]): Shape of the column-major float64 matrix.
+        start (int): First column of the block.
+        stop (int): Column after the last column of the block.
+        rtol (float): Relative tolerance within which values count as equal.
+        atol (float): Absolute tolerance within which values count as equal.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        list[list[np.ndarray]]: Row positions of each duplicate group for every column of the block.
+    """
+    matrix = np.memmap(path, dtype=np.float64, mode="r", offset=offset, shape=shape, order="F")
+    groups = find_column_duplicate_groups(
+        matrix[:, start:stop], rtol=rtol, atol=atol, retention_times=retention_times, rt_window=rt_window
+    )
+    del matrix
+    return groups
+
+
+def _collect_runs(
+    sorted_values: np.ndarray,
+    positions: np.ndarray,
+    segment_bounds: np.ndarray,
+    rtol: float = 0.0,
+    atol: float = 0.0,
+    retention_times: np.ndarray | None = None,
+    rt_window: float | None = None,
+) -> list[list[np.ndarray]]:
+    """Split sorted segments into runs of equal values and keep those with at least two members.
+
+    Args:
+        sorted_values (np.ndarray): Concatenated segments, each sorted in ascending order with NaN last. With
+            `rt_window`, equal values are sorted by retention time.
+        positions (np.ndarray): Row position of every entry in `sorted_values`.
+        segment_bounds (np.ndarray): Offset of every segment in `sorted_values`, followed by their total length.
+        rtol (float, optional): Relative tolerance within which neighbours count as equal. Defaults to 0.
+        atol (float, optional): Absolute tolerance within which neighbours count as equal. Defaults to 0.
+        retention_times (np.ndarray | None, optional): Retention time of every row. Defaults to None.
+        rt_window (float | None, optional): Retention time gap beyond which rows are never duplicates.
+            Defaults to None.
+
+    Returns:
+        list[list[np.ndarray]]: Row positions of every run of equal values, for every segment.
+    """
+    if rtol or atol:
+        same_as_next = np.diff(sorted_values) <= atol + rtol * np.abs(sorted_values[1:])
+    else:
+        same_as_next = sorted_values[1:] == sorted_values[:-1]
+        if rt_window is not None:
+            # Equal values are in retention time order, so ties eluting apart are never joined.
+            same_as_next &= np.diff(retention_times[positions]) <= rt_window
+    # Entries ending a segment are never tied with the first entry of the next one, empty segments end nowhere.
+    segment_ends = segment_bounds[1:-1] - 1
+    same_as_next[segment_ends[(segment_ends >= 0) & (segment_ends < len(same_as_next))]] = False
+
+    # Runs are built from the entries equal to their successor only, which are few next to all entries.
+    tied = np.flatnonzero(same_as_next)
+    run_breaks = np.flatnonzero(np.diff(tied) != 1) + 1
+    starts = tied[np.concatenate(([0], run_breaks))] if len(tied) else tied
+    stops = tied[np.concatenate((run_breaks - 1, [len(tied) - 1]))] + 2 if len(tied) else tied
+    # Copies, so that the runs do not keep the positions of the whole segment block alive.
+    runs = [positions[start:stop].copy() for start, stop in zip(starts, stops)]
 
-    all_duplicates = list(itertools.chain(*[val for key, val in duplicates.items()]))
-    return all_duplicates
+    bounds = np.searchsorted(starts, segment_bounds)
+    segment_runs = [runs[first:last] for first, last in zip(bounds[:-1], bounds[1:])]
+    if rt_window is not None and (rtol or atol):
+        # Neighbours within a tolerance differ in value, so they are not in retention time order.
+        segment_runs = [split_groups_by_retention_time(runs, retention_times, rt_window) for runs in segment_runs]
+    return segment_runs
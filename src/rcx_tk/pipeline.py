@@ -0,0 +1,169 @@
+import queue
+import threading
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Sequence
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+
+FINISHED = object()
+"""Returned by a read function for an item that needs no processing, e.g. because its output was cached."""
+
+READERS = 2
+QUEUE_SIZE = 2
+
+_READ = "read"
+_PROCESSED = "processed"
+_READER_DONE = "reader done"
+
+
+def run_pipeline(
+    items: Sequence,
+    read: Callable[[object], object],
+    process: Callable[[object], object],
+    write: Callable[[object, object], None],
+    workers: int = 1,
+    readers: int = READERS,
+    queue_size: int = QUEUE_SIZE,
+) -> list[str | None]:
+    """Runs items through overlapping read, process and write stages, continuing past failures.
+
+    Items are read in `readers` threads, processed in a pool of `workers` processes, or in the calling thread
+    if `workers` is 1, and written in a thread of their own. Bounded queues between the stages stall a stage that
+    runs ahead, so that at most `queue_size` read and `queue_size` processed items wait between the stages,
+    besides the items held by the stages themselves. The run takes about as long as its slowest stage.
+
+    Args:
+        items (Sequence): The items, e.g. pairs of input and output paths.
+        read (Callable[[object], object]): Function reading the data of an item, called in a thread. May return
+            `FINISHED` for an item that needs no processing.
+        process (Callable[[object], object]): Function processing the data read, picklable if `workers` > 1.
+        write (Callable[[object, object], None]): Function writing the processed data of an item, called in a thread
+            with the item and the data.
+        workers (int, optional): Number of processes running `process`. Defaults to 1.
+        readers (int, optional): Number of threads running `read`. Defaults to 2.
+        queue_size (int, optional): Number of items waiting between two stages. Defaults to 2.
+
+    Returns:
+        list[str | None]: Description of the error of every item whose processing failed, otherwise None.
+    """
+    errors: list[str | None] = [None] * len(items)
+    events: queue.SimpleQueue = queue.SimpleQueue()
+    read_slots = threading.Semaphore(queue_size)
+    write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    pending = iter(enumerate(items))
+    pending_lock = threading.Lock()
+
+    def read_items() -> None:
+        while True:
+            with pending_lock:
+                index, item = next(pending, (None, None))
+            if index is None:
+                events.put((_READER_DONE, None, None, None))
+                return
+            read_slots.acquire()
+            data, error = _attempt(read, item)
+            events.put((_READ, index, data, error))
+
+    def write_items() -> None:
+        while (entry := write_queue.get()) is not None:
+            index, data = entry
+            errors[index] = _attempt(write, items[index], data)[1]
+
+    threads = [threading.Thread(target=read_items, daemon=True) for _ in range(min(readers, len(items)))]
+    writer = threading.Thread(target=write_items, daemon=True)
+    for thread in [*threads, writer]:
+        thread.start()
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    waiting: deque[tuple[int, object]] = deque()
+    active_readers = len(threads)
+    in_flight = 0
+    try:
+        while active_readers or waiting or in_flight:
+            kind, index, data, error = events.get()
+            if kind == _READER_DONE:
+                active_readers -= 1
+            elif kind == _READ and (error is not None or data is FINISHED):
+                read_slots.release()
+                errors[index] = error
+            elif kind == _READ:
+                waiting.append((index, data))
+            else:
+                in_flight -= 1
+                _hand_over(write_queue, errors, index, data, error)
+
+            while waiting and (executor is None or in_flight < workers):
+                index, data = waiting.popleft()
+                read_slots.release()
+                if executor is None:
+                    _hand_over(write_queue, errors, index, *_attempt(process, data))
+                else:
+                    future = executor.submit(process, data)
+                    future.add_done_callback(
+                        lambda future, index=index: events.put((_PROCESSED, index, *_outcome(future)))
+                    )
+                    in_flight += 1
+    finally:
+        write_queue.put(None)
+        writer.join()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return errors
+
+
+def describe_error(error: BaseException) -> str:
+    """Describes an error for a report.
+
+    Args:
+        error (BaseException): The error.
+
+    Returns:
+        str: The error's type followed by its message.
+    """
+    return f"{type(error).__name__}: {error}"
+
+
+def _attempt(function: Callable, *args: object) -> tuple[object, str | None]:
+    """Calls a function, catching errors.
+
+    Args:
+        function (Callable): The function.
+        *args (object): Its arguments.
+
+    Returns:
+        tuple[object, str | None]: The result, or None and the description of the error.
+    """
+    try:
+        return function(*args), None
+    except Exception as e:
+        return None, describe_error(e)
+
+
+def _outcome(future: Future) -> tuple[object, str | None]:
+    """Unpacks a finished future like `_attempt`.
+
+    Args:
+        future (Future): The future.
+
+    Returns:
+        tuple[object, str | None]: The result, or None and the description of the error.
+    """
+    error = future.exception()
+    return (None, describe_error(error)) if error is not None else (future.result(), None)
+
+
+def _hand_over(write_queue: queue.Queue, errors: list[str | None], index: int, data: object, error: str | None) -> None:
+    """Queues processed data for writing, blocking while the queue is full, or records the error of the item.
+
+    Args:
+        write_queue (queue.Queue): The queue of the writing thread.
+        errors (list[str | None]): Errors of all items, updated in place.
+        index (int): Position of the item.
+        data (object): The processed data.
+        error (str | None): Description of the error if processing failed.
+    """
+    if error is None:
+        write_queue.put((index, data))
+    else:
+        errors[index] = error
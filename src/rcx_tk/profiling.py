@@ -0,0 +1,116 @@
+import json
+import logging
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_records: list[dict] | None = None
+_origin = 0.0
+_local = threading.local()
+
+_MEASURES = ("stage", "start", "seconds", "peak_rss_bytes")
+
+
+@contextmanager
+def profile() -> Iterator[list[dict]]:
+    """Collects the stages run within the context.
+
+    Stages are only measured while a profile is active, otherwise `stage` does nothing but yield.
+
+    Yields:
+        list[dict]: The records of the finished stages in the order they finished, with the path of the stage,
+            its start in seconds since the profile started, its duration, the peak RSS at its end and its counts.
+    """
+    global _records, _origin
+    outer = _records, _origin
+    _records, _origin = [], time.perf_counter()
+    try:
+        yield _records
+    finally:
+        _records, _origin = outer
+
+
+@contextmanager
+def stage(name: str, **counts: object) -> Iterator[dict]:
+    """Measures a processing stage if a profile is active.
+
+    Args:
+        name (str): Name of the stage, nested into the name of the enclosing stage.
+        **counts (object): Sizes describing the stage, e.g. rows and columns of its input.
+
+    Yields:
+        dict: Counts of the stage, to which the stage may add sizes known only once it ran.
+    """
+    if _records is None:
+        yield counts
+        return
+
+    # Stages nest per thread, so that stages run concurrently in threads of a pipeline do not nest into each other.
+    parents = _local.__dict__.setdefault("path", [])
+    parents.append(name)
+    path = "/".join(parents)
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        parents.pop()
+        record = {
+            "stage": path,
+            "start": start - _origin,
+            "seconds": time.perf_counter() - start,
+            "peak_rss_bytes": peak_rss(),
+            **counts,
+        }
+        _records.append(record)
+        logger.debug("%s took %.3f s %s", path, record["seconds"], counts)
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size of the process so far.
+
+    Returns:
+        int | None: Size in bytes, or None where the platform does not report it.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_report(records: list[dict]) -> str:
+    """Formats stage records as a table, nested stages indented below the stage enclosing them.
+
+    Args:
+        records (list[dict]): The records collected by `profile`.
+
+    Returns:
+        str: One line per stage in the order the stages started.
+    """
+    lines = []
+    for record in sorted(records, key=lambda record: record["start"]):
+        *parents, name = record["stage"].split("/")
+        rss = record["peak_rss_bytes"]
+        rss = "" if rss is None else f"{rss / 1024**2:10.1f} MiB"
+        counts = ", ".join(f"{key}={value}" for key, value in record.items() if key not in _MEASURES)
+        lines.append(f"{'  ' * len(parents) + name:<40}{record['seconds']:10.3f} s{rss}  {counts}".rstrip())
+    return "\n".join(lines)
+
+
+def write_report(records: list[dict], file_path: str) -> None:
+    """Writes stage records as a JSON list.
+
+    Args:
+        records (list[dict]): The records collected by `profile`.
+        file_path (str): A path where the report is exported.
+    """
+    with open(file_path, "w") as file:
+        json.dump(records, file, indent=2)
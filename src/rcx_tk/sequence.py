@@ -1,23 +1,86 @@
 import re
 from typing import Tuple
 import pandas as pd
-from numpy import int64
+from rcx_tk import profiling
+from rcx_tk.io import read_excel_sheets
 from rcx_tk.io import read_file
-from rcx_tk.io import save_dataframe_as_tsv
-from rcx_tk.utils import replace_spaces
-from rcx_tk.utils import validate_filename
-
-
-def process_sequence_file(file_path: str, out_path: str) -> None:
+from rcx_tk.io import save_dataframe
+from rcx_tk.io import split_extension
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover
+    pa = None
+
+_SEQUENCE_PATTERN = re.compile(r"^(.*\D)(\d+)$")
+_SUBJECT_PATTERN = re.compile(r"^(\d+_)(.*?)(_\d+)$")
+_FILENAME_PATTERN = re.compile(r"^(?P<sequence>\d+_(?P<subject>.*)_)(?P<order>\d+)$")
+# At least two tokens between underscores, the last of them digits, as checked by `utils.validate_filename`.
+_VALID_FILENAME_PATTERN = r"(?s).*[^_].*_\d+_*"
+
+SEQUENCE_COLUMNS = ["File name", "Type", "Class ID", "Batch", "Analytical order"]
+SEQUENCE_DTYPES = {"File name": "str", "Type": "str"}
+SEQUENCE_RENAMES = {"Type": "sampleType", "Class ID": "class", "Batch": "batch", "Analytical order": "injectionOrder"}
+
+VALIDATION_CHECKS: dict[str, str] = {
+    "file_name": "File name must end in _<digits> following at least one other part",
+    "injection_order_integer": "Analytical order must be an integer",
+    "injection_order_monotonic": "Analytical order must increase within a batch",
+    "duplicate_sample_name": "Sample names must be unique",
+    "missing_type": "Type must not be empty",
+    "missing_class": "Class ID must not be empty",
+}
+
+
+def process_sequence_file(file_path: str, out_path: str, sheets: list[str] | str | None = None) -> None:
     """Processes a metadata file, keeping and renaming specific columns.
 
+    Only the columns in `SEQUENCE_COLUMNS` are parsed from the file.
+
     Args:
         file_path (str): A path to the metadata file.
         out_path (str): A path where processed metadata dataframe is exported.
+        sheets (list[str] | str | None, optional): Sheets of an Excel workbook to process into separate files,
+            named by `sheet_output_path`, or `ALL_SHEETS` for every sheet. Defaults to None, processing the first sheet.
     """
-    df = read_file(file_path)
+    if sheets is not None:
+        workbook = read_excel_sheets(file_path, sheets, columns=SEQUENCE_COLUMNS, dtype=SEQUENCE_DTYPES)
+        for sheet, df in workbook.items():
+            save_dataframe(process_sequence(df), sheet_output_path(out_path, sheet))
+        return
+
+    df = read_sequence_file(file_path)
     df = process_sequence(df)
-    save_dataframe_as_tsv(df, out_path)
+    save_dataframe(df, out_path)
+
+
+def read_sequence_file(file_path: str) -> pd.DataFrame:
+    """Imports the columns of a metadata file used by `process_sequence`.
+
+    Args:
+        file_path (str): A path to the metadata file.
+
+    Returns:
+        pd.DataFrame: The columns in `SEQUENCE_COLUMNS`.
+    """
+    return read_file(file_path, columns=SEQUENCE_COLUMNS, dtype=SEQUENCE_DTYPES)
+
+
+def sheet_output_path(out_path: str, sheet: str) -> str:
+    """Derives the output path of a single sheet of a workbook.
+
+    Args:
+        out_path (str): Output path with the placeholder {sheet}, or a path to which the sheet name is appended.
+        sheet (str): The sheet name.
+
+    Returns:
+        str: The output path.
+    """
+    if "{sheet}" in out_path:
+        return out_path.replace("{sheet}", sheet)
+    stem = split_extension(out_path)[0]
+    return f"{stem}_{sheet}{out_path[len(stem) :]}"
 
 
 def process_sequence(df: pd.DataFrame) -> pd.DataFrame:
@@ -26,15 +89,22 @@ def process_sequence(df: pd.DataFrame) -> pd.DataFrame:
     Args:
         df (pd.DataFrame): The metadata dataframe.
 
+    Raises:
+        ValueError: An error listing every row failing any of the checks of `validate_sequence`.
+
     Returns:
         pd.DataFrame: A metadata dataframe with rearranged and newly derived columns.
     """
-    df = rearrange_columns(df)
-    validate_filenames_column(df)
-    validate_injection_order(df)
-    df["sampleName"] = df["File name"].apply(replace_spaces)
-    df = derive_additional_metadata(df)
-    df = cleanup(df)
+    with profiling.stage("rearrange", rows=len(df), columns=df.shape[1]):
+        df = rearrange_columns(df)
+    with profiling.stage("validate", rows=len(df)) as counts:
+        report = validate_sequence(df)
+        counts["failures"] = len(report)
+        if len(report):
+            raise ValueError(format_validation_report(report))
+    with profiling.stage("derive", rows=len(df)):
+        df = derive_additional_metadata(df)
+        df = cleanup(df)
     return df
 
 
@@ -54,32 +124,171 @@ def cleanup(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def validate_injection_order(df: pd.DataFrame) -> bool:
-    """Validates if injectionOrder is of integer type.
+    """Validates if injectionOrder holds integers increasing within every batch.
 
     Args:
         df (pd.DataFrame): The metadata dataframe.
 
     Returns:
-        bool: Whether the injectionOrder is integer.
+        bool: Whether the injectionOrder is valid.
+    """
+    orders = pd.to_numeric(df["injectionOrder"], errors="coerce")
+    batches = df["batch"] if "batch" in df.columns else None
+    return not (_non_integers(orders).any() or _not_increasing(orders, batches).any())
+
+
+def validate_sequence(df: pd.DataFrame) -> pd.DataFrame:
+    """Runs all `VALIDATION_CHECKS` on a metadata dataframe, each as a single operation on a whole column.
+
+    Args:
+        df (pd.DataFrame): The metadata dataframe with rearranged columns, see `rearrange_columns`.
+
+    Returns:
+        pd.DataFrame: One row per failing row and check, with the index of the failing row, the column as named in
+            the file, the check as a key of `VALIDATION_CHECKS` and the offending value as text. Empty if all rows
+            are valid.
+    """
+    file_names = df["File name"].astype("str")
+    orders = pd.to_numeric(df["injectionOrder"], errors="coerce")
+    sample_names = file_names.str.replace(" ", "_", regex=False)
+    failures = {
+        "file_name": ("File name", _invalid_file_names(file_names)),
+        "injection_order_integer": ("injectionOrder", _non_integers(orders)),
+        "injection_order_monotonic": ("injectionOrder", _not_increasing(orders, df["batch"])),
+        "duplicate_sample_name": ("File name", sample_names.duplicated(keep=False) & sample_names.notna()),
+        "missing_type": ("sampleType", _empty(df["sampleType"])),
+        "missing_class": ("class", _empty(df["class"])),
+    }
+
+    file_columns = {renamed: column for column, renamed in SEQUENCE_RENAMES.items()}
+    report = [
+        pd.DataFrame(
+            {
+                "row": df.index[failed.to_numpy()],
+                "column": file_columns.get(column, column),
+                "check": check,
+                "value": df.loc[failed.to_numpy(), column].astype("str").to_numpy(),
+            }
+        )
+        for check, (column, failed) in failures.items()
+    ]
+    return pd.concat(report, ignore_index=True)
+
+
+def format_validation_report(report: pd.DataFrame) -> str:
+    """Formats a validation report as one line per failed check, listing the failing rows.
+
+    Args:
+        report (pd.DataFrame): The report of `validate_sequence`.
+
+    Returns:
+        str: The description of every failed check followed by the index of its failing rows.
+    """
+    lines = [f"Invalid sequence, {len(report)} failed checks:"]
+    for check, failed in report.groupby("check", sort=False):
+        rows = ", ".join(map(str, failed["row"]))
+        lines.append(f"{VALIDATION_CHECKS[check]}, rows {rows}")
+    return "\n".join(lines)
+
+
+def _invalid_file_names(file_names: pd.Series) -> pd.Series:
+    """Finds file names failing `utils.validate_filename`, matching all of them in one pass.
+
+    Args:
+        file_names (pd.Series): The file names as text.
+
+    Returns:
+        pd.Series: Whether every file name fails.
+    """
+    return ~file_names.str.fullmatch(_VALID_FILENAME_PATTERN, na=False)
+
+
+def _non_integers(orders: pd.Series) -> pd.Series:
+    """Finds values that are missing, not numbers or not whole numbers.
+
+    Args:
+        orders (pd.Series): The values converted to numbers, NaN where the conversion failed.
+
+    Returns:
+        pd.Series: Whether every value fails.
+    """
+    return orders.isna() | (orders % 1 != 0)
+
+
+def _not_increasing(orders: pd.Series, batches: pd.Series | None) -> pd.Series:
+    """Finds values not greater than the value in the row before, within the same batch.
+
+    Args:
+        orders (pd.Series): The values converted to numbers.
+        batches (pd.Series | None): The batch of every row, or None if there is a single batch.
+
+    Returns:
+        pd.Series: Whether every value fails.
+    """
+    steps = orders.diff() if batches is None else orders.groupby(batches.to_numpy()).diff()
+    return steps <= 0
+
+
+def _empty(values: pd.Series) -> pd.Series:
+    """Finds missing or blank values.
+
+    Args:
+        values (pd.Series): The values.
+
+    Returns:
+        pd.Series: Whether every value fails.
     """
-    return df["injectionOrder"].dtypes == int64
+    return values.isna() | (values.astype("str").str.strip() == "")
 
 
 def derive_additional_metadata(df: pd.DataFrame) -> pd.DataFrame:
     """Derives additional metadata columns.
 
+    All columns are extracted from the file names in a single vectorized pass.
+
     Args:
         df (pd.DataFrame): The metadata dataframe.
 
+    Raises:
+        ValueError: An error if any file name cannot be decomposed.
+
     Returns:
         pd.DataFrame: The processed dataframe.
     """
-    df["sequenceIdentifier"] = df["File name"].apply(add_sequence_identifier)
-    df["subjectIdentifier"] = df["File name"].apply(add_subject_identifier)
-    df["localOrder"] = df["File name"].apply(add_local_order)
+    file_names = df["File name"]
+    parts = _extract_filename_parts(file_names)
+    invalid = parts["order"].isna()
+    if invalid.any():
+        raise ValueError(f"Cannot derive metadata from File name: {', '.join(file_names[invalid].astype(str))}.")
+
+    df = df.assign(
+        sampleName=file_names.str.replace(" ", "_", regex=False),
+        sequenceIdentifier=parts["sequence"].str.rstrip("_").str.strip(),
+        subjectIdentifier=parts["subject"].str.strip(),
+        localOrder=parts["order"].astype(int),
+    )
     return df
 
 
+def _extract_filename_parts(file_names: pd.Series) -> pd.DataFrame:
+    """Matches all file names against the file name pattern, with Arrow's regex engine if pyarrow is installed.
+
+    Args:
+        file_names (pd.Series): The file names.
+
+    Returns:
+        pd.DataFrame: The sequence, subject and order parts of every file name, missing where it does not match.
+    """
+    if pa is None:
+        return file_names.str.extract(_FILENAME_PATTERN)
+
+    matches = pc.extract_regex(pa.array(file_names), _FILENAME_PATTERN.pattern)
+    names = [field.name for field in matches.type]
+    return pd.DataFrame(
+        {name: pd.Series(part, dtype="str", index=file_names.index) for name, part in zip(names, matches.flatten())}
+    )
+
+
 def rearrange_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Rearranges the columns.
 
@@ -89,13 +298,9 @@ def rearrange_columns(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: The processed dataframe.
     """
-    columns_to_keep = ["File name", "Type", "Class ID", "Batch", "Analytical order"]
+    df = df[SEQUENCE_COLUMNS]
 
-    df = df[list(columns_to_keep)]
-
-    df = df.rename(
-        columns={"Type": "sampleType", "Class ID": "class", "Batch": "batch", "Analytical order": "injectionOrder"}
-    )
+    df = df.rename(columns=SEQUENCE_RENAMES)
 
     return df
 
@@ -107,10 +312,12 @@ def validate_filenames_column(df: pd.DataFrame) -> None:
         df (pd.DataFrame): A dataframe to process.
 
     Raises:
-        ValueError: An error if there is any invalid file name.
+        ValueError: An error listing every invalid file name.
     """
-    if not df["File name"].apply(validate_filename).all():
-        raise ValueError("Invalid File name.")
+    file_names = df["File name"].astype("str")
+    invalid = _invalid_file_names(file_names)
+    if invalid.any():
+        raise ValueError(f"Invalid File name: {', '.join(file_names[invalid].fillna(''))}.")
 
 
 def add_local_order(file_name: str) -> int:
@@ -150,7 +357,7 @@ def separate_filename(file_name: str) -> Tuple[str, str]:
     Returns:
         Tuple[str, str]: Splitted file_name.
     """
-    a, b = re.findall(r"^(.*\D)(\d+)$", file_name)[0]
+    a, b = _SEQUENCE_PATTERN.findall(file_name)[0]
     return (a, b)
 
 
@@ -163,6 +370,6 @@ def add_subject_identifier(file_name: str) -> str:
     Returns:
         str: The subjectIdentifier value.
     """
-    _, b, _ = re.findall(r"^(\d+_)(.*?)(_\d+)$", file_name)[0]
+    _, b, _ = _SUBJECT_PATTERN.findall(file_name)[0]
     b = b.strip()
     return b
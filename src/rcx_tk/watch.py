@@ -0,0 +1,304 @@
+import fnmatch
+import json
+import logging
+import os
+import signal
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from datetime import datetime
+from datetime import timezone
+from rcx_tk.batch import output_path
+from rcx_tk.batch import try_process_file
+from rcx_tk.cache import file_digest
+from rcx_tk.io import split_extension
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUTES: list[tuple[str, str]] = [
+    ("*[Aa]lkane*", "alkanes"),
+    ("*.csv", "sequence"),
+    ("*.xls", "sequence"),
+    ("*.xlsx", "sequence"),
+    ("*.txt", "msdial"),
+]
+
+LEDGER_NAME = ".rcx_tk-ledger.jsonl"
+
+
+def parse_route(route: str) -> tuple[str, str]:
+    """Parses a routing rule written as PATTERN=METHOD.
+
+    Args:
+        route (str): The rule, e.g. "Height_*.txt=msdial".
+
+    Raises:
+        ValueError: Error if the rule has no method.
+
+    Returns:
+        tuple[str, str]: The file name pattern and the processing method.
+    """
+    pattern, separator, method = route.rpartition("=")
+    if not separator or not pattern:
+        raise ValueError(f"Invalid route {route}, expected PATTERN=METHOD.")
+    return pattern, method
+
+
+def route_file(file_name: str, routes: list[tuple[str, str]]) -> str | None:
+    """Finds the processing method of a file by the first routing rule whose pattern matches its name.
+
+    Patterns also match the name of a compressed file without its compression extension, so that "*.txt" routes
+    "alignment.txt.gz" as well.
+
+    Args:
+        file_name (str): The file name.
+        routes (list[tuple[str, str]]): File name patterns and their processing methods.
+
+    Returns:
+        str | None: The processing method, or None if no rule matches.
+    """
+    uncompressed = os.path.splitext(file_name)[0] if split_extension(file_name)[2] is not None else file_name
+    for pattern, method in routes:
+        if fnmatch.fnmatchcase(file_name, pattern) or fnmatch.fnmatchcase(uncompressed, pattern):
+            return method
+    return None
+
+
+def scan_directory(directory: str, routes: list[tuple[str, str]]) -> dict[str, tuple[int, int]]:
+    """Lists the routed files of a directory with their size and modification time, skipping hidden files.
+
+    Args:
+        directory (str): The watched directory.
+        routes (list[tuple[str, str]]): File name patterns and their processing methods.
+
+    Returns:
+        dict[str, tuple[int, int]]: Size and modification time in nanoseconds of every routed file, by path.
+    """
+    snapshot = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file() or route_file(entry.name, routes) is None:
+                continue
+            stat = entry.stat()
+            snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def settled_files(
+    snapshot: dict[str, tuple[int, int]], pending: dict[str, tuple[tuple[int, int], float]], now: float, settle: float
+) -> list[str]:
+    """Debounces files still being written, returning those whose size and modification time stopped changing.
+
+    Args:
+        snapshot (dict[str, tuple[int, int]]): The current size and modification time of every file.
+        pending (dict[str, tuple[tuple[int, int], float]]): Size and modification time of every file as first seen,
+            and when it was seen. Updated in place, settled and vanished files are removed.
+        now (float): The current time in seconds.
+        settle (float): Seconds a file has to stay unchanged.
+
+    Returns:
+        list[str]: Paths of the settled files, sorted.
+    """
+    for path in list(pending):
+        if path not in snapshot:
+            del pending[path]
+
+    settled = []
+    for path, signature in sorted(snapshot.items()):
+        seen = pending.get(path)
+        if seen is None or seen[0] != signature:
+            pending[path] = (signature, now)
+        elif now - seen[1] >= settle:
+            del pending[path]
+            settled.append(path)
+    return settled
+
+
+def read_ledger(ledger_path: str) -> dict[str, dict]:
+    """Reads the ledger of processed files, later records of a file replacing earlier ones.
+
+    Args:
+        ledger_path (str): The path to the ledger, which may not exist yet.
+
+    Returns:
+        dict[str, dict]: The latest record of every processed file, by path.
+    """
+    if not os.path.exists(ledger_path):
+        return {}
+    ledger = {}
+    with open(ledger_path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash while appending.
+                continue
+            ledger[record["path"]] = record
+    return ledger
+
+
+def append_ledger(ledger_path: str, record: dict) -> None:
+    """Appends a record of a processed file to the ledger.
+
+    Args:
+        ledger_path (str): The path to the ledger.
+        record (dict): The record, holding at least the path of the file.
+    """
+    with open(ledger_path, "a") as file:
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def is_processed(ledger: dict[str, dict], path: str, signature: tuple[int, int]) -> bool:
+    """Checks whether a file was processed in its current state.
+
+    A file with a new size or modification time counts as processed if its content digest is unchanged,
+    its record then takes the new size and modification time.
+
+    Args:
+        ledger (dict[str, dict]): The latest record of every processed file, updated in place.
+        path (str): The path to the file.
+        signature (tuple[int, int]): Size and modification time in nanoseconds of the file.
+
+    Returns:
+        bool: Whether the file needs no processing.
+    """
+    record = ledger.get(path)
+    if record is None:
+        return False
+    if (record["size"], record["mtime_ns"]) == signature:
+        return True
+    if record["digest"] != file_digest(path):
+        return False
+    record["size"], record["mtime_ns"] = signature
+    return True
+
+
+def watch(
+    directory: str,
+    out_template: str,
+    routes: list[tuple[str, str]] = DEFAULT_ROUTES,
+    jobs: int = 1,
+    interval: float = 2.0,
+    settle: float = 5.0,
+    ledger_path: str | None = None,
+    polls: int | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+    **options,
+) -> None:
+    """Polls a directory and processes new or changed files as soon as they are completely written.
+
+    Every file is routed to a processing method by the first matching rule of `routes`. Files are processed once
+    their size and modification time stayed unchanged for `settle` seconds. Outcomes are appended to a ledger,
+    so files processed before a restart are not processed again unless they changed. Failed files are retried
+    only once they change.
+
+    Args:
+        directory (str): The watched directory.
+        out_template (str): Output path template, see `rcx_tk.batch.output_path`.
+        routes (list[tuple[str, str]], optional): File name patterns and their processing methods.
+            Defaults to `DEFAULT_ROUTES`.
+        jobs (int, optional): Number of files processed in parallel worker processes, which stay alive between
+            files. Defaults to 1, processing files in the watching process.
+        interval (float, optional): Seconds between polls. Defaults to 2.
+        settle (float, optional): Seconds a file has to stay unchanged before it is processed. Defaults to 5.
+        ledger_path (str | None, optional): The ledger of processed files. Defaults to `LEDGER_NAME` in the watched
+            directory.
+        polls (int | None, optional): Number of polls before returning, once all started files are processed.
+            Defaults to None, polling until interrupted.
+        sleep (Callable[[float], None], optional): Function waiting between polls. Defaults to `time.sleep`.
+        **options: Further keyword arguments passed to the processing functions.
+    """
+    if ledger_path is None:
+        ledger_path = os.path.join(directory, LEDGER_NAME)
+    ledger = read_ledger(ledger_path)
+    pending: dict[str, tuple[tuple[int, int], float]] = {}
+    queued: list[tuple[str, tuple[int, int]]] = []
+    running: dict[Future, dict] = {}
+    executor = ProcessPoolExecutor(max_workers=jobs, initializer=_ignore_interrupts) if jobs > 1 else None
+
+    try:
+        poll = 0
+        while polls is None or poll < polls:
+            snapshot = scan_directory(directory, routes)
+            queued_paths = {path for path, _ in queued} | {record["path"] for record in running.values()}
+            for path in settled_files(snapshot, pending, time.monotonic(), settle):
+                if path not in queued_paths and not is_processed(ledger, path, snapshot[path]):
+                    queued.append((path, snapshot[path]))
+
+            while queued and (executor is None or len(running) < jobs):
+                path, signature = queued.pop(0)
+                record = _start_record(path, signature, routes, out_template)
+                if executor is None:
+                    record["error"] = try_process_file(record["method"], path, record["output"], options)
+                    _finish(ledger_path, ledger, record)
+                else:
+                    future = executor.submit(try_process_file, record["method"], path, record["output"], options)
+                    running[future] = record
+
+            for future in [future for future in running if future.done()]:
+                record = running.pop(future)
+                record["error"] = future.result()
+                _finish(ledger_path, ledger, record)
+
+            poll += 1
+            if polls is None or poll < polls:
+                sleep(interval)
+
+        for future in wait(running).done:
+            record = running.pop(future)
+            record["error"] = future.result()
+            _finish(ledger_path, ledger, record)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def _ignore_interrupts() -> None:
+    """Leaves Ctrl+C to the watching process, which shuts the workers down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _start_record(
+    path: str, signature: tuple[int, int], routes: list[tuple[str, str]], out_template: str
+) -> dict[str, object]:
+    """Creates the ledger record of a file about to be processed.
+
+    Args:
+        path (str): The path to the file.
+        signature (tuple[int, int]): Size and modification time in nanoseconds of the file.
+        routes (list[tuple[str, str]]): File name patterns and their processing methods.
+        out_template (str): Output path template.
+
+    Returns:
+        dict[str, object]: The record without the outcome.
+    """
+    method = route_file(os.path.basename(path), routes)
+    return {
+        "path": path,
+        "size": signature[0],
+        "mtime_ns": signature[1],
+        "digest": file_digest(path),
+        "method": method,
+        "output": output_path(out_template, path, method),
+    }
+
+
+def _finish(ledger_path: str, ledger: dict[str, dict], record: dict) -> None:
+    """Records the outcome of a processed file.
+
+    Args:
+        ledger_path (str): The path to the ledger.
+        ledger (dict[str, dict]): The latest record of every processed file, updated in place.
+        record (dict): The record of the file, including its error if processing failed.
+    """
+    record["processed_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    append_ledger(ledger_path, record)
+    ledger[record["path"]] = record
+    if record["error"] is None:
+        logger.info("Processed %s into %s.", record["path"], record["output"])
+    else:
+        logger.error("Failed to process %s: %s", record["path"], record["error"])
@@ -0,0 +1,88 @@
+import json
+import os
+import platform
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime
+from datetime import timezone
+import numpy as np
+import pandas as pd
+import pytest
+from rcx_tk import __version__
+
+
+@pytest.fixture(scope="session")
+def benchmark_results(request: pytest.FixtureRequest) -> list[dict]:
+    """Collects the results of all benchmarks and writes them as JSON at the end of the session.
+
+    Args:
+        request (pytest.FixtureRequest): The fixture request.
+
+    Yields:
+        list[dict]: The results, appended to by `measure`.
+    """
+    results: list[dict] = []
+    yield results
+    if not results:
+        return
+
+    file_path = request.config.getoption("--benchmark-json")
+    if file_path is None:
+        file_path = os.path.join(str(request.config.rootpath), ".benchmarks", f"rcx_tk-{__version__}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    report = {
+        "version": __version__,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "libraries": {"numpy": np.__version__, "pandas": pd.__version__},
+        "results": results,
+    }
+    with open(file_path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+@pytest.fixture
+def measure(request: pytest.FixtureRequest, benchmark_results: list[dict]) -> Callable[..., object]:
+    """Times a function and records its peak memory, storing the result under the name of the benchmark.
+
+    The reported time is the fastest of several rounds. Peak memory is traced with tracemalloc,
+    which covers NumPy and pandas buffers, in a separate round so that tracing does not distort the timing.
+
+    Args:
+        request (pytest.FixtureRequest): The fixture request.
+        benchmark_results (list[dict]): The results of the session.
+
+    Returns:
+        Callable[..., object]: Function taking the function to measure, the number of rounds and the parameters
+            describing the input, and returning the function's result. Its `results` attribute lists the
+            results recorded so far.
+    """
+
+    def run(target: Callable[[], object], rounds: int = 3, **params) -> object:
+        seconds = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = target()
+            seconds.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            target()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        benchmark_results.append(
+            {
+                "benchmark": request.node.originalname,
+                "params": params,
+                "seconds": min(seconds),
+                "rounds": rounds,
+                "peak_bytes": peak,
+            }
+        )
+        return result
+
+    run.results = benchmark_results
+    return run
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+METADATA_COLUMNS = [
+    "Average Rt(min)",
+    "Average RI",
+    "Quant mass",
+    "Metabolite name",
+    "Adduct type",
+    "Post curation result",
+    "Fill %",
+    "MS/MS assigned",
+    "Reference RT",
+    "Reference RI",
+    "Formula",
+    "Ontology",
+    "INCHIKEY",
+    "SMILES",
+    "Annotation tag (VS1.0)",
+    "RT matched",
+    "RI matched",
+    "EI-MS matched",
+    "Comment",
+    "Manually modified for quantification",
+    "Manually modified for annotation",
+    "Total score",
+    "RT similarity",
+    "RI similarity",
+    "EI-MS similarity",
+    "S/N average",
+    "Spectrum reference file name",
+    "EI spectrum",
+]
+
+HEADER_ROWS = ["Class", "File type", "Injection order", "Batch ID"]
+
+SAMPLE_TYPES = ["QC", "sample", "blank"]
+
+
+def msdial_alignments(
+    n_features: int, n_samples: int, duplicate_rate: float = 0.05, sparsity: float = 0.2, seed: int = 0
+) -> pd.DataFrame:
+    """Generates a deterministic MSDial alignment table as returned by `rcx_tk.io.read_msdial`.
+
+    Abundances are drawn from a log-normal distribution, so that rows share a value only where a duplicate is planted.
+
+    Args:
+        n_features (int): Number of alignments.
+        n_samples (int): Number of abundance columns.
+        duplicate_rate (float, optional): Fraction of alignments copying an abundance of another alignment in one
+            random sample. Defaults to 0.05.
+        sparsity (float, optional): Fraction of abundances set to zero. Defaults to 0.2.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: Alignments indexed by "Alignment ID", the 28 metadata columns followed by the abundances.
+    """
+    rng = np.random.default_rng(seed)
+    abundances = np.round(rng.lognormal(mean=8, sigma=2, size=(n_features, n_samples)), 2)
+    abundances[rng.random(abundances.shape) < sparsity] = 0.0
+
+    n_duplicates = int(n_features * duplicate_rate)
+    rows = rng.choice(n_features, size=n_duplicates, replace=False)
+    sources = rng.integers(0, n_features, size=n_duplicates)
+    columns = rng.integers(0, n_samples, size=n_duplicates)
+    abundances[rows, columns] = np.maximum(abundances[sources, columns], 1.0)
+    abundances[sources, columns] = abundances[rows, columns]
+
+    rt = np.round(rng.uniform(2, 30, n_features), 3)
+    metadata = pd.DataFrame(
+        {column: [""] * n_features for column in METADATA_COLUMNS}, index=pd.RangeIndex(n_features)
+    ).astype("str")
+    metadata["Average Rt(min)"] = rt
+    metadata["Average RI"] = np.round(rt * 100 + 500, 1)
+    metadata["Quant mass"] = rng.integers(50, 500, n_features)
+    metadata["Metabolite name"] = [f"Compound {i}" for i in range(n_features)]
+    metadata["Total score"] = rng.integers(0, 100, n_features)
+
+    samples = pd.DataFrame(abundances, columns=sample_names(n_samples))
+    alignments = pd.concat([metadata, samples], axis=1)
+    alignments.index = pd.Index(range(n_features), name="Alignment ID")
+    return alignments
+
+
+def sample_names(n_samples: int) -> list[str]:
+    """Names of the abundance columns of a synthetic alignment table.
+
+    Args:
+        n_samples (int): Number of abundance columns.
+
+    Returns:
+        list[str]: Names like "QC_01" or "sample_02", cycling through the sample types.
+    """
+    return [f"{SAMPLE_TYPES[i % len(SAMPLE_TYPES)]}_{i + 1:02d}" for i in range(n_samples)]
+
+
+def write_msdial_file(file_path: str, alignments: pd.DataFrame) -> None:
+    """Writes alignments in the layout of an MSDial export, with the header block above the column names.
+
+    Args:
+        file_path (str): The path to the TSV or TXT file.
+        alignments (pd.DataFrame): Alignments as generated by `msdial_alignments`.
+    """
+    n_samples = alignments.shape[1] - len(METADATA_COLUMNS)
+    types = [name.split("_")[0] for name in alignments.columns[len(METADATA_COLUMNS) :]]
+    header_values = [types, types, [str(i + 1) for i in range(n_samples)], ["1"] * n_samples]
+
+    with open(file_path, "w") as file:
+        for label, values in zip(HEADER_ROWS, header_values):
+            file.write("\t" * len(METADATA_COLUMNS) + "\t".join([label, *values]) + "\n")
+        alignments.to_csv(file, sep="\t")
+
+
+def sequence_table(n_rows: int, n_subjects: int = 50, seed: int = 0) -> pd.DataFrame:
+    """Generates a deterministic sequence (batch specification) table as exported by the instrument.
+
+    Args:
+        n_rows (int): Number of injections.
+        n_subjects (int, optional): Number of distinct subjects. Defaults to 50.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: The sequence table with the columns of the batch specification files.
+    """
+    rng = np.random.default_rng(seed)
+    order = np.arange(1, n_rows + 1)
+    subjects = rng.integers(0, n_subjects, n_rows)
+    types = np.array(["Standard", "QC", "Blank"])[rng.integers(0, 3, n_rows)]
+    file_names = [f"{i}_{kind} {subject}_{i}" for i, kind, subject in zip(order, types, subjects)]
+    return pd.DataFrame(
+        {
+            "File path": [f"C:\\Data\\Study\\Sequence\\{name}.raw" for name in file_names],
+            "File name": file_names,
+            "Type": types,
+            "Class ID": rng.integers(1, 4, n_rows),
+            "Batch": (order - 1) // 100 + 1,
+            "Analytical order": order,
+            "Inject. volume (μL)": np.full(n_rows, 1.0),
+            "Included": np.full(n_rows, True),
+        }
+    )
@@ -0,0 +1,158 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+from rcx_tk import batch
+from rcx_tk import msdial
+from rcx_tk.io import read_file
+from rcx_tk.sequence import process_sequence
+from tests.benchmarks import synthetic
+
+pytestmark = pytest.mark.benchmark
+
+MSDIAL_SIZES = [(1_000, 20), (10_000, 100), (30_000, 300)]
+SEQUENCE_SIZES = [1_000, 10_000, 100_000]
+
+
+def _run_python(*args: str) -> None:
+    """Runs a fresh interpreter with the package importable.
+
+    Args:
+        *args (str): Arguments of the interpreter.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run([sys.executable, *args], capture_output=True, env=env, check=True)
+
+
+@pytest.mark.parametrize("n_features, n_samples", MSDIAL_SIZES)
+def test_find_all_duplicates(measure, n_features: int, n_samples: int):
+    """Benchmark the duplicate search over all abundance columns."""
+    alignments = synthetic.msdial_alignments(n_features, n_samples)
+    data_matrix = alignments.iloc[:, len(synthetic.METADATA_COLUMNS) :]
+
+    duplicates = measure(lambda: msdial.find_all_duplicates(data_matrix), n_features=n_features, n_samples=n_samples)
+
+    assert duplicates
+
+
+@pytest.mark.parametrize("rtol", [0.0, 1e-6])
+def test_find_duplicate_groups_tolerance(measure, rtol: float):
+    """Benchmark the duplicate search with a tolerance against exact matching."""
+    alignments = synthetic.msdial_alignments(30_000, 300)
+    values = alignments.iloc[:, len(synthetic.METADATA_COLUMNS) :].to_numpy(dtype=float)
+
+    groups = measure(lambda: msdial.find_duplicate_groups(values, rtol=rtol), rtol=rtol)
+
+    assert groups
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("sparsity", [0.2, 0.9, 0.98])
+def test_label_duplicates_sparse(measure, sparse: bool, sparsity: float):
+    """Benchmark the dense against the sparse duplicate search depending on the fraction of zero abundances."""
+    n_features, n_samples = MSDIAL_SIZES[2]
+    alignments = synthetic.msdial_alignments(n_features, n_samples, sparsity=sparsity)
+
+    labels = measure(lambda: msdial.label_duplicates(alignments, sparse=sparse), sparse=sparse, sparsity=sparsity)
+
+    assert (labels >= 0).any()
+
+
+@pytest.mark.parametrize("n_features, n_samples", MSDIAL_SIZES)
+def test_find_clusters(measure, n_features: int, n_samples: int):
+    """Benchmark the transitive merging of duplicate groups into clusters."""
+    alignments = synthetic.msdial_alignments(n_features, n_samples)
+    duplicates = msdial.find_all_duplicates(alignments.iloc[:, len(synthetic.METADATA_COLUMNS) :])
+
+    clusters = measure(
+        lambda: msdial.find_clusters(duplicates), n_features=n_features, n_samples=n_samples, groups=len(duplicates)
+    )
+
+    assert clusters
+
+
+@pytest.mark.parametrize("duplicate_rate", [0.0, 0.05, 0.2])
+@pytest.mark.parametrize("sparsity", [0.0, 0.5])
+def test_cluster_alignments(measure, duplicate_rate: float, sparsity: float):
+    """Benchmark grouping duplicates and aggregating clusters depending on the duplicate rate and sparsity."""
+    n_features, n_samples = MSDIAL_SIZES[1]
+    alignments = synthetic.msdial_alignments(n_features, n_samples, duplicate_rate, sparsity)
+
+    result = measure(
+        lambda: msdial.cluster_alignments(alignments),
+        n_features=n_features,
+        n_samples=n_samples,
+        duplicate_rate=duplicate_rate,
+        sparsity=sparsity,
+    )
+
+    assert len(result) <= n_features
+
+
+@pytest.mark.parametrize("n_features, n_samples", MSDIAL_SIZES)
+def test_process_msdial(measure, tmp_path: str, n_features: int, n_samples: int):
+    """Benchmark processing a parsed MSDial export."""
+    file_path = os.path.join(tmp_path, "alignment.txt")
+    synthetic.write_msdial_file(file_path, synthetic.msdial_alignments(n_features, n_samples))
+    df = read_file(file_path)
+
+    result = measure(lambda: msdial.process_msdial(df), n_features=n_features, n_samples=n_samples)
+
+    assert len(result) <= n_features + 4
+
+
+@pytest.mark.parametrize("n_features, n_samples", MSDIAL_SIZES)
+def test_process_msdial_file(measure, tmp_path: str, n_features: int, n_samples: int):
+    """Benchmark processing an MSDial export from file to file."""
+    file_path = os.path.join(tmp_path, "alignment.txt")
+    out_path = os.path.join(tmp_path, "processed.tsv")
+    synthetic.write_msdial_file(file_path, synthetic.msdial_alignments(n_features, n_samples))
+
+    measure(
+        lambda: msdial.process_msdial_file(file_path, out_path),
+        n_features=n_features,
+        n_samples=n_samples,
+        file_bytes=os.path.getsize(file_path),
+    )
+
+    assert os.path.exists(out_path)
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_process_files(measure, tmp_path: str, pipelined: bool, monkeypatch):
+    """Benchmark a batch of MSDial exports, processed file by file or in the read, process and write pipeline."""
+    if not pipelined:
+        monkeypatch.setattr(batch, "load_stages", lambda method, options: None)
+    inputs = [os.path.join(tmp_path, f"alignment_{i}.txt") for i in range(8)]
+    alignments = synthetic.msdial_alignments(5000, 50)
+    for file_path in inputs:
+        synthetic.write_msdial_file(file_path, alignments)
+
+    report = measure(
+        lambda: batch.process_files("msdial", inputs, os.path.join(tmp_path, "processed"), jobs=2),
+        pipelined=pipelined,
+        files=len(inputs),
+    )
+
+    assert report["error"].isna().all()
+
+
+@pytest.mark.parametrize("n_rows", SEQUENCE_SIZES)
+def test_process_sequence(measure, n_rows: int):
+    """Benchmark processing a sequence table."""
+    df = synthetic.sequence_table(n_rows)
+
+    result = measure(lambda: process_sequence(df), n_rows=n_rows)
+
+    assert isinstance(result, pd.DataFrame)
+    assert len(result) == n_rows
+
+
+def test_cli_startup(measure):
+    """Benchmark the start-up of the command line interface, which must not pay for importing pandas."""
+    measure(lambda: _run_python("-m", "rcx_tk", "--help"), rounds=5, command="--help")
+    measure(lambda: _run_python("-c", "import pandas"), rounds=5, command="import pandas")
+
+    help_seconds, pandas_seconds = [result["seconds"] for result in measure.results[-2:]]
+    assert help_seconds < pandas_seconds
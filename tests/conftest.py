@@ -3,6 +3,44 @@ import pandas as pd
 import pytest
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Adds the options running the benchmarks in tests/benchmarks.
+
+    Args:
+        parser (pytest.Parser): The command line parser.
+    """
+    parser.addoption("--run-benchmarks", action="store_true", help="Run the benchmarks, skipped by default.")
+    parser.addoption(
+        "--benchmark-json",
+        default=None,
+        help="File the benchmark results are written to. Defaults to .benchmarks/rcx_tk-<version>.json.",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    """Registers the benchmark marker.
+
+    Args:
+        config (pytest.Config): The pytest configuration.
+    """
+    config.addinivalue_line("markers", "benchmark: timing and memory benchmark, run with --run-benchmarks")
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    """Skips the benchmarks unless they are requested.
+
+    Args:
+        config (pytest.Config): The pytest configuration.
+        items (list[pytest.Item]): The collected tests.
+    """
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run only with --run-benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture
 def dataframe() -> pd.DataFrame:
     """Creates a dataframe corresponding to metadata test file.
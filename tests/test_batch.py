@@ -0,0 +1,197 @@
+import os
+import shutil
+from pathlib import Path
+from typing import Final
+import pandas as pd
+import pytest
+from rcx_tk import batch
+from rcx_tk.batch import collect_inputs
+from rcx_tk.batch import load_processor
+from rcx_tk.batch import load_stages
+from rcx_tk.batch import output_path
+from rcx_tk.batch import process_file
+from rcx_tk.batch import process_files
+
+__location__: Final[Path] = Path(__file__).parent.resolve()
+
+
+@pytest.fixture
+def batch_dir(tmp_path: Path) -> Path:
+    """Creates a directory with two valid sequence files and an invalid one.
+
+    Returns:
+        Path: The directory.
+    """
+    test_data = __location__.joinpath("test_data")
+    shutil.copy(test_data.joinpath("batch_specification1.csv"), tmp_path.joinpath("a.csv"))
+    shutil.copy(test_data.joinpath("batch_specification1.txt"), tmp_path.joinpath("b.txt"))
+    shutil.copy(test_data.joinpath("invalid_metadata.txt"), tmp_path.joinpath("c.txt"))
+    shutil.copy(test_data.joinpath("batch_specification1.prn"), tmp_path.joinpath("d.prn"))
+    return tmp_path
+
+
+def test_collect_inputs_from_directory(batch_dir: Path):
+    """Test listing the supported files of a directory."""
+    actual = collect_inputs(str(batch_dir))
+    assert [os.path.basename(path) for path in actual] == ["a.csv", "b.txt", "c.txt"]
+
+
+def test_collect_inputs_from_glob(batch_dir: Path):
+    """Test listing the files matching a glob pattern."""
+    actual = collect_inputs(str(batch_dir.joinpath("*.txt")))
+    assert [os.path.basename(path) for path in actual] == ["b.txt", "c.txt"]
+
+
+def test_collect_inputs_from_manifest(batch_dir: Path):
+    """Test listing the files of a manifest relative to its location, skipping comments and blank lines."""
+    manifest = batch_dir.joinpath("inputs.lst")
+    manifest.write_text("# sequences\nc.txt\n\na.csv\n")
+
+    actual = collect_inputs(str(manifest))
+
+    assert actual == [str(batch_dir.joinpath("c.txt")), str(batch_dir.joinpath("a.csv"))]
+
+
+def test_collect_inputs_error(tmp_path: Path):
+    """Test throwing a value error if no input file is found."""
+    with pytest.raises(ValueError, match=r"No input files found"):
+        collect_inputs(str(tmp_path.joinpath("*.tsv")))
+
+
+@pytest.mark.parametrize(
+    "template, expected",
+    [
+        ["out", os.path.join("out", "sample.tsv")],
+        ["out/{method}_{stem}.tsv", "out/sequence_sample.tsv"],
+        ["{dir}/processed_{name}.tsv", "data/processed_sample.csv.tsv"],
+        ["out/{stem}.tsv.gz", "out/sample.tsv.gz"],
+    ],
+)
+def test_output_path(template: str, expected: str):
+    """Test deriving output paths from a directory or a template."""
+    assert output_path(template, "data/sample.csv", "sequence") == expected
+
+
+def test_output_path_compressed_input():
+    """Test leaving the compression extension out of the stem."""
+    assert output_path("out", "data/sample.txt.gz", "msdial") == os.path.join("out", "sample.tsv")
+
+
+def test_collect_inputs_compressed(tmp_path: Path):
+    """Test listing compressed files of a directory by their format extension."""
+    for name in ["a.txt.gz", "b.csv.zst", "c.gz", "d.md.xz"]:
+        tmp_path.joinpath(name).write_bytes(b"")
+
+    actual = collect_inputs(str(tmp_path))
+
+    assert [os.path.basename(path) for path in actual] == ["a.txt.gz", "b.csv.zst"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_process_files_continues_past_failures(batch_dir: Path, jobs: int):
+    """Test processing every file of a batch and reporting the failing ones."""
+    inputs = collect_inputs(str(batch_dir))
+    out_dir = batch_dir.joinpath("processed")
+
+    report = process_files("sequence", inputs, str(out_dir), jobs=jobs)
+
+    assert report["output"].tolist() == [str(out_dir.joinpath(name)) for name in ["a.tsv", "b.tsv", "c.tsv"]]
+    assert report["error"].isna().tolist() == [True, True, False]
+    assert report["error"].iloc[2].startswith("KeyError")
+    expected = pd.read_csv(out_dir.joinpath("a.tsv"), sep="\t")
+    assert pd.read_csv(out_dir.joinpath("b.tsv"), sep="\t").equals(expected)
+    assert not out_dir.joinpath("c.tsv").exists()
+
+
+def test_process_file_reuses_cached_output(tmp_path: Path, monkeypatch):
+    """Test reusing outputs for unchanged inputs and parameters, ignoring options that do not change the output."""
+    calls = []
+
+    def fake_processor(file_path, out_path, scale=1, workers=1):
+        calls.append((scale, workers))
+        Path(out_path).write_text(Path(file_path).read_text() * scale)
+
+    monkeypatch.setattr(batch, "load_processor", lambda method: fake_processor)
+    file_path = tmp_path.joinpath("input.txt")
+    file_path.write_text("a")
+    out_path = str(tmp_path.joinpath("out", "result.txt"))
+    os.makedirs(os.path.dirname(out_path))
+    cache_dir = str(tmp_path.joinpath("cache"))
+
+    hits = [
+        process_file("fake", str(file_path), out_path, cache_dir),
+        process_file("fake", str(file_path), out_path, cache_dir, workers=4),
+        process_file("fake", str(file_path), out_path, cache_dir, scale=2),
+        process_file("fake", str(file_path), out_path),
+    ]
+
+    assert hits == [False, True, False, False]
+    assert calls == [(1, 1), (2, 1), (1, 1)]
+    assert Path(out_path).read_text() == "a"
+
+    file_path.write_text("bc")
+    assert not process_file("fake", str(file_path), out_path, cache_dir)
+    assert Path(out_path).read_text() == "bc"
+
+
+@pytest.mark.parametrize("method", ["sequence", "alkanes", "msdial"])
+def test_load_processor(method: str):
+    """Test resolving the processing function of every method."""
+    assert load_processor(method).__name__ == batch.PROCESSORS[method].split(":")[1]
+
+
+def test_load_stages():
+    """Test binding options to the stages accepting them and falling back for options no stage accepts."""
+    read, process, write = load_stages("msdial", {"cache_dir": "cache", "groups_path": None, "chunk_size": None})
+    assert read.keywords == {"cache_dir": "cache"}
+    assert process.keywords == {"groups_path": None}
+
+    assert load_stages("sequence", {"cache_dir": "cache", "cache_size": 1}) is not None
+    assert load_stages("sequence", {"sheets": "*"}) is None
+    assert load_stages("msdial", {"chunk_size": 100}) is None
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_process_files_in_pipeline(tmp_path: Path, jobs: int):
+    """Test that the pipeline writes the outputs of `process_file` and shares its cache entries."""
+    file_path = __location__.joinpath("test_data", "msdial_alignment.txt")
+    inputs = []
+    for name in ["a", "b", "c"]:
+        inputs.append(str(tmp_path.joinpath(f"{name}.txt")))
+        shutil.copy(file_path, inputs[-1])
+    os.makedirs(tmp_path.joinpath("single"))
+    expected = str(tmp_path.joinpath("single", "a.tsv"))
+    cache_dir = str(tmp_path.joinpath("cache"))
+    process_file("msdial", inputs[0], expected, cache_dir)
+
+    out_dir = tmp_path.joinpath("processed")
+    report = process_files("msdial", inputs, str(out_dir), jobs=jobs, cache_dir=cache_dir, chunk_size=None)
+
+    assert report["error"].isna().all()
+    for name in ["a", "b", "c"]:
+        assert out_dir.joinpath(f"{name}.tsv").read_text() == Path(expected).read_text()
+    assert os.path.samefile(out_dir.joinpath("a.tsv"), expected)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_process_files_groups_path_per_file(tmp_path: Path, jobs: int):
+    """Test giving every file of a batch its own groups file from a template."""
+    file_path = __location__.joinpath("test_data", "msdial_alignment.txt")
+    inputs = []
+    for name in ["a", "b"]:
+        inputs.append(str(tmp_path.joinpath(f"{name}.txt")))
+        shutil.copy(file_path, inputs[-1])
+    groups_template = str(tmp_path.joinpath("groups", "{stem}.npz"))
+
+    report = process_files("msdial", inputs, str(tmp_path.joinpath("out")), jobs=jobs, groups_path=groups_template)
+
+    assert report["error"].isna().all()
+    assert sorted(os.listdir(tmp_path.joinpath("groups"))) == ["a.npz", "b.npz"]
+
+
+def test_process_files_shared_groups_path(tmp_path: Path):
+    """Test rejecting a groups file that several files of a batch would overwrite."""
+    inputs = [str(tmp_path.joinpath("a.txt")), str(tmp_path.joinpath("b.txt"))]
+
+    with pytest.raises(ValueError, match=r"its own groups file"):
+        process_files("msdial", inputs, str(tmp_path), groups_path=str(tmp_path.joinpath("groups.npz")))
@@ -0,0 +1,80 @@
+import os
+import time
+from rcx_tk import cache
+
+
+def _write_bytes(size: int):
+    def write(directory: str) -> None:
+        with open(os.path.join(directory, "payload.bin"), "wb") as file:
+            file.write(b"x" * size)
+
+    return write
+
+
+def test_input_digest_rehashes_only_changed_files(tmp_path, monkeypatch):
+    """Reuse the remembered digest while size and mtime are unchanged."""
+    file_path = tmp_path / "input.txt"
+    file_path.write_text("first")
+    cache_dir = str(tmp_path / "cache")
+
+    first = cache.input_digest(cache_dir, str(file_path))
+    monkeypatch.setattr(cache, "file_digest", lambda path: "not hashed again")
+    assert cache.input_digest(cache_dir, str(file_path)) == first
+
+    file_path.write_text("second, longer")
+    assert cache.input_digest(cache_dir, str(file_path)) == "not hashed again"
+
+
+def test_lookup_returns_stored_entry(tmp_path):
+    """Find stored entries by key and miss unknown keys."""
+    cache_dir = str(tmp_path)
+    key = cache.cache_key("method", 1, "digest")
+
+    entry = cache.store(cache_dir, key, _write_bytes(10))
+
+    assert cache.lookup(cache_dir, key) == entry
+    assert os.path.getsize(os.path.join(entry, "payload.bin")) == 10
+    assert cache.lookup(cache_dir, cache.cache_key("method", 2, "digest")) is None
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    """Remove the least recently used entries once the size cap is exceeded."""
+    cache_dir = str(tmp_path)
+    cache.store(cache_dir, "a", _write_bytes(100), max_bytes=250)
+    time.sleep(0.01)
+    cache.store(cache_dir, "b", _write_bytes(100), max_bytes=250)
+    time.sleep(0.01)
+    cache.lookup(cache_dir, "a")
+    time.sleep(0.01)
+
+    cache.store(cache_dir, "c", _write_bytes(100), max_bytes=250)
+
+    assert cache.lookup(cache_dir, "a") is not None
+    assert cache.lookup(cache_dir, "b") is None
+    assert cache.lookup(cache_dir, "c") is not None
+
+
+def test_reuse_or_store_links_cached_output(tmp_path):
+    """Compute the output on a miss and place the cached file on a hit, without sharing it with later writes."""
+    cache_dir = str(tmp_path / "cache")
+    out_path = str(tmp_path / "out.tsv")
+    calls = []
+
+    def produce(path: str) -> None:
+        calls.append(path)
+        with open(path, "w") as file:
+            file.write("result")
+
+    assert not cache.reuse_or_store(cache_dir, "key", out_path, produce)
+    os.remove(out_path)
+    assert cache.reuse_or_store(cache_dir, "key", out_path, produce)
+
+    assert len(calls) == 1
+    with open(out_path) as file:
+        assert file.read() == "result"
+
+    cache.unshare(out_path)
+    with open(out_path, "w") as file:
+        file.write("overwritten")
+    with open(os.path.join(cache.lookup(cache_dir, "key"), "out.tsv")) as file:
+        assert file.read() == "result"
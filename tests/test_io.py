@@ -1,9 +1,14 @@
 import os
 from pathlib import Path
 from typing import Final
+import numpy as np
 import pandas as pd
 import pytest
+from rcx_tk import io
+from rcx_tk.io import read_excel_sheets
 from rcx_tk.io import read_file
+from rcx_tk.io import read_msdial
+from rcx_tk.io import save_dataframe
 from rcx_tk.io import save_dataframe_as_tsv
 
 __location__: Final[Path] = Path(__file__).parent.resolve()
@@ -40,7 +45,7 @@ def test_read_file_error(dataframe: pd.DataFrame):
     file_path = os.path.join("tests", "test_data", "batch_specification1.prn")
     with pytest.raises(
         ValueError,
-        match=r"Unsupported file format. Please provide a CSV, Excel, or TSV file.",
+        match=r"Unsupported file format. Please provide a CSV, Excel, TSV, Parquet or Feather file.",
     ):
         read_file(file_path)
 
@@ -69,3 +74,219 @@ def test_read_save_dataframe_as_tsv_error(dataframe: pd.DataFrame, tmp_path: str
     out_path = os.path.join(tmp_path, "batch_specification1.prn")
     with pytest.raises(ValueError, match=r"Unsupported file format. Please point to a TSV file."):
         save_dataframe_as_tsv(dataframe, out_path)
+
+
+@pytest.mark.parametrize(
+    "file_name",
+    [
+        "batch_specification1.csv",
+        "batch_specification1.xlsx",
+        "batch_specification1.txt",
+    ],
+)
+def test_read_file_columns(file_name: str, dataframe: pd.DataFrame):
+    """Test parsing only the projected columns, with the requested dtypes.
+
+    Args:
+        file_name (str): The path to the input data.
+        dataframe (pd.DataFrame): Dataframe containing the metadata.
+    """
+    file_path = __location__.joinpath("test_data", file_name)
+    columns = ["File name", "Batch", "Analytical order"]
+
+    actual = read_file(str(file_path), columns=columns, dtype={"Batch": "float64"})
+
+    expected = dataframe[columns].astype({"Batch": "float64"})
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_read_file_columns_ignore_whitespace():
+    """Test matching projected columns whose names carry surrounding whitespace in the file."""
+    file_path = __location__.joinpath("test_data", "Alkane_RI_ATHLETE_1.txt")
+
+    actual = read_file(str(file_path), columns=["Carbon number"])
+
+    assert [column.strip() for column in actual.columns] == ["Carbon number"]
+
+
+@pytest.mark.parametrize(
+    "file_name, reader", [("metadata.parquet", "read_parquet"), ("metadata.feather", "read_feather")]
+)
+def test_read_file_columns_columnar(file_name: str, reader: str, dataframe: pd.DataFrame, tmp_path: str, monkeypatch):
+    """Test passing the projected columns, matched ignoring whitespace, down to the Parquet and Feather readers."""
+    pytest.importorskip("pyarrow")
+    file_path = os.path.join(tmp_path, file_name)
+    save_dataframe(dataframe.rename(columns={"Batch": " Batch "}), file_path)
+    requested = []
+    read = getattr(pd, reader)
+
+    def recording_read(path, columns=None):
+        requested.append(columns)
+        return read(path, columns=columns)
+
+    monkeypatch.setattr(pd, reader, recording_read)
+
+    actual = read_file(file_path, columns=["File name", "Batch"], dtype={" Batch ": "float64"})
+
+    assert requested == [["File name", " Batch "]]
+    expected = dataframe[["File name", "Batch"]].astype({"Batch": "float64"}).rename(columns={"Batch": " Batch "})
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize("engine", ["calamine", None])
+def test_read_file_excel_engines(engine: str | None, dataframe: pd.DataFrame, monkeypatch):
+    """Test that the fast Excel engine and the pandas default read the same dataframe.
+
+    Args:
+        engine (str | None): The Excel engine, None for the pandas default.
+        dataframe (pd.DataFrame): Dataframe containing the metadata.
+        monkeypatch: Fixture selecting the engine.
+    """
+    if engine is not None:
+        pytest.importorskip("python_calamine")
+    monkeypatch.setattr(io, "EXCEL_ENGINE", engine)
+    file_path = __location__.joinpath("test_data", "batch_specification1.xlsx")
+
+    actual = read_file(str(file_path))
+
+    pd.testing.assert_frame_equal(actual, dataframe)
+
+
+def test_read_excel_sheets(dataframe: pd.DataFrame, tmp_path: str):
+    """Test reading all or selected sheets of a workbook.
+
+    Args:
+        dataframe (pd.DataFrame): Dataframe containing the metadata.
+        tmp_path (str): A path where the workbook will be exported.
+    """
+    file_path = os.path.join(tmp_path, "batches.xlsx")
+    with pd.ExcelWriter(file_path) as writer:
+        dataframe.to_excel(writer, sheet_name="first", index=False)
+        dataframe.iloc[:2].to_excel(writer, sheet_name="second", index=False)
+
+    every = read_excel_sheets(file_path)
+    selected = read_excel_sheets(file_path, ["second"], columns=["File name"])
+
+    assert list(every) == ["first", "second"]
+    pd.testing.assert_frame_equal(every["first"], dataframe)
+    pd.testing.assert_frame_equal(every["second"], dataframe.iloc[:2])
+    assert list(selected) == ["second"]
+    pd.testing.assert_frame_equal(selected["second"], dataframe.iloc[:2][["File name"]])
+
+
+@pytest.mark.parametrize("file_name", ["batch_specification1.parquet", "batch_specification1.feather"])
+def test_save_and_read_columnar(file_name: str, dataframe: pd.DataFrame, tmp_path: str):
+    """Test writing and reading back columnar formats selected by extension.
+
+    Args:
+        file_name (str): Name of the exported file.
+        dataframe (pd.DataFrame): The metadata dataframe.
+        tmp_path (str): A path where the file will be exported.
+    """
+    pytest.importorskip("pyarrow")
+    out_path = os.path.join(tmp_path, file_name)
+
+    save_dataframe(dataframe, out_path)
+    actual = read_file(out_path)
+
+    pd.testing.assert_frame_equal(actual, dataframe)
+
+
+def test_save_dataframe_columnar_index_and_mixed_types(tmp_path: str):
+    """Test keeping the index and storing columns of mixed types as text in Parquet files."""
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"flag": [True, "1,2"], 3: [1.0, 2.0]}, index=pd.Index(["a", "b"], name="id"))
+    out_path = os.path.join(tmp_path, "mixed.parquet")
+
+    save_dataframe(df, out_path, index=True)
+    actual = read_file(out_path)
+
+    assert actual.index.tolist() == ["a", "b"]
+    assert actual.columns.tolist() == ["flag", "3"]
+    assert actual["flag"].tolist() == ["True", "1,2"]
+
+
+def test_save_dataframe_error(dataframe: pd.DataFrame, tmp_path: str):
+    """Test throwing a value error if no writer is registered for the extension."""
+    out_path = os.path.join(tmp_path, "batch_specification1.prn")
+    with pytest.raises(ValueError, match=r"Please point to a TSV, Parquet or Feather file."):
+        save_dataframe(dataframe, out_path)
+
+
+@pytest.mark.parametrize("compression", [".gz", ".bz2", ".xz", ".zst"])
+def test_save_and_read_compressed(compression: str, dataframe: pd.DataFrame, tmp_path: str):
+    """Test writing and reading back TSV files compressed by their extension.
+
+    Args:
+        compression (str): Compression extension of the exported file.
+        dataframe (pd.DataFrame): The metadata dataframe.
+        tmp_path (str): A path where the file will be exported.
+    """
+    if compression == ".zst":
+        pytest.importorskip("zstandard")
+    out_path = os.path.join(tmp_path, f"batch_specification1.tsv{compression}")
+
+    save_dataframe(dataframe.iloc[:2], out_path)
+    save_dataframe_as_tsv(dataframe.iloc[2:], out_path, header=False, mode="a")
+    actual = read_file(out_path)
+
+    with open(out_path, "rb") as file:
+        assert not file.read().startswith(b"File name")
+    pd.testing.assert_frame_equal(actual, dataframe)
+
+
+@pytest.mark.parametrize(
+    "file_path, expected",
+    [
+        ["alignment.txt.gz", ("alignment", ".txt", "gzip")],
+        ["data/Batch.CSV.ZST", ("data/Batch", ".csv", "zstd")],
+        ["alignment.txt", ("alignment", ".txt", None)],
+        ["archive.gz", ("archive", "", "gzip")],
+    ],
+)
+def test_split_extension(file_path: str, expected: tuple[str, str, str | None]):
+    """Test splitting format and compression extensions."""
+    assert io.split_extension(file_path) == expected
+
+
+def test_compressed_format_error(dataframe: pd.DataFrame, tmp_path: str):
+    """Test throwing a value error for compressed files other than CSV or TSV."""
+    with pytest.raises(ValueError, match=r"Please provide a compressed CSV or TSV file."):
+        read_file(os.path.join(tmp_path, "batch_specification1.xlsx.gz"))
+    with pytest.raises(ValueError, match=r"Please point to a compressed TSV file."):
+        save_dataframe(dataframe, os.path.join(tmp_path, "batch_specification1.parquet.gz"))
+
+
+def test_read_msdial():
+    """Test parsing the MSDial header block separately from typed alignments."""
+    file_path = __location__.joinpath("test_data", "msdial_alignment.txt")
+
+    header, alignments = read_msdial(str(file_path))
+
+    assert header.index.tolist()[-1] == "Alignment ID"
+    assert header.iloc[:4, 27].tolist() == ["Class", "File type", "Injection order", "Batch ID"]
+    assert header.iloc[-1].tolist() == list(alignments.columns)
+    assert alignments.index.name == "Alignment ID"
+    assert alignments.shape == (12, 34)
+    assert alignments["Average Rt(min)"].dtype == "float64"
+    assert alignments["Quant mass"].dtype == "int64"
+    assert (alignments.dtypes.iloc[28:] == "float64").all()
+
+
+def test_read_msdial_cached(tmp_path: str):
+    """Test reloading a cached MSDial parse with a memory-mapped abundance matrix."""
+    file_path = str(__location__.joinpath("test_data", "msdial_alignment.txt"))
+    cache_dir = os.path.join(tmp_path, "cache")
+
+    expected_header, expected = read_msdial(file_path)
+    read_msdial(file_path, cache_dir=cache_dir)
+    header, actual = read_msdial(file_path, cache_dir=cache_dir)
+
+    pd.testing.assert_frame_equal(header, expected_header)
+    pd.testing.assert_frame_equal(actual, expected)
+    cached = [name for _, _, names in os.walk(cache_dir) for name in names]
+    assert not [name for name in cached if name.endswith(".pkl")]
+    base = actual.iloc[:, 28:].to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+import pytest
+
+_MODULES = ["pandas", "numpy", "rcx_tk.alkanes", "rcx_tk.sequence", "rcx_tk.msdial"]
+
+
+def _imported_modules(code: str) -> list[str]:
+    """Runs code in a fresh interpreter and lists which of the heavy modules it imported.
+
+    Args:
+        code (str): The code to run.
+
+    Returns:
+        list[str]: The heavy modules found in `sys.modules` afterwards.
+    """
+    script = f"import sys\n{code}\nprint(' '.join(m for m in {_MODULES!r} if m in sys.modules))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, check=True)
+    return result.stdout.split()
+
+
+def test_cli_import_is_light():
+    """Importing the command line interface, e.g. for --help, loads neither pandas nor a processing module."""
+    assert _imported_modules("import rcx_tk.__main__") == []
+
+
+@pytest.mark.parametrize(
+    "method, file_name, expected",
+    [
+        ["alkanes", "Alkane_RI_ATHLETE_1.txt", ["pandas", "numpy", "rcx_tk.alkanes"]],
+        ["sequence", "batch_specification1.csv", ["pandas", "numpy", "rcx_tk.sequence"]],
+    ],
+)
+def test_cli_imports_only_chosen_method(method: str, file_name: str, expected: list[str], tmp_path: str):
+    """Processing a file loads only the module of the chosen method."""
+    file_path = os.path.join("tests", "test_data", file_name)
+    out_path = os.path.join(tmp_path, "out.tsv")
+    code = (
+        "from rcx_tk.__main__ import main\n"
+        f"main(['--method', {method!r}, {file_path!r}, {out_path!r}], standalone_mode=False)"
+    )
+
+    assert _imported_modules(code) == expected
+    assert os.path.exists(out_path)
+
+
+@pytest.mark.parametrize("args", [["--help"], []])
+def test_cli_help_lists_commands(args: list[str]):
+    """The help of the command group lists both commands, while options without a command run `process`."""
+    from click.testing import CliRunner
+    from rcx_tk.__main__ import main
+
+    runner = CliRunner()
+    result = runner.invoke(main, args)
+    assert "process" in result.output
+    assert "watch" in result.output
+
+    result = runner.invoke(main, ["--method", "alkanes", "--help"])
+    assert result.exit_code == 0
+    assert "FILE_PATH OUT_PATH" in result.output
+
+
+@pytest.mark.parametrize("out_name", ["out.parquet", "{stem}.feather"])
+def test_cli_chunk_size_requires_tsv_output(out_name: str, tmp_path: str):
+    """Streaming msdial files in chunks rejects columnar outputs before processing anything."""
+    from click.testing import CliRunner
+    from rcx_tk.__main__ import main
+
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    args = ["--method", "msdial", "--chunk-size", "4", file_path, os.path.join(tmp_path, out_name)]
+    if "{" in out_name:
+        args.insert(0, "--batch")
+
+    result = CliRunner().invoke(main, args)
+
+    assert result.exit_code == 2
+    assert "TSV output only" in result.output
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_cli_sparse_rejects_groups_file(batch: bool, tmp_path: str):
+    """Searching sparse abundances rejects persisting duplicate groups before processing anything."""
+    from click.testing import CliRunner
+    from rcx_tk.__main__ import main
+
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    groups_path = os.path.join(tmp_path, "groups.npz")
+    args = ["--method", "msdial", "--sparse", "--groups-file", groups_path, file_path, str(tmp_path)]
+    if batch:
+        args.insert(0, "--batch")
+
+    result = CliRunner().invoke(main, args)
+
+    assert result.exit_code == 2
+    assert "--sparse cannot be combined with --groups-file" in result.output
+    assert os.listdir(tmp_path) == []
@@ -1,3 +1,6 @@
+import gzip
+import os
+import tracemalloc
 import numpy as np
 import pandas as pd
 import pytest
@@ -49,12 +52,253 @@ def test_find_all_duplicates():
     assert _index_groups_as_sets(actual) == {frozenset(["a", "b"]), frozenset(["b", "c"])}
 
 
+def _reference_find_all_duplicates(data_matrix):
+    """Column-by-column duplicate search the vectorized engine has to reproduce."""
+    all_duplicates = []
+    for col_idx in range(len(data_matrix.columns)):
+        col = data_matrix.iloc[:, col_idx].astype(float)
+        col = col.loc[col > 0]
+        groups = col.drop(col.drop_duplicates(keep=False).index).groupby(col)
+        all_duplicates.extend(g.index for _, g in groups)
+    return all_duplicates
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_find_all_duplicates_matches_reference(seed):
+    """Return exactly the groups of the column-by-column implementation, in the same order."""
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, 15, size=(200, 12)).astype(float)
+    values[rng.random(values.shape) < 0.3] = 0.0
+    values[rng.random(values.shape) < 0.05] = np.nan
+    data_matrix = pd.DataFrame(values, index=[f"id{i}" for i in range(200)]).astype(str)
+
+    actual = msdial.find_all_duplicates(data_matrix)
+    expected = _reference_find_all_duplicates(data_matrix)
+
+    assert [idx.tolist() for idx in actual] == [idx.tolist() for idx in expected]
+
+
+def test_find_duplicate_groups_in_parallel_matches_serial():
+    """Scanning blocks of columns in worker processes returns the serial result."""
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, size=(300, 7)).astype(float)
+
+    actual = msdial.find_duplicate_groups(values, workers=3)
+    expected = msdial.find_duplicate_groups(values)
+
+    assert [group.tolist() for group in actual] == [group.tolist() for group in expected]
+
+
+def test_find_duplicate_groups_ignores_column_boundaries():
+    """Equal values in neighbouring columns must not form a group."""
+    values = np.array([[1.0, 2.0], [2.0, 3.0]])
+    assert msdial.find_duplicate_groups(values) == []
+
+
+def test_find_duplicate_groups_incrementally_scans_only_new_columns(tmp_path: str, monkeypatch):
+    """Reuse persisted groups of unchanged columns and scan only appended or changed ones."""
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, size=(100, 6)).astype(float)
+    row_ids = pd.Index(range(100), name="Alignment ID")
+    groups_path = os.path.join(tmp_path, "groups.npz")
+    scanned_shapes = []
+    scan = msdial.find_column_duplicate_groups
+
+    def recording_scan(matrix, workers=1, rtol=0.0, atol=0.0, retention_times=None, rt_window=None):
+        scanned_shapes.append(matrix.shape)
+        return scan(matrix, workers, rtol, atol, retention_times, rt_window)
+
+    monkeypatch.setattr(msdial, "find_column_duplicate_groups", recording_scan)
+
+    msdial.find_duplicate_groups_incrementally(values[:, :4], row_ids, groups_path)
+    grown = values.copy()
+    grown[0, 1] = 100.0
+    actual = msdial.find_duplicate_groups_incrementally(grown, row_ids, groups_path)
+    expected = scan(grown)
+
+    assert scanned_shapes == [(100, 4), (100, 3)]
+    assert [group.tolist() for group in actual] == [group.tolist() for column in expected for group in column]
+
+
+@pytest.mark.parametrize(
+    "rtol, atol, expected",
+    [
+        [0.0, 0.0, [[0, 4]]],
+        [1e-6, 0.0, [[0, 4, 1]]],
+        [0.0, 0.15, [[0, 4, 1], [5, 2]]],
+        [0.0, 0.25, [[0, 4, 1], [5, 2, 3]]],
+    ],
+)
+def test_find_duplicate_groups_tolerance(rtol: float, atol: float, expected: list[list[int]]):
+    """Group values within a tolerance of their neighbours in sort order, chaining steps within it."""
+    values = np.array([[1.0], [1.0000001], [5.0], [5.2], [1.0], [4.9], [0.0], [0.1]])
+
+    actual = msdial.find_duplicate_groups(values, rtol=rtol, atol=atol)
+
+    assert [group.tolist() for group in actual] == expected
+
+
+def test_find_duplicate_groups_tolerance_in_parallel():
+    """Scan with a tolerance in worker processes like in a single process."""
+    rng = np.random.default_rng(0)
+    values = rng.integers(1, 1000, size=(200, 6)) + rng.normal(0, 1e-9, size=(200, 6))
+
+    actual = msdial.find_duplicate_groups(values, workers=2, rtol=1e-9)
+    expected = msdial.find_duplicate_groups(values, rtol=1e-9)
+
+    assert len(actual) > len(msdial.find_duplicate_groups(values))
+    assert [group.tolist() for group in actual] == [group.tolist() for group in expected]
+
+
+@pytest.mark.parametrize("rtol, atol", [[0.0, 0.0], [0.0, 1.0], [1e-2, 0.0]])
+def test_find_sparse_duplicate_groups_matches_dense(rtol: float, atol: float):
+    """Scanning the stored entries of a sparse matrix finds the groups of the dense scan, in the same order."""
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 40, size=(300, 8)).astype(float)
+    values[rng.random(values.shape) < 0.7] = 0.0
+    values[:, 3] = 0.0
+    alignments = pd.DataFrame(values)
+
+    matrix = msdial._sparse_abundance_matrix(alignments, metadata_cols=0)
+    actual = msdial.find_sparse_duplicate_groups(matrix, rtol=rtol, atol=atol)
+    in_parallel = msdial.find_sparse_duplicate_groups(matrix, workers=3, rtol=rtol, atol=atol)
+    expected = msdial.find_duplicate_groups(values, rtol=rtol, atol=atol)
+
+    assert len(matrix.data) == np.count_nonzero(values)
+    assert [group.tolist() for group in actual] == [group.tolist() for group in expected]
+    assert [group.tolist() for group in in_parallel] == [group.tolist() for group in expected]
+
+
+def test_aggregate_sparse_maxima():
+    """Take the maximum of every cluster in every sample from the stored entries, counting missing ones as 0."""
+    values = np.array([[0.0, 2.0], [3.0, 0.0], [5.0, 0.0], [1.0, 0.0]])
+    matrix = msdial._sparse_abundance_matrix(pd.DataFrame(values), metadata_cols=0)
+
+    actual = msdial.aggregate_sparse_maxima(matrix, np.array([0, 0, -1, 1]))
+
+    assert actual.tolist() == [[3.0, 2.0], [1.0, 0.0]]
+
+
+def test_label_duplicates_sparse_groups_path(tmp_path: str):
+    """Reject persisting the groups of sparse abundances."""
+    alignments = pd.DataFrame({"M1": [1.0, 2.0], 101: [5.0, 5.0]})
+
+    with pytest.raises(ValueError, match="sparse"):
+        msdial.label_duplicates(alignments, 1, groups_path=os.path.join(tmp_path, "groups.npz"), sparse=True)
+
+
+def test_find_duplicate_groups_negative_tolerance():
+    """Reject negative tolerances."""
+    with pytest.raises(ValueError, match="negative"):
+        msdial.find_duplicate_groups(np.ones((2, 1)), atol=-1.0)
+
+
+def test_find_duplicate_groups_incrementally_rescans_other_tolerance(tmp_path: str):
+    """Persisted groups are not reused for another tolerance."""
+    values = np.array([[1.0], [1.05], [2.0]])
+    groups_path = os.path.join(tmp_path, "groups.npz")
+    row_ids = pd.Index([1, 2, 3])
+
+    exact = msdial.find_duplicate_groups_incrementally(values, row_ids, groups_path)
+    tolerant = msdial.find_duplicate_groups_incrementally(values, row_ids, groups_path, atol=0.1)
+
+    assert exact == []
+    assert [group.tolist() for group in tolerant] == [[0, 1]]
+
+
+def test_find_duplicate_groups_incrementally_rescans_changed_rows(tmp_path: str):
+    """Persisted groups are not reused once the rows they refer to changed."""
+    values = np.array([[1.0], [1.0], [2.0]])
+    groups_path = os.path.join(tmp_path, "groups.npz")
+
+    msdial.find_duplicate_groups_incrementally(values, pd.Index([1, 2, 3]), groups_path)
+    actual = msdial.find_duplicate_groups_incrementally(values[::-1], pd.Index([3, 2, 1]), groups_path)
+
+    assert [group.tolist() for group in actual] == [[1, 2]]
+
+
+def test_split_groups_by_retention_time():
+    """Keep only members of a group eluting within the window of each other, chaining like tolerance runs."""
+    groups = [np.array([0, 1, 2]), np.array([3, 4]), np.array([5, 6, 7])]
+    retention_times = np.array([1.0, 5.0, 1.02, 2.0, 2.1, 3.0, 3.04, 3.08])
+
+    actual = msdial.split_groups_by_retention_time(groups, retention_times, rt_window=0.05)
+
+    assert [group.tolist() for group in actual] == [[0, 2], [5, 6, 7]]
+
+
+@pytest.mark.parametrize("rtol, atol", [(0.0, 0.0), (1e-3, 0.0), (0.0, 0.5)])
+def test_find_duplicate_groups_rt_window(rtol: float, atol: float):
+    """Search within the window the groups that splitting the groups of all retention times would give."""
+    rng = np.random.default_rng(4)
+    values = rng.integers(0, 15, size=(200, 6)).astype(float) * rng.choice([1.0, 1.0001], size=(200, 6))
+    retention_times = np.round(rng.uniform(0, 5, 200), 1)
+    retention_times[::17] = np.nan
+    all_groups = msdial.find_duplicate_groups(values, rtol=rtol, atol=atol)
+    expected = [group.tolist() for group in msdial.split_groups_by_retention_time(all_groups, retention_times, 0.2)]
+    sparse = msdial._sparse_abundance_matrix(pd.DataFrame(values), metadata_cols=0)
+
+    for actual in [
+        msdial.find_duplicate_groups(values, 1, rtol, atol, retention_times, 0.2),
+        msdial.find_duplicate_groups(values, 2, rtol, atol, retention_times, 0.2),
+        msdial.find_sparse_duplicate_groups(sparse, 1, rtol, atol, retention_times, 0.2),
+        msdial.find_sparse_duplicate_groups(sparse, 3, rtol, atol, retention_times, 0.2),
+    ]:
+        assert [group.tolist() for group in actual] == expected
+
+
+def test_split_groups_by_retention_time_missing():
+    """Never group rows without a retention time."""
+    groups = [np.array([0, 1, 2])]
+    retention_times = np.array([1.0, np.nan, 1.0])
+
+    actual = msdial.split_groups_by_retention_time(groups, retention_times, rt_window=0.1)
+
+    assert [group.tolist() for group in actual] == [[0, 2]]
+
+
 def test_find_clusters_transitive_merge(all_duplicates):
     """Merge overlapping duplicate index groups transitively into clusters."""
     actual = msdial.find_clusters(all_duplicates)
     assert _index_groups_as_sets(actual) == {frozenset([1, 2, 3]), frozenset([9])}
 
 
+def test_find_clusters_merges_groups_bridging_existing_clusters():
+    """A group overlapping two earlier clusters joins them into one."""
+    all_duplicates = [pd.Index([1, 2]), pd.Index([3, 4]), pd.Index([2, 3]), pd.Index([7, 8])]
+
+    actual = msdial.find_clusters(all_duplicates)
+
+    assert _index_groups_as_sets(actual) == {frozenset([1, 2, 3, 4]), frozenset([7, 8])}
+
+
+def test_find_cluster_labels():
+    """Label rows by connected duplicate groups, numbered by first member and -1 for unclustered rows."""
+    groups = [np.array([4, 5]), np.array([0, 2]), np.array([2, 6]), np.array([5, 7])]
+
+    actual = msdial.find_cluster_labels(9, groups)
+
+    assert actual.tolist() == [0, -1, 0, -1, 1, 1, 0, 1, -1]
+
+
+def test_aggregate_clusters_on_text_columns():
+    """Aggregate text-typed clusters numerically for mean and max and by concatenation otherwise."""
+    alignments = pd.DataFrame(
+        {"RT": ["1.0", "2.0", "5.0", "3.0"], "Name": ["a", "b", "c", "d"], "S1": ["9", "10", "4", "9"]},
+        index=pd.Index(["10", "11", "12", "13"], name="Alignment ID"),
+    )
+    labels = np.array([0, 1, -1, 0])
+    aggregate_functions = msdial.aggregations(["RT"], ["Name"], ["S1"])
+
+    actual = msdial.aggregate_clusters(alignments, labels, aggregate_functions)
+
+    assert actual.index.tolist() == ["10,13", "11"]
+    assert actual.columns.tolist() == ["RT", "Name", "S1"]
+    assert actual["RT"].tolist() == [2.0, 2.0]
+    assert actual["Name"].tolist() == ["a,d", "b"]
+    assert actual["S1"].tolist() == [9.0, 10.0]
+
+
 def test_get_index_unions_all_duplicate_groups(all_duplicates):
     """Return a union index containing all duplicate-group members."""
     actual = msdial.union(all_duplicates)
@@ -84,35 +328,249 @@ def test_process_msdial_merges_duplicate_alignments():
     assert actual.loc["1,2", 102] == 7.0
 
 
+def test_process_msdial_tolerance():
+    """Merge alignments whose abundances differ by rounding only with a tolerance."""
+    raw = pd.DataFrame(
+        [
+            ["Alignment ID", "M1", 101, 102],
+            [1, 10.0, 5.000001, 1.0],
+            [2, 30.0, 5.0, 2.0],
+            [3, 50.0, 7.0, 3.0],
+        ]
+    )
+
+    exact = msdial.process_msdial(raw, skip_rows=0, metadata_cols=1)
+    tolerant = msdial.process_msdial(raw, skip_rows=0, metadata_cols=1, rtol=1e-6)
+
+    assert exact.index.tolist() == ["Alignment ID", 1, 2, 3]
+    assert tolerant.index.tolist() == ["Alignment ID", 3, "1,2"]
+
+
+def test_process_msdial_rt_window():
+    """Do not merge alignments sharing abundances that elute far apart."""
+    raw = pd.DataFrame(
+        [
+            ["Alignment ID", "Average Rt(min)", 101, 102],
+            [1, 5.0, 5.0, 1.0],
+            [2, 5.01, 5.0, 2.0],
+            [3, 9.0, 5.0, 3.0],
+        ]
+    )
+
+    actual = msdial.process_msdial(raw, skip_rows=0, metadata_cols=1, rt_window=0.1)
+
+    assert actual.index.tolist() == ["Alignment ID", 3, "1,2"]
+
+
+def test_process_msdial_rt_window_needs_retention_times():
+    """Reject a retention time window for tables without retention times."""
+    raw = pd.DataFrame([["Alignment ID", "M1", 101], [1, 10.0, 5.0]])
+
+    with pytest.raises(ValueError, match="Average Rt"):
+        msdial.process_msdial(raw, skip_rows=0, metadata_cols=1, rt_window=0.1)
+
+
+def test_process_msdial_memory():
+    """Leave the input unchanged and peak at no more than twice the size of the abundance matrix."""
+    rng = np.random.default_rng(0)
+    n_rows, n_samples = 5000, 100
+    abundances = rng.integers(1, 10**12, (n_rows, n_samples)).astype(float)
+    abundances[::50] = abundances[1::50]
+    body = np.column_stack([np.arange(n_rows), rng.random((n_rows, 3)), abundances]).astype(object)
+    header = np.array([["Alignment ID", "M1", "M2", "M3", *range(n_samples)]], dtype=object)
+    raw = pd.DataFrame(np.vstack([header, body]))
+    expected = raw.copy()
+
+    tracemalloc.start()
+    try:
+        actual = msdial.process_msdial(raw, skip_rows=0, metadata_cols=3)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert raw.equals(expected)
+    assert len(actual) == 1 + n_rows - n_rows // 50
+    assert peak <= 2 * abundances.nbytes
+
+
 def test_process_msdial_file_calls_io_helpers(monkeypatch):
-    """Read input, process DataFrame, and write TSV with expected options."""
-    input_df = pd.DataFrame({"x": [1]})
-    processed_df = pd.DataFrame({"y": [2]})
-    observed = {}
+    """Read header and alignments, label duplicates, and write header, unique rows and clusters as TSV."""
+    header_df = pd.DataFrame({"x": ["Class"]})
+    alignments_df = pd.DataFrame({"x": [1.0, 2.0, 3.0]}, index=pd.Index([1, 2, 3], name="Alignment ID"))
+    summary_df = pd.DataFrame({"x": [2.0]}, index=pd.Index(["1,3"], name="Alignment ID"))
+    observed = {"saved": []}
 
-    def fake_read_file(file_path):
+    def fake_read_msdial(file_path, skip_rows, metadata_cols, index_col, cache_dir, cache_size):
         observed["read_path"] = file_path
-        return input_df
+        return header_df, alignments_df
+
+    def fake_label_duplicates(df, metadata_cols, workers, groups_path, rtol, atol, rt_window, sparse):
+        observed["labelled_input"] = df
+        return np.array([0, -1, 0])
 
-    def fake_process_msdial(df):
-        observed["processed_input"] = df
-        return processed_df
+    def fake_aggregate_clusters(df, labels, aggregate_functions):
+        observed["aggregated_labels"] = labels.tolist()
+        return summary_df
 
-    def fake_save_dataframe_as_tsv(df, out_path, header, index):
-        observed["saved_df"] = df
-        observed["out_path"] = out_path
-        observed["header"] = header
-        observed["index"] = index
+    def fake_save_dataframe_as_tsv(df, out_path, header, index, mode="w"):
+        observed["saved"].append((df, out_path, header, index, mode))
 
-    monkeypatch.setattr(msdial, "read_file", fake_read_file)
-    monkeypatch.setattr(msdial, "process_msdial", fake_process_msdial)
+    monkeypatch.setattr(msdial, "read_msdial", fake_read_msdial)
+    monkeypatch.setattr(msdial, "label_duplicates", fake_label_duplicates)
+    monkeypatch.setattr(msdial, "aggregate_clusters", fake_aggregate_clusters)
     monkeypatch.setattr(msdial, "save_dataframe_as_tsv", fake_save_dataframe_as_tsv)
 
     msdial.process_msdial_file("input.tsv", "output.tsv")
 
     assert observed["read_path"] == "input.tsv"
-    assert observed["processed_input"] is input_df
-    assert observed["saved_df"] is processed_df
-    assert observed["out_path"] == "output.tsv"
-    assert observed["header"] is False
-    assert observed["index"] is True
+    assert observed["labelled_input"] is alignments_df
+    assert observed["aggregated_labels"] == [0, -1, 0]
+    assert [saved[1:] for saved in observed["saved"]] == [
+        ("output.tsv", False, True, "w"),
+        ("output.tsv", False, True, "a"),
+        ("output.tsv", False, True, "a"),
+    ]
+    assert observed["saved"][0][0] is header_df
+    assert observed["saved"][1][0].index.tolist() == [2]
+    assert observed["saved"][2][0] is summary_df
+
+
+def test_process_msdial_file_keeps_header_block(tmp_path: str):
+    """Write all header rows of the export, followed by the alignments and the aggregated clusters."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    out_path = os.path.join(tmp_path, "processed.tsv")
+
+    msdial.process_msdial_file(file_path, out_path)
+    actual = pd.read_csv(out_path, sep="\t", header=None, dtype=str)
+
+    assert actual.iloc[:4, 28].tolist() == ["Class", "File type", "Injection order", "Batch ID"]
+    assert actual.iloc[4, 0] == "Alignment ID"
+    assert actual.iloc[5:, 0].tolist() == ["3", "4", "6", "8", "10", "0,1,2", "5,9", "7,11"]
+    assert actual.iloc[-3, 29:].astype(float).tolist() == [1520.0, 310.0, 870.0, 1610.0, 455.0, 12.0]
+
+
+@pytest.mark.parametrize("chunk_size", [None, 4])
+def test_process_msdial_file_compressed(chunk_size: int | None, tmp_path: str):
+    """Compressed inputs and outputs are processed like uncompressed ones, streamed or not."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    compressed_path = os.path.join(tmp_path, "msdial_alignment.txt.gz")
+    with open(file_path, "rb") as source, gzip.open(compressed_path, "wb") as target:
+        target.write(source.read())
+    expected_path = os.path.join(tmp_path, "expected.tsv")
+    actual_path = os.path.join(tmp_path, "actual.tsv.gz")
+
+    msdial.process_msdial_file(file_path, expected_path)
+    msdial.process_msdial_file(compressed_path, actual_path, chunk_size=chunk_size)
+
+    with open(expected_path, "rb") as expected, gzip.open(actual_path) as actual:
+        assert actual.read() == expected.read()
+
+
+def test_process_msdial_file_in_chunks_requires_tsv(tmp_path: str):
+    """Streaming in chunks rejects columnar outputs before writing anything."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+
+    with pytest.raises(ValueError, match=r"Streaming in chunks writes TSV files only."):
+        msdial.process_msdial_file(file_path, os.path.join(tmp_path, "out.parquet"), chunk_size=4)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 4])
+def test_process_msdial_file_sparse(chunk_size: int | None, tmp_path: str):
+    """Searching sparse abundances for duplicates writes exactly the output of the dense search."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    expected_path = os.path.join(tmp_path, "expected.tsv")
+    actual_path = os.path.join(tmp_path, "actual.tsv")
+
+    msdial.process_msdial_file(file_path, expected_path)
+    msdial.process_msdial_file(file_path, actual_path, chunk_size=chunk_size, sparse=True)
+
+    with open(expected_path) as expected, open(actual_path) as actual:
+        assert actual.read() == expected.read()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 100])
+def test_process_msdial_file_in_chunks_matches_in_memory(chunk_size: int, tmp_path: str):
+    """Streaming the file in blocks writes exactly the output of the in-memory processing."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    expected_path = os.path.join(tmp_path, "expected.tsv")
+    actual_path = os.path.join(tmp_path, "actual.tsv")
+
+    msdial.process_msdial_file(file_path, expected_path)
+    msdial.process_msdial_file(file_path, actual_path, chunk_size=chunk_size)
+
+    with open(expected_path) as expected, open(actual_path) as actual:
+        assert actual.read() == expected.read()
+
+
+def test_process_msdial_file_in_chunks_spills_abundances(tmp_path: str):
+    """Workers scan the abundances spilled next to the output, which are removed afterwards."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    expected_path = os.path.join(tmp_path, "expected.tsv")
+    actual_path = os.path.join(tmp_path, "actual.tsv")
+
+    msdial.process_msdial_file(file_path, expected_path)
+    msdial.process_msdial_file(file_path, actual_path, chunk_size=4, workers=2)
+
+    with open(expected_path) as expected, open(actual_path) as actual:
+        assert actual.read() == expected.read()
+    assert sorted(os.listdir(tmp_path)) == ["actual.tsv", "expected.tsv"]
+
+
+def test_find_duplicate_groups_in_parallel_on_mapped_file(tmp_path: str):
+    """A matrix memory-mapped from a file is scanned by workers mapping the file themselves."""
+    values = np.asfortranarray(np.random.default_rng(1).integers(0, 30, size=(200, 5)).astype(float))
+    path = os.path.join(tmp_path, "abundances.npy")
+    np.save(path, values)
+
+    actual = msdial.find_duplicate_groups(np.load(path, mmap_mode="r"), workers=2)
+
+    assert [group.tolist() for group in actual] == [group.tolist() for group in msdial.find_duplicate_groups(values)]
+
+
+@pytest.mark.parametrize("chunk_size", [None, 4])
+def test_process_msdial_file_rt_window(chunk_size: int | None, tmp_path: str):
+    """A retention time window keeps duplicates eluting far apart separate, streamed or not."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    out_path = os.path.join(tmp_path, "processed.tsv")
+
+    msdial.process_msdial_file(file_path, out_path, chunk_size=chunk_size, rt_window=1.0)
+    actual = pd.read_csv(out_path, sep="\t", header=None, dtype=str)
+
+    assert actual.iloc[5:, 0].tolist() == ["3", "4", "5", "6", "7", "8", "9", "10", "11", "0,1,2"]
+
+
+@pytest.mark.parametrize("chunk_size", [None, 4])
+def test_process_msdial_file_with_persisted_groups(chunk_size: int | None, tmp_path: str):
+    """Persisting duplicate groups between runs leaves the output unchanged."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    groups_path = os.path.join(tmp_path, "groups.npz")
+    expected_path = os.path.join(tmp_path, "expected.tsv")
+    msdial.process_msdial_file(file_path, expected_path)
+
+    for run in range(2):
+        actual_path = os.path.join(tmp_path, f"actual_{run}.tsv")
+        msdial.process_msdial_file(file_path, actual_path, chunk_size=chunk_size, groups_path=groups_path)
+        with open(expected_path) as expected, open(actual_path) as actual:
+            assert actual.read() == expected.read()
+
+
+def test_process_msdial_file_to_parquet(tmp_path: str):
+    """Write the processed alignments as a typed table keeping the header block as an attribute."""
+    pytest.importorskip("pyarrow")
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    out_path = os.path.join(tmp_path, "processed.parquet")
+
+    msdial.process_msdial_file(file_path, out_path)
+    actual = pd.read_parquet(out_path)
+
+    assert actual.index.tolist() == ["3", "4", "6", "8", "10", "0,1,2", "5,9", "7,11"]
+    assert actual["QC_01"].dtype == "float64"
+    assert actual.loc["0,1,2", "QC_01"] == 1520.0
+    assert [row[28] for row in actual.attrs["msdial_header"]] == [
+        "Class",
+        "File type",
+        "Injection order",
+        "Batch ID",
+        "EI spectrum",
+    ]
@@ -0,0 +1,57 @@
+import threading
+import time
+import pytest
+from rcx_tk.pipeline import FINISHED
+from rcx_tk.pipeline import run_pipeline
+
+
+def square(value: int) -> int:
+    """Squares a value, failing for negative values."""
+    if value < 0:
+        raise ValueError("negative")
+    return value * value
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_pipeline(workers: int):
+    """Test running every item through all stages and reporting the stage errors of failing items."""
+    written = {}
+
+    def read(item: int) -> int:
+        if item == 3:
+            raise OSError("unreadable")
+        return FINISHED if item == 4 else item - 10 * (item == 5)
+
+    def write(item: int, value: int) -> None:
+        if item == 6:
+            raise OSError("disk full")
+        written[item] = value
+
+    errors = run_pipeline(range(8), read, square, write, workers=workers)
+
+    assert errors == [None, None, None, "OSError: unreadable", None, "ValueError: negative", "OSError: disk full", None]
+    assert written == {0: 0, 1: 1, 2: 4, 7: 49}
+
+
+def test_run_pipeline_bounds_read_ahead():
+    """Test that reading stalls while the slower stages have a full queue."""
+    held = []
+    most = [0]
+    lock = threading.Lock()
+
+    def read(item: int) -> int:
+        with lock:
+            held.append(item)
+            most[0] = max(most[0], len(held))
+        return item
+
+    def write(item: int, value: int) -> None:
+        time.sleep(0.01)
+        with lock:
+            held.remove(item)
+
+    errors = run_pipeline(range(20), read, lambda value: value, write, readers=2, queue_size=2)
+
+    assert errors == [None] * 20
+    # Two items read ahead, one being processed, two waiting to be written and one being written.
+    assert most[0] <= 6
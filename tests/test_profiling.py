@@ -0,0 +1,53 @@
+import json
+import os
+from rcx_tk import profiling
+from rcx_tk.msdial import process_msdial_file
+
+
+def test_stage_records_nested_stages_only_while_profiling():
+    """Record stages with their path, duration and counts inside a profile, and nothing outside of it."""
+    with profiling.stage("ignored") as counts:
+        counts["rows"] = 1
+
+    with profiling.profile() as records:
+        with profiling.stage("outer", file="a.tsv"):
+            with profiling.stage("inner", rows=3) as counts:
+                counts["groups"] = 2
+
+    assert [record["stage"] for record in records] == ["outer/inner", "outer"]
+    assert records[0]["rows"] == 3
+    assert records[0]["groups"] == 2
+    assert records[1]["file"] == "a.tsv"
+    assert records[1]["seconds"] >= records[0]["seconds"]
+    assert records[1]["start"] <= records[0]["start"]
+
+
+def test_format_report_lists_stages_in_start_order():
+    """Print enclosing stages before the stages nested in them."""
+    with profiling.profile() as records:
+        with profiling.stage("msdial"):
+            with profiling.stage("read", rows=12):
+                pass
+
+    lines = profiling.format_report(records).splitlines()
+
+    assert lines[0].startswith("msdial ")
+    assert lines[1].startswith("  read ")
+    assert lines[1].endswith("rows=12")
+
+
+def test_process_msdial_file_profile(tmp_path: str):
+    """Profile every stage of processing an MSDial file and write the report as JSON."""
+    file_path = os.path.join("tests", "test_data", "msdial_alignment.txt")
+    report_path = os.path.join(tmp_path, "profile.json")
+
+    with profiling.profile() as records:
+        process_msdial_file(file_path, os.path.join(tmp_path, "out.tsv"))
+    profiling.write_report(records, report_path)
+
+    with open(report_path) as report:
+        stages = {record["stage"]: record for record in json.load(report)}
+    assert list(stages) == ["read", "duplicates", "clusters", "aggregate", "write"]
+    assert stages["read"]["rows"] == 12
+    assert stages["clusters"]["clusters"] == 3
+    assert stages["write"]["rows"] == 8
@@ -3,13 +3,20 @@ from pathlib import Path
 from typing import Final
 import pandas as pd
 import pytest
+from rcx_tk import sequence
 from rcx_tk.sequence import add_local_order
 from rcx_tk.sequence import add_sequence_identifier
 from rcx_tk.sequence import add_subject_identifier
+from rcx_tk.sequence import derive_additional_metadata
+from rcx_tk.sequence import process_sequence
 from rcx_tk.sequence import process_sequence_file
-from rcx_tk.sequence import replace_spaces
+from rcx_tk.sequence import rearrange_columns
 from rcx_tk.sequence import separate_filename
+from rcx_tk.sequence import validate_filenames_column
 from rcx_tk.sequence import validate_injection_order
+from rcx_tk.sequence import validate_sequence
+from rcx_tk.utils import replace_spaces
+from rcx_tk.utils import validate_filename
 
 __location__: Final[Path] = Path(__file__).parent.resolve()
 
@@ -110,6 +117,40 @@ def test_process_metadata_file_raise_columns_missing(tmp_path: str):
     assert str(e.value) == "\"['File name', 'Class ID', 'Analytical order'] not in index\""
 
 
+@pytest.mark.parametrize(
+    "sheets, out_name, expected_names",
+    [
+        ["*", "processed.tsv", ["processed_first.tsv", "processed_second.tsv"]],
+        [["second"], "processed_{sheet}.tsv", ["processed_second.tsv"]],
+        [["second"], "processed.tsv.gz", ["processed_second.tsv.gz"]],
+    ],
+)
+def test_process_metadata_workbook_sheets(
+    processed_dataframe: pd.DataFrame, tmp_path: str, sheets: list[str] | str, out_name: str, expected_names: list[str]
+):
+    """Tests processing selected sheets of a workbook into separate files.
+
+    Args:
+        processed_dataframe (pd.DataFrame): Metadata dataframe.
+        tmp_path (str): Path where the processed dataframes will be exported.
+        sheets (list[str] | str): The sheets to process.
+        out_name (str): Name of the output path.
+        expected_names (list[str]): Names of the expected output files.
+    """
+    df = pd.read_csv(os.path.join("tests", "test_data", "batch_specification1.csv"))
+    file_path = os.path.join(tmp_path, "batches.xlsx")
+    with pd.ExcelWriter(file_path) as writer:
+        df.to_excel(writer, sheet_name="first", index=False)
+        df.to_excel(writer, sheet_name="second", index=False)
+
+    process_sequence_file(file_path, os.path.join(tmp_path, out_name), sheets=sheets)
+
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("processed")) == expected_names
+    for name in expected_names:
+        actual = pd.read_csv(os.path.join(tmp_path, name), sep="\t")
+        assert actual.equals(processed_dataframe)
+
+
 @pytest.mark.parametrize("file_name, expected", [["18_QC 4 _18", 18], ["1_QC_1", 1]])
 def test_add_localOrder(file_name: str, expected: int):
     """Tests the add_localOrder function.
@@ -172,7 +213,12 @@ def test_separate_filename(file_name: str, expected: str):
 
 @pytest.mark.parametrize(
     "dataFrame, expected",
-    [[pd.DataFrame({"injectionOrder": [1, 4, 5]}), True], [pd.DataFrame({"injectionOrder": ["1", None, 5]}), False]],
+    [
+        [pd.DataFrame({"injectionOrder": [1, 4, 5]}), True],
+        [pd.DataFrame({"injectionOrder": ["1", None, 5]}), False],
+        [pd.DataFrame({"injectionOrder": [1, 4, 4]}), False],
+        [pd.DataFrame({"injectionOrder": [1, 4, 2], "batch": [1, 1, 2]}), True],
+    ],
 )
 def test_validateInjectionOrder(dataFrame: pd.DataFrame, expected: bool):
     """Tests the injection order validation function.
@@ -183,3 +229,94 @@ def test_validateInjectionOrder(dataFrame: pd.DataFrame, expected: bool):
     """
     actual = validate_injection_order(dataFrame)
     assert expected == actual
+
+
+def test_validate_sequence_reports_every_failure():
+    """Tests that every failing row of every check is reported at once."""
+    df = pd.read_csv(os.path.join("tests", "test_data", "batch_specification1.csv"))
+    df["Analytical order"] = df["Analytical order"].astype(float)
+    df.loc[2, "File name"] = "blub"
+    df.loc[3, "Analytical order"] = 2
+    df.loc[4, "Analytical order"] = 8.5
+    df.loc[[6, 7], "File name"] = ["12_QC 8_12", "12_QC_8_12"]
+    df.loc[8, "Type"] = " "
+    df.loc[9, "Class ID"] = None
+
+    report = validate_sequence(rearrange_columns(df))
+
+    assert report[["row", "column", "check"]].values.tolist() == [
+        [2, "File name", "file_name"],
+        [4, "Analytical order", "injection_order_integer"],
+        [3, "Analytical order", "injection_order_monotonic"],
+        [6, "File name", "duplicate_sample_name"],
+        [7, "File name", "duplicate_sample_name"],
+        [8, "Type", "missing_type"],
+        [9, "Class ID", "missing_class"],
+    ]
+    assert report["value"].iloc[0] == "blub"
+    with pytest.raises(ValueError, match=r"7 failed checks(.|\n)*Sample names must be unique, rows 6, 7"):
+        process_sequence(df)
+
+
+def test_validate_sequence_valid(dataframe: pd.DataFrame):
+    """Tests that a valid sequence yields an empty report."""
+    assert validate_sequence(rearrange_columns(dataframe)).empty
+
+
+@pytest.mark.parametrize(
+    "file_name", ["18_QC 4 _18", "1_QC_1", "blub", "sample_0.56", "_170", "a_1_", "12_", "__1", "_1_2", "a_1b", ""]
+)
+def test_validate_filenames_column_matches_per_row_function(file_name: str):
+    """Tests that the vectorized file name check agrees with `utils.validate_filename`."""
+    df = pd.DataFrame({"File name": [file_name]})
+    if validate_filename(file_name):
+        validate_filenames_column(df)
+    else:
+        with pytest.raises(ValueError, match="Invalid File name"):
+            validate_filenames_column(df)
+
+
+@pytest.mark.parametrize(
+    "file_names",
+    [
+        ["18_QC 4 _18", "1_QC_1", "11_QC 16_11", "7_procedural blank_07"],
+        ["3_sample_x_2_5", "12__blank__003", "4_a1_b2_c3_44"],
+    ],
+)
+def test_derive_additional_metadata_matches_per_row_functions(file_names: list[str]):
+    """Tests that the vectorized derivation agrees with the per-row functions.
+
+    Args:
+        file_names (list[str]): File names to decompose.
+    """
+    actual = derive_additional_metadata(pd.DataFrame({"File name": file_names}))
+
+    assert actual["sampleName"].tolist() == [replace_spaces(x) for x in file_names]
+    assert actual["sequenceIdentifier"].tolist() == [add_sequence_identifier(x) for x in file_names]
+    assert actual["subjectIdentifier"].tolist() == [add_subject_identifier(x) for x in file_names]
+    assert actual["localOrder"].tolist() == [add_local_order(x) for x in file_names]
+
+
+def test_derive_additional_metadata_raise_undecomposable_file_name():
+    """Tests raising an error naming every file name without a leading injection number."""
+    df = pd.DataFrame({"File name": ["1_QC_1", "QC_2", "blank_3"]})
+
+    with pytest.raises(ValueError, match=r"Cannot derive metadata from File name: QC_2, blank_3."):
+        derive_additional_metadata(df)
+
+
+def test_derive_additional_metadata_without_pyarrow(processed_dataframe: pd.DataFrame, monkeypatch):
+    """Tests that the pandas fallback derives the same columns as the Arrow regex engine.
+
+    Args:
+        processed_dataframe (pd.DataFrame): Expected processed metadata dataframe.
+        monkeypatch: Fixture hiding pyarrow from the module.
+    """
+    file_names = processed_dataframe["sequenceIdentifier"] + "_" + processed_dataframe["localOrder"].astype(str)
+    df = pd.DataFrame({"File name": file_names})
+    expected = derive_additional_metadata(df)
+
+    monkeypatch.setattr(sequence, "pa", None)
+    actual = derive_additional_metadata(df)
+
+    pd.testing.assert_frame_equal(actual, expected)
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Final
+import pandas as pd
+import pytest
+from rcx_tk.watch import DEFAULT_ROUTES
+from rcx_tk.watch import append_ledger
+from rcx_tk.watch import parse_route
+from rcx_tk.watch import read_ledger
+from rcx_tk.watch import route_file
+from rcx_tk.watch import settled_files
+from rcx_tk.watch import watch
+
+__location__: Final[Path] = Path(__file__).parent.resolve()
+
+
+def test_parse_route():
+    """Test parsing routing rules."""
+    assert parse_route("Height_*.txt=msdial") == ("Height_*.txt", "msdial")
+    with pytest.raises(ValueError):
+        parse_route("*.txt")
+
+
+@pytest.mark.parametrize(
+    "file_name, expected",
+    [
+        ("Alkane_RI_ATHLETE_1.txt", "alkanes"),
+        ("batch_specification1.csv", "sequence"),
+        ("batch_specification1.xlsx", "sequence"),
+        ("Height_0_2023.txt", "msdial"),
+        ("Height_0_2023.txt.zst", "msdial"),
+        ("notes.md", None),
+        ("notes.md.gz", None),
+    ],
+)
+def test_route_file(file_name: str, expected: str | None):
+    """Test that the first matching routing rule applies."""
+    assert route_file(file_name, DEFAULT_ROUTES) == expected
+
+
+def test_settled_files():
+    """Test that files are settled only once unchanged for the settle time."""
+    pending = {}
+    assert settled_files({"a": (1, 1)}, pending, 0.0, 5.0) == []
+    assert settled_files({"a": (2, 2)}, pending, 4.0, 5.0) == []
+    assert settled_files({"a": (2, 2)}, pending, 8.0, 5.0) == []
+    assert settled_files({"a": (2, 2)}, pending, 9.0, 5.0) == ["a"]
+    assert pending == {}
+
+    settled_files({"b": (1, 1)}, pending, 0.0, 5.0)
+    assert settled_files({}, pending, 10.0, 5.0) == []
+    assert pending == {}
+
+
+def test_ledger_round_trip(tmp_path: Path):
+    """Test that later records replace earlier ones and cut lines are skipped."""
+    ledger_path = str(tmp_path.joinpath("ledger.jsonl"))
+    assert read_ledger(ledger_path) == {}
+
+    append_ledger(ledger_path, {"path": "a", "error": "ValueError: bad"})
+    append_ledger(ledger_path, {"path": "a", "error": None})
+    with open(ledger_path, "a") as file:
+        file.write('{"path": "b", "err')
+
+    assert read_ledger(ledger_path) == {"a": {"path": "a", "error": None}}
+
+
+def test_watch(tmp_path: Path):
+    """Test that settled files are processed once, also across restarts, and again once changed."""
+    inbox = tmp_path.joinpath("inbox")
+    inbox.mkdir()
+    out_dir = tmp_path.joinpath("out")
+    sequence = inbox.joinpath("sequence.csv")
+    shutil.copy(__location__.joinpath("test_data", "batch_specification1.csv"), sequence)
+    shutil.copy(__location__.joinpath("test_data", "invalid_metadata.txt"), inbox.joinpath("notes.md"))
+
+    def run():
+        watch(str(inbox), str(out_dir), settle=0.0, polls=2, sleep=lambda seconds: None)
+        return [json.loads(line) for line in inbox.joinpath(".rcx_tk-ledger.jsonl").read_text().splitlines()]
+
+    records = run()
+    assert [(os.path.basename(record["path"]), record["method"], record["error"]) for record in records] == [
+        ("sequence.csv", "sequence", None)
+    ]
+    assert pd.read_csv(out_dir.joinpath("sequence.tsv"), sep="\t").shape[0] > 0
+
+    assert len(run()) == 1
+
+    os.utime(sequence, ns=(0, 0))
+    assert len(run()) == 1
+
+    with open(sequence, "a") as file:
+        file.write("\n")
+    assert len(run()) == 2